@@ -0,0 +1,82 @@
+"""
+Compare building every thread and frame of a large stacktrace up front (as ProcessedCrash used to), with the
+lazily materialized ProcessedCrash used by the crash list and crash detail views.
+
+    python -m benchmarks.processed_crash [--threads 400] [--frames 100] [stacktrace.json]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from crashserver.utility import processor
+
+
+def synthetic_stacktrace(num_threads: int, num_frames: int) -> dict:
+    def frame(i):
+        return {"frame": i, "function": f"function_{i}", "function_offset": "0x14", "module": "ntdll.dll", "module_offset": f"0x{i:x}", "offset": f"0x{i:x}", "trust": "cfi"}
+
+    return {
+        "crash_info": {"type": "EXCEPTION_ACCESS_VIOLATION_READ", "address": "0x0", "crashing_thread": 0},
+        "crashing_thread": {"threads_index": 0, "frames": [{**frame(0), "registers": {"rip": "0x1"}}]},
+        "main_module": 0,
+        "modules": [{"debug_file": f"lib{i}.pdb", "debug_id": f"{i:033X}", "filename": f"lib{i}.dll"} for i in range(200)],
+        "pid": 1,
+        "system_info": {"os": "Windows NT", "cpu_arch": "amd64", "cpu_count": 8},
+        "threads": [{"frame_count": num_frames, "frames": [frame(i) for i in range(num_frames)]} for _ in range(num_threads)],
+    }
+
+
+def measure(name: str, func, repeat: int = 5):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:<32} {elapsed * 1000:>10.2f} ms {peak / 1024:>12.1f} KiB")
+
+
+def eager(stacktrace: dict):
+    """Build every object, as the dataclass based ProcessedCrash did"""
+    crash = processor.ProcessedCrash.generate(stacktrace)
+    return crash.crash_reason, crash.system, list(crash.modules), [(thread, list(thread.frames)) for thread in crash.threads]
+
+
+def list_view(stacktrace: dict):
+    crash = processor.ProcessedCrash.generate(stacktrace)
+    return crash.os_icon, crash.crash_reason.crash_type
+
+
+def detail_view(stacktrace: dict):
+    crash = processor.ProcessedCrash.generate(stacktrace)
+    for thread in crash.threads:
+        for frame in thread.frames:
+            frame.func, frame.file, frame.module
+    return [module.debug_file for module in crash.modules]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("stacktrace", nargs="?", help="Stackwalker JSON output to use instead of a synthetic stacktrace")
+    parser.add_argument("--threads", type=int, default=400)
+    parser.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.stacktrace:
+        with open(args.stacktrace, "rb") as f:
+            stacktrace = processor.read_stacktrace(f)
+    else:
+        stacktrace = synthetic_stacktrace(args.threads, args.frames)
+
+    print(f"{'':<32} {'time':>13} {'peak memory':>16}")
+    measure("Eager (previous behaviour)", lambda: eager(stacktrace))
+    measure("Crash list row", lambda: list_view(stacktrace))
+    measure("Crash detail page", lambda: detail_view(stacktrace))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare the per-crash latency of the two ways a decode job applies symbols: giving the stackwalker the symbols as
+text (which it parses on every run), or stackwalking once without symbols and resolving frames in-process against
+symbol indexes.
+
+    python -m benchmarks.symbolizer <minidump.dmp> <symbol_dir> [--repeat 5]
+
+symbol_dir is laid out as the stackwalker expects (<module>/<build>/<module>.sym). Without arguments, a synthetic
+symbol and stacktrace are used, and the in-process symbolizer is compared with parsing the text symbol per crash.
+
+    python -m benchmarks.symbolizer [--functions 200000] [--threads 100] [--frames 50]
+"""
+import argparse
+import copy
+import io
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from crashserver.utility import symindex
+from crashserver.utility.symbolizer import Symbolizer
+
+
+def measure(name: str, func, repeat: int):
+    func()  # Warm the page cache
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:<44} {elapsed * 1000:>10.2f} ms")
+
+
+def synthetic_symbol(num_functions: int) -> bytes:
+    lines = ["MODULE windows x86_64 0123456789ABCDEF0123456789ABCDEF1 app.pdb", "FILE 0 c:\\src\\app.cpp"]
+    for i in range(num_functions):
+        address = 0x1000 + i * 0x100
+        lines.append(f"FUNC {address:x} 100 0 app::namespace::Class::method_{i}(int, char const*)")
+        lines.extend(f"{address + j * 0x40:x} 40 {i * 4 + j} 0" for j in range(4))
+    return "\n".join(lines).encode()
+
+
+def synthetic_stacktrace(num_functions: int, num_threads: int, num_frames: int) -> dict:
+    def frame(i):
+        return {"frame": i, "module": "app.exe", "module_offset": hex(0x1000 + random.randrange(num_functions * 0x100)), "trust": "cfi"}
+
+    return {
+        "crash_info": {"crashing_thread": 0},
+        "modules": [{"debug_file": "app.pdb", "debug_id": "0123456789ABCDEF0123456789ABCDEF1", "filename": "app.exe", "missing_symbols": True}],
+        "threads": [{"frame_count": num_frames, "frames": [frame(i) for i in range(num_frames)]} for _ in range(num_threads)],
+    }
+
+
+def build_indexes(symbol_dir: Path, index_dir: Path) -> dict:
+    """Index every symbol within a stackwalker symbol directory, by (debug_file, debug_id)"""
+    index_paths = {}
+    for sym_path in symbol_dir.glob("*/*/*.sym"):
+        index_path = index_dir / f"{len(index_paths)}.symidx"
+        with open(sym_path, "rb") as sym, open(index_path, "wb") as out:
+            symindex.build_index(sym, out)
+        index_paths[(sym_path.parent.parent.name, sym_path.parent.name)] = index_path
+    return index_paths
+
+
+def symbolize(index_paths: dict, stacktrace: dict):
+    with Symbolizer(index_paths) as symbolizer:
+        return symbolizer.symbolize(copy.deepcopy(stacktrace))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("minidump", nargs="?", help="Minidump to decode with the stackwalker")
+    parser.add_argument("symbol_dir", nargs="?", help="Breakpad symbols for the minidump")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--functions", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--frames", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.minidump and args.symbol_dir:
+            from crashserver.server.jobs import run_stackwalker
+
+            index_paths = build_indexes(Path(args.symbol_dir), Path(tmp))
+            unsymbolicated = run_stackwalker(Path(args.minidump))
+            print(f"{len(index_paths)} symbols indexed. {sum(len(t.get('frames', [])) for t in unsymbolicated.get('threads', []))} frames.")
+            measure("Stackwalker with text symbols", lambda: run_stackwalker(Path(args.minidump), Path(args.symbol_dir)), args.repeat)
+            measure("Stackwalker without symbols", lambda: run_stackwalker(Path(args.minidump)), args.repeat)
+            measure("Stackwalker without symbols + symbolizer", lambda: symbolize(index_paths, run_stackwalker(Path(args.minidump))), args.repeat)
+            return
+
+        symbol = synthetic_symbol(args.functions)
+        stacktrace = synthetic_stacktrace(args.functions, args.threads, args.frames)
+        index_path = Path(tmp, "app.symidx")
+        with open(index_path, "wb") as out:
+            index_size = symindex.build_index(io.BytesIO(symbol), out)
+        index_paths = {("app.pdb", "0123456789ABCDEF0123456789ABCDEF1"): index_path}
+        print(f"{len(symbol) / 2**20:.1f} MiB symbol, {index_size / 2**20:.1f} MiB index, {args.threads * args.frames} frames")
+
+        def parse_text():
+            # What every stackwalker run with text symbols pays before resolving a single frame
+            builder = symindex.SymbolIndexBuilder()
+            for line in io.BytesIO(symbol):
+                builder.add_line(line.decode().rstrip("\n"))
+
+        measure("Parse text symbol", parse_text, args.repeat)
+        measure("Symbolizer against index", lambda: symbolize(index_paths, stacktrace), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 import os
 import uuid
+from pathlib import Path
 
 import click
 from email_validator import validate_email, EmailNotValidError
 from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer
 
 from crashserver.config import get_postgres_url
 
@@ -116,6 +117,92 @@ def register_util(app):
             res.decode_task()
         print(f"Minidump {dump_id} sent to worker for decode.")
 
+    @util.command(help="Compute crash signatures for decoded minidumps which do not have one")
+    @click.option("--batch-size", default=500, show_default=True)
+    def signatures(batch_size):
+        from crashserver.config import settings
+        from crashserver.server.models import Minidump
+
+        num_signed = 0
+        with Session(create_engine(get_postgres_url())) as session:
+            last_id = None
+            while True:
+                query = session.query(Minidump).filter(Minidump.signature_hash.is_(None), Minidump.stacktrace.isnot(None))
+                if last_id is not None:
+                    query = query.filter(Minidump.id > last_id)
+                dumps = query.order_by(Minidump.id).limit(batch_size).all()
+                if not dumps:
+                    break
+
+                for dump in dumps:
+                    dump.update_signature(session, settings.decode.signature_frames)
+                    num_signed += dump.signature_hash is not None
+                last_id = dumps[-1].id
+                session.commit()
+                session.expunge_all()
+        print(f"Crash signatures computed for {num_signed} minidumps.")
+
+    @util.command(help="Move the module lists of decoded minidumps into the module catalogue")
+    @click.option("--batch-size", default=500, show_default=True)
+    def modules(batch_size):
+        from crashserver.server.models import Minidump
+
+        num_moved = 0
+        with Session(create_engine(get_postgres_url())) as session:
+            last_id = None
+            while True:
+                query = session.query(Minidump).filter(Minidump.stacktrace.has_key("modules"))
+                if last_id is not None:
+                    query = query.filter(Minidump.id > last_id)
+                dumps = query.order_by(Minidump.id).limit(batch_size).all()
+                if not dumps:
+                    break
+
+                for dump in dumps:
+                    dump.update_modules(session)
+                num_moved += len(dumps)
+                last_id = dumps[-1].id
+                session.commit()
+                session.expunge_all()
+        print(f"Module lists catalogued for {num_moved} minidumps.")
+
+    @util.command(help="Queue address index builds for uploaded symbols which do not have one")
+    def index_symbols():
+        from crashserver.server.models import Symbol
+
+        with Session(create_engine(get_postgres_url())) as session:
+            symbols = session.query(Symbol).filter(Symbol.index_size_bytes.is_(None)).all()
+            for symbol in symbols:
+                symbol.index_task()
+        print(f"Index builds queued for {len(symbols)} symbols.")
+
+    @util.command(help="Store existing minidumps, symbols and attachments again, encoded as set by storage.compression")
+    def compress_storage():
+        import humanize
+        from crashserver.server import db
+        from crashserver.server.models import Attachment, Minidump, Storage, Symbol
+
+        Storage.load_storage_modules()
+        Storage.init_targets()
+
+        def stored_paths():
+            for dump in db.session.query(Minidump).options(defer(Minidump.stacktrace)).yield_per(1000):
+                yield dump.file_location
+                if dump.stacktrace_location:
+                    yield Path(dump.stacktrace_location)
+            for symbol in db.session.query(Symbol).yield_per(1000):
+                yield symbol.file_location_stored
+                if symbol.index_size_bytes is not None:
+                    yield symbol.index_location_stored
+            for attach in db.session.query(Attachment).yield_per(1000):
+                yield attach.file_location
+
+        num_objects, saved = 0, 0
+        for path in stored_paths():
+            saved += Storage.recode(path)
+            num_objects += 1
+        print(f"{num_objects} stored objects encoded. {humanize.naturalsize(saved, binary=True)} saved.")
+
     @util.command(help="Create DB files")
     def create_db():
         from crashserver.server import db
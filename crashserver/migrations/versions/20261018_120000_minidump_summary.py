@@ -0,0 +1,44 @@
+"""Add stacktrace summary columns to minidump
+
+Revision ID: 20261018_120000_minidump_summary
+Revises: 20230108_054000_symcache_remove
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261018_120000_minidump_summary"
+down_revision = "20230108_054000_symcache_remove"
+branch_labels = None
+depends_on = None
+
+SUMMARY_COLUMNS = ["crash_type", "crash_address", "os_name", "cpu_arch", "main_module", "crashing_function"]
+
+
+def upgrade():
+    for column in SUMMARY_COLUMNS:
+        op.add_column("minidump", sa.Column(column, sa.Text(), nullable=True))
+    op.add_column("minidump", sa.Column("thread_count", sa.Integer(), nullable=True))
+
+    # Summarize the stacktraces which already exist
+    op.execute(
+        """
+        UPDATE minidump SET
+            crash_type = stacktrace #>> '{crash_info,type}',
+            crash_address = COALESCE(stacktrace #>> '{crash_info,address}', 'Unknown'),
+            os_name = stacktrace #>> '{system_info,os}',
+            cpu_arch = stacktrace #>> '{system_info,cpu_arch}',
+            main_module = stacktrace -> 'modules' -> (stacktrace ->> 'main_module')::int ->> 'debug_file',
+            crashing_function = stacktrace -> 'threads' -> (stacktrace #>> '{crash_info,crashing_thread}')::int #>> '{frames,0,function}',
+            thread_count = CASE WHEN jsonb_typeof(stacktrace -> 'threads') = 'array' THEN jsonb_array_length(stacktrace -> 'threads') ELSE 0 END
+        WHERE stacktrace IS NOT NULL AND jsonb_typeof(stacktrace) = 'object'
+        """
+    )
+
+
+def downgrade():
+    op.drop_column("minidump", "thread_count")
+    for column in reversed(SUMMARY_COLUMNS):
+        op.drop_column("minidump", column)
@@ -0,0 +1,42 @@
+"""Add crash signatures
+
+Revision ID: 20261018_130000_crash_signature
+Revises: 20261018_120000_minidump_summary
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "20261018_130000_crash_signature"
+down_revision = "20261018_120000_minidump_summary"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "crash_signature",
+        sa.Column("id", postgresql.UUID(as_uuid=True), server_default=sa.text("gen_random_uuid()"), nullable=False),
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("signature_hash", sa.String(length=64), nullable=False),
+        sa.Column("signature", sa.Text(), nullable=False),
+        sa.Column("crash_count", sa.Integer(), nullable=False),
+        sa.Column("first_seen", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("last_seen", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("project_id", "signature_hash"),
+    )
+    op.add_column("minidump", sa.Column("signature_hash", sa.String(length=64), nullable=True))
+    op.create_index(op.f("ix_minidump_signature_hash"), "minidump", ["signature_hash"], unique=False)
+    op.create_index("ix_minidump_project_date_signature", "minidump", ["project_id", "date_created", "signature_hash"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_minidump_project_date_signature", table_name="minidump")
+    op.drop_index(op.f("ix_minidump_signature_hash"), table_name="minidump")
+    op.drop_column("minidump", "signature_hash")
+    op.drop_table("crash_signature")
@@ -0,0 +1,27 @@
+"""Add content hash to minidump, to recognize duplicate uploads
+
+Revision ID: 20261018_140000_minidump_content_hash
+Revises: 20261018_130000_crash_signature
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261018_140000_minidump_content_hash"
+down_revision = "20261018_130000_crash_signature"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("minidump", sa.Column("content_hash", sa.String(length=64), nullable=True))
+    op.add_column("minidump", sa.Column("duplicate_count", sa.Integer(), server_default="0", nullable=False))
+    op.create_index("ix_minidump_project_content_hash", "minidump", ["project_id", "content_hash", "date_created"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_minidump_project_content_hash", table_name="minidump")
+    op.drop_column("minidump", "duplicate_count")
+    op.drop_column("minidump", "content_hash")
@@ -0,0 +1,23 @@
+"""Add location of full stacktraces kept in storage
+
+Revision ID: 20261018_150000_stacktrace_location
+Revises: 20261018_140000_minidump_content_hash
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261018_150000_stacktrace_location"
+down_revision = "20261018_140000_minidump_content_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("minidump", sa.Column("stacktrace_location", sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("minidump", "stacktrace_location")
@@ -0,0 +1,78 @@
+"""Add module catalogue
+
+Revision ID: 20261018_160000_module_catalogue
+Revises: 20261018_150000_stacktrace_location
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "20261018_160000_module_catalogue"
+down_revision = "20261018_150000_stacktrace_location"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "module",
+        sa.Column("id", postgresql.UUID(as_uuid=True), server_default=sa.text("gen_random_uuid()"), nullable=False),
+        sa.Column("module_hash", sa.String(length=64), nullable=False),
+        sa.Column("debug_file", sa.Text(), nullable=True),
+        sa.Column("debug_id", sa.Text(), nullable=True),
+        sa.Column("code_id", sa.Text(), nullable=True),
+        sa.Column("filename", sa.Text(), nullable=True),
+        sa.Column("version", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("module_hash"),
+    )
+    op.create_index("ix_module_debug", "module", ["debug_file", "debug_id"], unique=False)
+    op.create_index("ix_module_filename_version", "module", ["filename", "version"], unique=False)
+    op.create_table(
+        "minidump_module",
+        sa.Column("minidump_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("module_index", sa.Integer(), nullable=False),
+        sa.Column("module_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("base_address", sa.Text(), nullable=True),
+        sa.Column("end_address", sa.Text(), nullable=True),
+        sa.Column("missing_symbols", sa.Boolean(), nullable=False),
+        sa.Column("fields", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.ForeignKeyConstraint(["minidump_id"], ["minidump.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["module_id"], ["module.id"]),
+        sa.PrimaryKeyConstraint("minidump_id", "module_index"),
+    )
+    op.create_index(op.f("ix_minidump_module_module_id"), "minidump_module", ["module_id"], unique=False)
+
+
+def downgrade():
+    # Put catalogued module lists back into their stacktraces
+    op.execute(
+        """
+        UPDATE minidump SET stacktrace = jsonb_set(stacktrace, '{modules}', modules.list)
+        FROM (
+            SELECT l.minidump_id, jsonb_agg(
+                CASE WHEN l.fields IS NULL THEN jsonb_strip_nulls(jsonb_build_object(
+                    'base_addr', l.base_address, 'end_addr', l.end_address, 'code_id', m.code_id, 'debug_file', m.debug_file,
+                    'debug_id', m.debug_id, 'filename', m.filename, 'version', m.version,
+                    'missing_symbols', CASE WHEN l.missing_symbols THEN true END
+                ))
+                ELSE jsonb_build_object(
+                    'base_addr', l.base_address, 'end_addr', l.end_address, 'code_id', m.code_id, 'debug_file', m.debug_file,
+                    'debug_id', m.debug_id, 'filename', m.filename, 'version', m.version, 'missing_symbols', l.missing_symbols
+                ) || l.fields END
+                ORDER BY l.module_index
+            ) AS list
+            FROM minidump_module l JOIN module m ON m.id = l.module_id
+            GROUP BY l.minidump_id
+        ) AS modules
+        WHERE minidump.id = modules.minidump_id AND minidump.stacktrace IS NOT NULL AND NOT minidump.stacktrace ? 'modules'
+        """
+    )
+    op.drop_index(op.f("ix_minidump_module_module_id"), table_name="minidump_module")
+    op.drop_table("minidump_module")
+    op.drop_index("ix_module_filename_version", table_name="module")
+    op.drop_index("ix_module_debug", table_name="module")
+    op.drop_table("module")
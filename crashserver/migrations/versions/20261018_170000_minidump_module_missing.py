@@ -0,0 +1,23 @@
+"""Index modules loaded without symbols
+
+Revision ID: 20261018_170000_minidump_module_missing
+Revises: 20261018_160000_module_catalogue
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261018_170000_minidump_module_missing"
+down_revision = "20261018_160000_module_catalogue"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_minidump_module_missing_symbols", "minidump_module", ["module_id"], unique=False, postgresql_where=sa.text("missing_symbols"))
+
+
+def downgrade():
+    op.drop_index("ix_minidump_module_missing_symbols", table_name="minidump_module")
@@ -0,0 +1,23 @@
+"""Add symbol index size
+
+Revision ID: 20261018_180000_symbol_index
+Revises: 20261018_170000_minidump_module_missing
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261018_180000_symbol_index"
+down_revision = "20261018_170000_minidump_module_missing"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("symbol", sa.Column("index_size_bytes", sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("symbol", "index_size_bytes")
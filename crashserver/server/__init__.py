@@ -76,6 +76,7 @@ def register_blueprints(app: Flask):
     from .controllers import (
         auth,
         crash_upload_api,
+        metrics,
         sym_upload_v1,
         sym_upload_v2,
         webapi,
@@ -85,6 +86,7 @@ def register_blueprints(app: Flask):
     app.register_blueprint(views)
     app.register_blueprint(webapi)
     app.register_blueprint(crash_upload_api)
+    app.register_blueprint(metrics)
     app.register_blueprint(sym_upload_v1, url_prefix="/symupload")
     app.register_blueprint(sym_upload_v2, url_prefix="/symupload")
     app.register_blueprint(auth, url_prefix="/auth")
@@ -1,5 +1,6 @@
 from .auth import auth
 from .crash_upload_api import crash_upload_api
+from .metrics import metrics
 from .sym_upload_v1 import sym_upload_v1
 from .sym_upload_v2 import sym_upload_v2
 from .webapi import webapi
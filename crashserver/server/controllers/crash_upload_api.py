@@ -10,7 +10,7 @@ from crashserver.utility.decorators import (
     api_key_required,
     check_project_versioned,
 )
-from crashserver.utility.misc import SymbolData
+from crashserver.utility.symstream import SymbolStream
 
 crash_upload_api = Blueprint("api", __name__)
 
@@ -63,13 +63,13 @@ def upload_minidump(project):
 def upload_symbol(project, version):
     symbol_file = request.files.get("symbol_file")
 
-    symbol_file_bytes = symbol_file.stream.read()
-    with io.BytesIO(symbol_file_bytes) as f:
-        first_line_str = f.readline().decode("utf-8")
+    try:
+        symbol_stream = SymbolStream(symbol_file.stream)
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
     # Get relevant module info from first line of file
-    symbol_data = SymbolData.from_module_line(first_line_str)
+    symbol_data = symbol_stream.symbol_data
     symbol_data.app_version = version
-    symbol_file.stream.seek(0)
 
-    return helpers.symbol_upload(db.session, project, symbol_file_bytes, symbol_data)
+    return helpers.symbol_upload(db.session, project, symbol_stream, symbol_data)
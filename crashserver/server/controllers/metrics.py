@@ -0,0 +1,26 @@
+import hmac
+
+from flask import Blueprint, Response, request
+from flask_login import current_user
+
+from crashserver.config import settings
+from crashserver.server.core.extensions import login
+from crashserver.server.jobs import get_decode_histogram
+
+metrics = Blueprint("metrics", __name__)
+
+
+def scrape_authorized() -> bool:
+    """Scrapers present `metrics.token` as a bearer token. Without one configured, only logged in users may read metrics."""
+    token = settings.metrics.token
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    return current_user.is_authenticated
+
+
+@metrics.route("/metrics")
+def export_metrics():
+    """Decode metrics in the Prometheus text exposition format, for scraping"""
+    if not scrape_authorized():
+        return login.unauthorized()
+    return Response(get_decode_histogram().render(), mimetype="text/plain; version=0.0.4")
@@ -15,6 +15,7 @@ from crashserver.utility.decorators import (
     check_project_versioned,
 )
 from crashserver.utility.misc import SymbolData
+from crashserver.utility.symstream import SymbolStream
 
 sym_upload_v1 = Blueprint("sym-upload-v1", __name__)
 
@@ -37,5 +38,8 @@ def upload(project, version):
         app_version=version,
     )
 
-    file_content = request.files.get("symbol_file").stream.read()
-    return helpers.symbol_upload(db.session, project, file_content, data)
+    try:
+        symbol_file = SymbolStream(request.files.get("symbol_file").stream)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return helpers.symbol_upload(db.session, project, symbol_file, data)
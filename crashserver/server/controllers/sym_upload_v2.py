@@ -65,6 +65,7 @@ from loguru import logger
 from crashserver.server import db, helpers
 from crashserver.server.models import SymbolUploadV2, BuildMetadata
 from crashserver.utility.decorators import url_arg_required, api_key_required
+from crashserver.utility.symstream import SymbolStream
 
 sym_upload_v2 = Blueprint("sym-upload-v2", __name__)
 
@@ -101,7 +102,11 @@ def create(project):
 @url_arg_required("sym_id")
 def upload_location():
     new_symbol = db.session.query(SymbolUploadV2).get(request.args.get("sym_id"))
-    new_symbol.store_file(request.data)
+    try:
+        new_symbol.store_file(request.stream)
+    except ValueError as e:
+        logger.warning(f"Symbol upload [{new_symbol.id}] rejected. {e}")
+        return "", 400
     db.session.commit()
     return "", 200
 
@@ -126,8 +131,8 @@ def is_upload_complete(project, upload_key):
         return {"result": "DUPLICATE_DATA"}, 200
 
     # Save the file!
-    file_data = symbol_ref.load_file()
-    helpers.symbol_upload(db.session, project, file_data, symbol_ref.symbol_data)
+    with symbol_ref.open_file() as f:
+        helpers.symbol_upload(db.session, project, SymbolStream(f), symbol_ref.symbol_data)
 
     # Delete upload
     os.remove(symbol_ref.file_location)
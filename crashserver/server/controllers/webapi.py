@@ -124,6 +124,24 @@ def delete_minidump(dump_id):
     return "", 200
 
 
+@webapi.route("/webapi/minidump/<dump_id>/thread/<int:thread_index>")
+def get_thread_frames(dump_id, thread_index):
+    """Frames of one thread, from the full stacktrace of a minidump whose stacktrace is split (see `Minidump.set_stacktrace`)"""
+    dump = db.session.query(Minidump).get(dump_id)
+    if not dump or not dump.stacktrace:
+        return {"error": "dump_id is invalid"}, 404
+
+    try:
+        threads = dump.full_json.threads
+    except FileNotFoundError:
+        return {"error": "Full stacktrace is missing from storage"}, 404
+
+    if not 0 <= thread_index < len(threads):
+        return {"error": "thread_index is invalid"}, 404
+
+    return {"html": render_template("crash/thread-frames.html", dump=dump, thread=threads[thread_index])}, 200
+
+
 @webapi.route("/webapi/stats/crash-per-day/<project_id>")
 def crash_per_day(project_id):
     # Get crash per day data
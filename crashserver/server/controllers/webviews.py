@@ -1,16 +1,17 @@
-import io
 import os
 import uuid
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 from flask_babel import _
 from flask_login import login_required, current_user
+from sqlalchemy.orm import defer
 
 from crashserver.config import settings as config
 from crashserver.server import db, helpers
 from crashserver.server.forms import CreateAppForm, UploadMinidumpForm, UpdateAccount, UploadSymbolForm
 from crashserver.server.models import Minidump, Project, ProjectType, User, Storage
 from crashserver.utility import misc
+from crashserver.utility.symstream import SymbolStream
 
 views = Blueprint("views", __name__)
 
@@ -43,6 +44,7 @@ def settings():
         projects=projects,
         settings=config,
         storage=storage,
+        storage_cache=Storage.cache_stats(),
     )
 
 
@@ -89,7 +91,13 @@ def project_dashboard(id: str):
 @views.route("/crash-reports")
 def crash():
     page = request.args.get("page", 1, type=int)
-    res = db.session.query(Minidump, Project.project_name).filter(Minidump.project_id == Project.id).order_by(Minidump.date_created.desc()).paginate(page=page, per_page=10)
+    res = (
+        db.session.query(Minidump, Project.project_name)
+        .options(defer(Minidump.stacktrace))  # The list only shows the summary columns
+        .filter(Minidump.project_id == Project.id)
+        .order_by(Minidump.date_created.desc())
+        .paginate(page=page, per_page=10)
+    )
     return render_template("crash/crash.html", dumps=res)
 
 
@@ -138,19 +146,22 @@ def upload_symbol():
         project = Project.query.get(form.project.data)  # Get project
 
         # Read first line of symbol file
-        symbol_file_bytes = form.symbol.data.stream.read()
-        with io.BytesIO(symbol_file_bytes) as f:
-            first_line_str = f.readline().decode("utf-8")
-
-        # Get relevant module info from first line of file
-        symbol_data = misc.SymbolData.from_module_line(first_line_str)
-        symbol_data.app_version = form.version.data if form.version.data else None
-
-        res = helpers.symbol_upload(db.session, project, symbol_file_bytes, symbol_data)
-        if res.status_code != 200:
-            flash(res.json["error"], category="danger")
-        else:
-            flash(_(f"Symbol {symbol_data.module_id}:{symbol_data.os}:{symbol_data.build_id} received."))
+        try:
+            symbol_file = SymbolStream(form.symbol.data.stream)
+        except ValueError as e:
+            flash(str(e), category="danger")
+            symbol_file = None
+
+        if symbol_file:
+            # Get relevant module info from first line of file
+            symbol_data = symbol_file.symbol_data
+            symbol_data.app_version = form.version.data if form.version.data else None
+
+            res = helpers.symbol_upload(db.session, project, symbol_file, symbol_data)
+            if res.status_code != 200:
+                flash(res.json["error"], category="danger")
+            else:
+                flash(_(f"Symbol {symbol_data.module_id}:{symbol_data.os}:{symbol_data.build_id} received."))
     else:
         misc.flash_form_errors(form)
 
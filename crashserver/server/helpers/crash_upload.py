@@ -6,11 +6,21 @@ import flask
 import magic
 from loguru import logger
 
-from crashserver.server.models import Symbol, BuildMetadata, Minidump, Annotation, Project, Attachment, ProjectType
+from crashserver.config import settings
+from crashserver.server.models import Symbol, BuildMetadata, Minidump, Module, Annotation, Project, Attachment, ProjectType
+from crashserver.utility import minidump_reader
 from crashserver.utility.misc import SymbolData
+from crashserver.utility.symstream import SymbolStream
 
 
-def symbol_upload(session, project: Project, symbol_file: bytes, symbol_data: SymbolData):
+def queue_batch_decode(build: BuildMetadata, minidump_ids: list):
+    """Decode minidumps of a build in jobs of at most `decode.batch_size` minidumps"""
+    batch_size = settings.decode.batch_size
+    for i in range(0, len(minidump_ids), batch_size):
+        build.decode_task(minidump_ids[i : i + batch_size])
+
+
+def symbol_upload(session, project: Project, symbol_file: SymbolStream, symbol_data: SymbolData):
     """
     Store the symbol in the correct location, and track it in the database.
 
@@ -23,7 +33,7 @@ def symbol_upload(session, project: Project, symbol_file: bytes, symbol_data: Sy
 
     :param session: The database session object
     :param project: The project to relate the symbol to
-    :param symbol_file: The bytes to store in the file
+    :param symbol_file: The symbol file, sent to storage as it is read
     :param symbol_data: Metadata about the symfile param
     :return: The response to the client making this request
     """
@@ -70,13 +80,31 @@ def symbol_upload(session, project: Project, symbol_file: bytes, symbol_data: Sy
         )
     )
 
-    # Send all minidump id's to task processor to for decoding
-    to_process = build.unprocessed_dumps
+    session.commit()
+    if settings.decode.build_symbol_index:
+        build.symbol.index_task()
+
+    # Send all minidump id's to task processor to for decoding. The symbol must be committed before any job starts.
+    to_process = [row.id for row in session.query(Minidump.id).filter_by(build_metadata_id=build.id, symbolicated=False)]
     if to_process:
         logger.info("Attempting to reprocess {} unprocessed minidump", len(to_process))
-        for dump in to_process:
-            dump.decode_task()
-    session.commit()
+        queue_batch_decode(build, to_process)
+        session.commit()
+
+    # Minidumps of other builds which loaded this module without symbols (e.g. this is the symbol of a plugin) are
+    # decoded again, as long as the main module of their own build has a symbol
+    other_builds = {}
+    for dump_id, build_id in Module.minidumps_missing_symbols(session, project.id, build.module_id, build.build_id):
+        if build_id is not None and build_id != build.id:
+            other_builds.setdefault(build_id, []).append(dump_id)
+    if other_builds:
+        num_dumps = 0
+        for other_build in session.query(BuildMetadata).filter(BuildMetadata.id.in_(other_builds.keys())):
+            if other_build.symbol:
+                queue_batch_decode(other_build, other_builds[other_build.id])
+                num_dumps += len(other_builds[other_build.id])
+        logger.info("Attempting to reprocess {} minidumps of other builds which loaded {}", num_dumps, build.module_id)
+        session.commit()
 
     res = {
         "id": build.symbol.id,
@@ -102,12 +130,33 @@ def minidump_upload(session, project_id: str, annotations: dict, minidump_file:
         logger.warning("Minidump rejected from {}. File detected as {}", flask.request.remote_addr, magic_number)
         return flask.make_response({"error": "Bad Minidump"}, 400)
 
+    # Crashpad clients retry uploads which they believe failed. A minidump identical to one uploaded recently is
+    # only counted against the original, rather than stored and decoded again.
+    content_hash = Minidump.hash_content(minidump_file)
+    duplicate = Minidump.find_duplicate(session, project_id, content_hash, settings.upload.duplicate_window)
+    if duplicate:
+        session.query(Minidump).filter_by(id=duplicate.id).update({Minidump.duplicate_count: Minidump.duplicate_count + 1}, synchronize_session=False)
+        session.commit()
+        logger.info(f"Minidump duplicate of [{duplicate.id}] received for project [{project_id}] - [{flask.request.remote_addr}]. Upload not stored.")
+        return flask.make_response({"status": "success", "id": str(duplicate.id), "duplicate": True}, 200)
+
     # Add minidump to database
-    new_dump = Minidump(project_id=project_id)
+    new_dump = Minidump(project_id=project_id, content_hash=content_hash)
     new_dump.upload_ip = flask.request.remote_addr
     new_dump.client_guid = annotations.pop("guid", None)
     new_dump.store_minidump(minidump_file)
     session.add(new_dump)
+
+    # Relate the minidump to its build by reading the main module directly from the minidump, so the decode job
+    # need not, and a later symbol upload finds it. Minidumps which can't be read, or whose main module has no
+    # debug id, are related to their build by the decode job's stackwalk instead.
+    try:
+        dump_info = minidump_reader.read_minidump_info(minidump_file)
+    except Exception:
+        logger.exception(f"Minidump from {flask.request.remote_addr} could not be read. Its build is found when decoded.")
+        dump_info = None
+    if dump_info and dump_info.build_module:
+        new_dump.build = BuildMetadata.get_or_create(session, project_id, dump_info.build_module.debug_file, dump_info.build_module.debug_id)
     session.flush()
 
     # Store attachments
@@ -1,147 +1,379 @@
-import json
+import concurrent.futures
+import contextlib
+import os
 import subprocess
+import tempfile
+import time
+import typing
 from pathlib import Path
-import os
 
-import requests
 from loguru import logger
+from sqlalchemy.orm import selectinload
+
+from crashserver.config import settings
+from crashserver.server.core.extensions import db, queue
+from crashserver.server.models import Minidump, BuildMetadata, Storage, Symbol
+from crashserver.server.symbol_supplier import HttpSymbolSupplier, LocalSymCache
+from crashserver.utility import processor, minidump_reader, symindex
+from crashserver.utility.diskcache import DiskLRUCache
+from crashserver.utility.metrics import RedisHistogram, StageTimer
+from crashserver.utility.symbolizer import Symbolizer
+
+# Every decode job receives its own workspace within WORKSPACE_DIR, while all jobs on the host share
+# SYMBOL_CACHE_DIR (symbols from symbol servers), SYMBOL_LRU_DIR (uploaded symbols, keyed by file hash)
+# and CONVERTED_SYMBOL_DIR (symbols converted from downloaded PDBs, keyed by PDB hash)
+DECODE_ROOT = Path("/tmp/crash_decode")
+SYMBOL_CACHE_DIR = DECODE_ROOT / "cache"
+SYMBOL_LRU_DIR = DECODE_ROOT / "symbols"
+CONVERTED_SYMBOL_DIR = DECODE_ROOT / "converted"
+WORKSPACE_DIR = DECODE_ROOT / "jobs"
+
+
+@contextlib.contextmanager
+def decode_workspace(job_name: str):
+    """Create a scratch directory unique to a single decode job. The directory is removed when the job ends."""
+    WORKSPACE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=f"{job_name}-", dir=WORKSPACE_DIR) as workspace:
+        yield Path(workspace)
+
+
+def get_symbol_cache() -> DiskLRUCache:
+    return DiskLRUCache(SYMBOL_LRU_DIR, settings.decode.symbol_cache_bytes, redis_conn=queue.connection, stats_key="crashserver:stats:symbol_cache")
+
+
+def fetch_symbol(symbol: Symbol, symbol_dir: Path) -> bool:
+    """
+    Place an uploaded symbol within symbol_dir, in the directory structure expected by the stackwalker.
+    The symbol is taken from the worker-local cache, and is only retrieved from storage on a cache miss.
+    :return: True if the symbol was already cached, otherwise false
+    """
+    dest = Path(symbol_dir, symbol.file_location)
+    cache = get_symbol_cache()
+    if cache.get(symbol.file_hash, dest):
+        return True
+
+    fetched = Storage.materialize(symbol.file_location_stored, dest.with_name(f".{dest.name}.fetch"))
+    cache.put_file(symbol.file_hash, fetched, dest)
+    return False
+
+
+def fetch_symbol_index(symbol: Symbol, index_dir: Path) -> Path:
+    """Place the address index of an uploaded symbol within index_dir, from the worker-local cache, or storage on a miss"""
+    dest = Path(index_dir, symbol.file_location).with_suffix(".symidx")
+    cache = get_symbol_cache()
+    key = f"{symbol.file_hash}.symidx"
+    if not cache.get(key, dest):
+        fetched = Storage.materialize(symbol.index_location_stored, dest.with_name(f".{dest.name}.fetch"))
+        cache.put_file(key, fetched, dest)
+    return dest
+
+
+def fetch_module_symbols(project_id, modules: list, symbol_dir: Path) -> list:
+    """
+    Place the uploaded symbols of any module without symbols in symbol_dir, e.g. a plugin whose symbol was
+    uploaded separately from the main module's.
+    :return: The modules for which no symbol was uploaded, to be requested from the symbol servers
+    """
+    uploaded = set()
+    for symbol in Symbol.for_modules(db.session, project_id, modules):
+        fetch_symbol(symbol, symbol_dir)
+        uploaded.add((symbol.build.module_id, symbol.build.build_id))
+    return [m for m in modules if (m.debug_file, m.debug_id) not in uploaded]
 
-from crashserver.server.core.extensions import db
-from crashserver.server.models import Minidump, BuildMetadata, Storage
-from crashserver.utility import processor
 
+def build_symbol_index(symbol_id):
+    """Build the address index of an uploaded symbol (see `symindex`), and store it alongside the symbol"""
+    symbol = db.session.query(Symbol).get(symbol_id)
+    if not symbol:
+        logger.error(f"Symbol [{symbol_id}] - Unable to build index. No database entry found.")
+        return
 
-class LocalSymCache:
-    def __init__(self, module_id: str, build_id: str):
-        self.module_id = module_id
-        self.build_id = build_id
+    start = time.perf_counter()
+    with decode_workspace(f"index-{symbol_id}") as workspace:
+        index_path = Path(workspace, "symbol.symidx")
+        try:
+            sym_path = Storage.materialize(symbol.file_location_stored, Path(workspace, "symbol.sym"))
+        except FileNotFoundError:
+            logger.error(f"Symbol [{symbol_id}] was not found. Cancelling index build.")
+            return
+        with open(sym_path, "rb") as sym, open(index_path, "wb") as out:
+            index_size = symindex.build_index(sym, out)
+        with open(index_path, "rb") as index:
+            Storage.create_stream(symbol.index_location_stored, index)
+
+    symbol.index_size_bytes = index_size
+    db.session.commit()
+    logger.info(f"Symbol [{symbol_id}] - Index built in {time.perf_counter() - start:.3f}s. {symbol.file_size_bytes} byte symbol, {index_size} byte index.")
 
-    @property
-    def url_path(self) -> str:
-        return "{0}/{1}/{0}".format(self.module_id, self.build_id)
 
-    def does_sym_exist(self) -> bool:
-        symbol = Path("/tmp/crash_decode/cache", self.url_path)
-        return symbol.exists()
+def get_decode_histogram() -> RedisHistogram:
+    return RedisHistogram(queue.connection, "crashserver_decode_stage_seconds", "Seconds spent in each stage of decoding a minidump")
 
-    def store_and_convert_symbol(self, file_content: bytes):
-        dump_syms = str(Path("res/bin/linux/dump_syms").absolute())
 
-        # Store PDB
-        pdb_location = Path("/tmp/crash_decode/downloads", self.url_path)
-        pdb_location.parent.mkdir(exist_ok=True, parents=True)
-        with open(pdb_location, "wb") as f:
-            f.write(file_content)
+def record_decode_timings(crash_id, timer: StageTimer):
+    """Add the stage timings of one decode to the shared histogram, and log the breakdown of slow decodes"""
+    if not timer.stages or "project" not in timer.labels:
+        return
 
-        # Convert pdb to sym and store to file
-        filename = self.module_id.split(".")[0] + ".sym"
-        symfile = Path("/tmp/crash_decode/cache", self.module_id, self.build_id, filename)
-        symfile.parent.mkdir(parents=True, exist_ok=True)
-        with open(symfile, "wb") as f:
-            # Write symbol data
-            subprocess.run([dump_syms, pdb_location], stdout=f)
+    total = timer.total
+    observations = [({**timer.labels, "stage": name}, seconds) for name, seconds in timer.stages.items()]
+    observations.append(({**timer.labels, "stage": "total"}, total))
+    get_decode_histogram().observe_many(observations)
 
-        # Delete original pdb
-        os.remove(pdb_location.absolute())
+    if total >= settings.decode.slow_decode_seconds:
+        logger.warning(f"Minidump [{crash_id}] - Slow decode took {total:.3f}s. {timer.breakdown()}")
 
 
-def download_windows_symbol(module_id: str, build_id: str) -> (bool, bool):
-    """Attempts to download and convert symbols from Microsoft Symbol Server.
-    Returns tuple:
-        - 1st tuple: True if successful download, otherwise false
-        - 2nd tuple: True if already downloaded, otherwise false
+def run_stackwalker(dump_path: Path, *symbol_dirs: Path, timer: StageTimer = None, stage: str = "stackwalk") -> dict:
     """
-    cached_sym = LocalSymCache(module_id, build_id)
+    Run the stackwalker against a minidump, and return the parsed json output.
+    The output is parsed while the stackwalker writes it, so the stage time includes parsing.
+    """
+    timer = timer or StageTimer()
+    stackwalker = str(Path("res/bin/linux/stackwalker").absolute())
+    with timer.stage(stage), subprocess.Popen([stackwalker, dump_path, *symbol_dirs], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as machine:
+        return processor.read_stacktrace(machine.stdout)
 
-    if cached_sym.does_sym_exist():
-        return False, True  # Not downloaded, already exists
 
-    logger.debug("LocalSymCache Miss. Attempting to download {}:{}".format(module_id, build_id))
-    res = requests.get("https://msdl.microsoft.com/download/symbols/" + cached_sym.url_path)
-    if res.status_code != 200:
-        logger.debug("Symbol not available on Windows Symbol Server => {}:{}".format(module_id, build_id))
-        return False, False
+def decode_with_indexes(crash_id, minidump: Minidump, crash_data: processor.ProcessedCrash, dump_path: Path, workspace: Path, timer: StageTimer) -> typing.Optional[dict]:
+    """
+    Decode with the in-process symbolizer. The minidump is stackwalked once without symbols, and its frames are then
+    resolved against the index of every symbol. Symbols from the symbol servers are indexed on the host when first used.
+    :return: The stacktrace, or None if an uploaded symbol needed by the minidump has not been indexed yet
+    """
+    with timer.stage("fetch_symbol"):
+        symbols = [minidump.build.symbol] + Symbol.for_modules(db.session, minidump.project_id, crash_data.modules_no_symbols)
+        if any(symbol.index_size_bytes is None for symbol in symbols):
+            return None
+        index_paths = {(s.build.module_id, s.build.build_id): fetch_symbol_index(s, Path(workspace, "indexes")) for s in symbols}
+
+    missing = [m for m in crash_data.modules_no_symbols if m.debug_file and m.debug_id and (m.debug_file, m.debug_id) not in index_paths]
+    with timer.stage("symbol_download"):
+        supplier = HttpSymbolSupplier.from_settings(SYMBOL_CACHE_DIR, CONVERTED_SYMBOL_DIR)
+        supplier.download_symbols(crash_id, missing, minidump.build.symbol.os, workspace)
+    with timer.stage("index_symbol"):
+        for module in missing:
+            index_path = LocalSymCache(SYMBOL_CACHE_DIR, module.debug_file, module.debug_id).sym_index()
+            if index_path:
+                index_paths[(module.debug_file, module.debug_id)] = index_path
 
-    cached_sym.store_and_convert_symbol(res.content)
-    return True, False
+    stacktrace = run_stackwalker(dump_path, timer=timer, stage="stackwalk_unsymbolicated")
+    with timer.stage("symbolize"), Symbolizer(index_paths) as symbolizer:
+        symbolizer.symbolize(stacktrace)
+    return stacktrace
 
 
 def decode_minidump(crash_id):
+    timer = StageTimer()
+    try:
+        with decode_workspace(str(crash_id)) as workspace:
+            _decode_minidump(crash_id, workspace, timer)
+    finally:
+        record_decode_timings(crash_id, timer)
+
+
+def _decode_minidump(crash_id, workspace: Path, timer: StageTimer):
     # Prepare decode environment
-    stackwalker = str(Path("res/bin/linux/stackwalker").absolute())
-    cache_dir = Path("/tmp/crash_decode/cache")
-    current_dump = Path("/tmp/crash_decode/current_dump.dmp")
+    cache_dir = SYMBOL_CACHE_DIR
+    symbol_dir = Path(workspace, "symbols")
+    current_dump = Path(workspace, "current_dump.dmp")
 
     cache_dir.mkdir(parents=True, exist_ok=True)
-    current_dump.parent.mkdir(parents=True, exist_ok=True)
-    current_dump.unlink(missing_ok=True)
 
-    # Symbolicate without symbols to get metadata
     # TODO: Proper error handling for if executable fails
     minidump = db.session.query(Minidump).get(crash_id)
     if not minidump:
         logger.error(f"Minidump [{crash_id}] - Unable to decode. No database entry found.")
         return
+    timer.labels["project"] = str(minidump.project_id)
 
-    # Request symbol and minidump from Storage
-    with open(current_dump, "wb") as dump_out:
+    # Place the minidump within the workspace. It's never read into memory; from filesystem storage it is only linked.
+    with timer.stage("fetch_dump"):
         try:
-            dump_out.write(Storage.retrieve(minidump.file_location).read())
+            Storage.materialize(minidump.file_location, current_dump)
         except FileNotFoundError:
             logger.error(f"Minidump [{minidump.id}] was not found. Cancelling decode process.")
             return
 
-    machine = subprocess.run([stackwalker, current_dump], capture_output=True)
-    json_stack = json.loads(machine.stdout.decode("utf-8"))
-    crash_data = processor.ProcessedCrash.generate(json_stack)
-
-    # Check if a build_metadata already exists. (Previous minidump from same build, or symbol already uploaded)
-    minidump.build = db.session.query(BuildMetadata).filter(BuildMetadata.build_id == crash_data.main_module.debug_id).first()
+    # The main module is known if this minidump was related to its build at upload time, or was decoded before.
+    # Otherwise, read the main module directly from the minidump.
+    crash_data = minidump.json
+    if minidump.build is None:
+        with timer.stage("read_minidump"):
+            dump_info = minidump_reader.read_minidump_file(current_dump)
+        if dump_info and dump_info.build_module:
+            main_module = dump_info.build_module
+            minidump.build = BuildMetadata.get_or_create(db.session, minidump.project_id, main_module.debug_file, main_module.debug_id)
+            crash_data = processor.ProcessedCrash.generate(dump_info.to_stacktrace())
 
-    # The symbol file needed to decode this minidump does not exist.
-    # Make a record in the CompileMetadata table with {build,module}_id. There will be a
-    # relationship from that metadata to the minidump
+    # If the minidump couldn't be read, symbolicate without symbols to get the metadata
     if minidump.build is None:
-        minidump.build = BuildMetadata(
-            project_id=minidump.project_id,
-            module_id=crash_data.main_module.debug_file,
-            build_id=crash_data.main_module.debug_id,
-        )
-        db.session.flush()
-
-    # No symbols? Notify and return
+        json_stack = run_stackwalker(current_dump, timer=timer, stage="stackwalk_unsymbolicated")
+        crash_data = processor.ProcessedCrash.generate(json_stack)
+        minidump.build = BuildMetadata.get_or_create(db.session, minidump.project_id, crash_data.main_module.debug_file, crash_data.main_module.debug_id)
+
+        # No symbols? The stacktrace we have is as good as it gets.
+        if not minidump.build.symbol:
+            logger.info(f"Minidump [{crash_id}] - Symbol [{minidump.build.module_id}:{minidump.build.build_id}] does not exist. Partial stacktrace stored.")
+            minidump.set_stacktrace(json_stack)
+            minidump.symbolicated = False
+            minidump.decode_task_complete = True
+            with timer.stage("modules"):
+                minidump.update_modules(db.session)
+            with timer.stage("signature"):
+                minidump.update_signature(db.session, settings.decode.signature_frames)
+            with timer.stage("commit"):
+                db.session.commit()
+            return
+
+    # No symbols for a known build? Only an unsymbolicated pass is possible.
     if not minidump.build.symbol:
-        logger.info(f"Minidump [{crash_id}] - Symbol [{crash_data.main_module.debug_file}:{crash_data.main_module.debug_id}] does not exist. Partial stacktrace stored.")
-        minidump.stacktrace = json_stack
+        logger.info(f"Minidump [{crash_id}] - Symbol [{minidump.build.module_id}:{minidump.build.build_id}] does not exist. Partial stacktrace stored.")
+        minidump.set_stacktrace(run_stackwalker(current_dump, timer=timer, stage="stackwalk_unsymbolicated"))
         minidump.symbolicated = False
         minidump.decode_task_complete = True
-        db.session.commit()
+        with timer.stage("modules"):
+            minidump.update_modules(db.session)
+        with timer.stage("signature"):
+            minidump.update_signature(db.session, settings.decode.signature_frames)
+        with timer.stage("commit"):
+            db.session.commit()
         return
 
-    # If we get here, then the symbol exists. Get it from the storage module.
-    sym_path = Path(cache_dir, minidump.build.symbol.file_location)
-    sym_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(sym_path, "wb") as out_sym:
-        out_sym.write(Storage.retrieve(minidump.build.symbol.file_location_stored).read())
-
-    # If windows, attempt to download all possible windows symbols before decoding
-    # TODO(james): This is good as a prototype, but should be in a separate HTTP symbol supplier module/class
-    if minidump.build.symbol.os == "windows":
-        logger.debug(f"Minidump [{crash_id}] - Attempting Windows Symbol Server download")
-        num_downloaded, num_existing = 0, 0
-        for module in crash_data.modules_no_symbols:
-            wasDownloaded, alreadyDownloaded = download_windows_symbol(module.debug_file, module.debug_id)
-
-            if wasDownloaded:
-                num_downloaded += 1
-            if alreadyDownloaded:
-                num_existing += 1
-
-        logger.info(f"Minidump [{crash_id}] - Windows Symbols Obtained - [{num_downloaded}] Downloaded - [{num_existing}] Preexisting")
-
-    json_stackwalk = subprocess.run([stackwalker, current_dump, cache_dir], capture_output=True)
-    minidump.stacktrace = json.loads(json_stackwalk.stdout.decode("utf-8"))
+    # If we get here, then the symbol exists. The in-process symbolizer needs the modules without symbols to be known
+    # from a previous stacktrace, or from reading the minidump.
+    stacktrace = None
+    if settings.decode.symbolizer == "index" and crash_data:
+        stacktrace = decode_with_indexes(crash_id, minidump, crash_data, current_dump, workspace, timer)
+
+    if stacktrace is None:
+        # Get the symbol from the symbol cache, or the storage module on a miss.
+        with timer.stage("fetch_symbol"):
+            cache_hit = fetch_symbol(minidump.build.symbol, symbol_dir)
+        logger.debug(f"Minidump [{crash_id}] - Symbol cache {'hit' if cache_hit else 'miss'} for [{minidump.build.module_id}:{minidump.build.build_id}]")
+
+        # Symbols for all other modules are taken from those uploaded to the project, or downloaded from the upstream
+        # symbol servers. The modules without symbols are known from a previous stacktrace, or from reading the minidump.
+        if crash_data:
+            with timer.stage("fetch_symbol"):
+                missing = fetch_module_symbols(minidump.project_id, crash_data.modules_no_symbols, symbol_dir)
+            with timer.stage("symbol_download"):
+                supplier = HttpSymbolSupplier.from_settings(cache_dir, CONVERTED_SYMBOL_DIR)
+                supplier.download_symbols(crash_id, missing, minidump.build.symbol.os, workspace)
+
+        stacktrace = run_stackwalker(current_dump, symbol_dir, cache_dir, timer=timer)
+
+    minidump.set_stacktrace(stacktrace)
     minidump.symbolicated = True
     minidump.decode_task_complete = True
-    db.session.commit()
-    logger.info(f"Minidump [{crash_id}] - Sucessfully decoded.", minidump.id)
+    with timer.stage("modules"):
+        minidump.update_modules(db.session)
+    with timer.stage("signature"):
+        minidump.update_signature(db.session, settings.decode.signature_frames)
+    with timer.stage("commit"):
+        db.session.commit()
+    logger.info(f"Minidump [{minidump.id}] - Successfully decoded.")
+
+
+def decode_minidump_batch(build_id, minidump_ids: list):
+    """
+    Decode many minidumps which share the same build. Used to reprocess every minidump of a build once its symbol
+    has been uploaded. The symbol is prepared once, the minidumps are stackwalked in parallel, and the results
+    are committed in chunks.
+    """
+    with decode_workspace(f"batch-{build_id}") as workspace:
+        _decode_minidump_batch(build_id, minidump_ids, workspace)
+
+
+def _decode_minidump_batch(build_id, minidump_ids: list, workspace: Path):
+    symbol_dir = Path(workspace, "symbols")
+    SYMBOL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    build = db.session.query(BuildMetadata).get(build_id)
+    if not build or not build.symbol:
+        logger.error(f"Build [{build_id}] - Unable to batch decode {len(minidump_ids)} minidumps. Symbol does not exist.")
+        return
+
+    fetch_symbol(build.symbol, symbol_dir)
+    symbol_os = build.symbol.os
+    supplier = HttpSymbolSupplier.from_settings(SYMBOL_CACHE_DIR, CONVERTED_SYMBOL_DIR)
+
+    def stackwalk(dump_id, file_location: Path, timer: StageTimer):
+        """Runs in a worker thread, so only plain values are passed in, and no database access happens here"""
+        dump_path = Path(workspace, f"{dump_id}.dmp")
+        try:
+            with timer.stage("fetch_dump"):
+                Storage.materialize(file_location, dump_path)
+        except FileNotFoundError:
+            logger.error(f"Minidump [{dump_id}] was not found. Skipping in batch decode.")
+            return None
+
+        try:
+            return run_stackwalker(dump_path, symbol_dir, SYMBOL_CACHE_DIR, timer=timer)
+        except Exception:
+            logger.exception(f"Minidump [{dump_id}] - Stackwalk failed in batch decode.")
+            return None
+        finally:
+            dump_path.unlink(missing_ok=True)
+
+    num_decoded = 0
+    requested = set()  # Modules already requested from the symbol servers by this batch
+    chunk_size = settings.decode.batch_commit_size
+    with concurrent.futures.ThreadPoolExecutor(max_workers=settings.decode.batch_concurrency or os.cpu_count()) as executor:
+        for i in range(0, len(minidump_ids), chunk_size):
+            dumps = (
+                db.session.query(Minidump)
+                .options(selectinload(Minidump.loaded_modules))
+                .filter(Minidump.id.in_(minidump_ids[i : i + chunk_size]), Minidump.build_metadata_id == build.id)
+                .all()
+            )
+            timers = {dump: StageTimer() for dump in dumps}
+
+            # Symbols of other modules are shared by the whole job, so are placed before any stackwalk starts. Modules
+            # without an uploaded symbol are requested from the symbol servers once, however many minidumps loaded them.
+            missing = {}
+            for dump in dumps:
+                with timers[dump].stage("fetch_symbol"):
+                    for module in fetch_module_symbols(build.project_id, dump.json.modules_no_symbols, symbol_dir) if dump.json else []:
+                        missing.setdefault((module.debug_file, module.debug_id), module)
+            missing = [module for key, module in missing.items() if key not in requested]
+            requested.update((module.debug_file, module.debug_id) for module in missing)
+
+            if missing:
+                download_start = time.perf_counter()
+                supplier.download_symbols(f"batch-{build_id}", missing, symbol_os, workspace)
+                download_seconds = (time.perf_counter() - download_start) / max(len(dumps), 1)
+                for timer in timers.values():
+                    timer.stages["symbol_download"] = download_seconds
+
+            jobs = {dump: executor.submit(stackwalk, dump.id, dump.file_location, timers[dump]) for dump in dumps}
+
+            for dump, job in jobs.items():
+                stacktrace = job.result()
+                if stacktrace is None:
+                    # Like a decode without symbols, the minidump keeps the stacktrace it had, and is no longer pending
+                    logger.warning(f"Minidump [{dump.id}] - Batch decode failed. Previous stacktrace kept.")
+                    dump.symbolicated = False
+                    dump.decode_task_complete = True
+                    continue
+                dump.set_stacktrace(stacktrace)
+                dump.symbolicated = True
+                dump.decode_task_complete = True
+                with timers[dump].stage("modules"):
+                    dump.update_modules(db.session)
+                with timers[dump].stage("signature"):
+                    dump.update_signature(db.session, settings.decode.signature_frames)
+                num_decoded += 1
+
+            commit_start = time.perf_counter()
+            db.session.commit()
+            commit_seconds = (time.perf_counter() - commit_start) / max(len(dumps), 1)
+
+            # The commit is shared by the whole chunk, so each minidump is charged an equal share
+            for dump, timer in timers.items():
+                timer.labels["project"] = str(build.project_id)
+                timer.stages["commit"] = commit_seconds
+                record_decode_timings(dump.id, timer)
+            logger.info(f"Build [{build_id}] - Batch decode committed {num_decoded}/{len(minidump_ids)} minidumps")
+
+    logger.info(f"Build [{build_id}] - Batch decode complete. {num_decoded} of {len(minidump_ids)} minidumps decoded.")
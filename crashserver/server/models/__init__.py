@@ -1,7 +1,9 @@
 from .annotation import Annotation
 from .attachments import Attachment
 from .build_metadata import BuildMetadata
+from .crash_signature import CrashSignature
 from .minidump import Minidump
+from .module import Module, MinidumpModule
 from .project import Project, ProjectType
 from .storage import Storage
 from .symbol import Symbol
@@ -11,7 +13,10 @@ from .user import User
 __all__ = [
     "Annotation",
     "BuildMetadata",
+    "CrashSignature",
     "Minidump",
+    "MinidumpModule",
+    "Module",
     "Project",
     "ProjectType",
     "Storage",
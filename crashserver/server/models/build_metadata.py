@@ -1,7 +1,9 @@
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import text
 
-from crashserver.server import db
+from crashserver.config import settings
+from crashserver.server import db, queue
+from .minidump import Minidump
 
 
 class BuildMetadata(db.Model):
@@ -26,3 +28,25 @@ class BuildMetadata(db.Model):
         "Minidump",
         primaryjoin="and_(Minidump.build_metadata_id==BuildMetadata.id, Minidump.symbolicated=='false')",
     )
+
+    @staticmethod
+    def get_or_create(session, project_id, module_id: str, build_id: str) -> "BuildMetadata":
+        """
+        Get the BuildMetadata for {module,build}_id within a project. If it does not exist, make a record
+        so minidumps may be related to it, and decoded once the symbol for that build is uploaded.
+        """
+        build = session.query(BuildMetadata).filter_by(project_id=project_id, module_id=module_id, build_id=build_id).first()
+        if build is None:
+            build = BuildMetadata(project_id=project_id, module_id=module_id, build_id=build_id)
+            session.add(build)
+            session.flush()
+        return build
+
+    def decode_task(self, minidump_ids: list):
+        """Queue a single job to decode all given minidumps of this build"""
+        rq_job = queue.enqueue("crashserver.server.jobs." + "decode_minidump_batch", self.id, minidump_ids, job_timeout=settings.decode.batch_timeout)
+        db.session.query(Minidump).filter(Minidump.id.in_(minidump_ids)).update(
+            {Minidump.decode_task_id: rq_job.get_id(), Minidump.decode_task_complete: False},
+            synchronize_session=False,
+        )
+        return rq_job
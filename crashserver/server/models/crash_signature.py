@@ -0,0 +1,86 @@
+import datetime
+import hashlib
+
+from sqlalchemy.dialects.postgresql import UUID, insert
+from sqlalchemy.sql import func, text
+
+from crashserver.server import db
+from .minidump import Minidump
+
+
+class CrashSignature(db.Model):
+    """
+    Every distinct crash signature seen within a project. A signature is the normalized top frames of the
+    crashing thread (see `ProcessedCrash.signature`), and minidumps refer to it by `signature_hash`.
+
+    The counts and first/last seen times are kept up to date as minidumps are decoded, so the most common
+    crashes of a project are known without reading any stacktrace.
+    """
+
+    __tablename__ = "crash_signature"
+    __table_args__ = (db.UniqueConstraint("project_id", "signature_hash"),)
+    id = db.Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    project_id = db.Column(UUID(as_uuid=True), db.ForeignKey("project.id"), nullable=False)
+    signature_hash = db.Column(db.String(length=64), nullable=False)
+    signature = db.Column(db.Text(), nullable=False)
+    crash_count = db.Column(db.Integer(), nullable=False, default=0)
+    first_seen = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    last_seen = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    @staticmethod
+    def hash(signature: str) -> str:
+        return str(hashlib.blake2s(signature.encode()).hexdigest())
+
+    @staticmethod
+    def record(session, project_id, signature: str, seen_at: datetime.datetime = None) -> str:
+        """Count one more crash with this signature, creating the signature if it is new. Returns the signature hash."""
+        signature_hash = CrashSignature.hash(signature)
+        seen_at = seen_at or func.now()
+        stmt = insert(CrashSignature).values(
+            project_id=project_id,
+            signature_hash=signature_hash,
+            signature=signature,
+            crash_count=1,
+            first_seen=seen_at,
+            last_seen=seen_at,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CrashSignature.project_id, CrashSignature.signature_hash],
+            set_={
+                "crash_count": CrashSignature.crash_count + 1,
+                "first_seen": func.least(CrashSignature.first_seen, stmt.excluded.first_seen),
+                "last_seen": func.greatest(CrashSignature.last_seen, stmt.excluded.last_seen),
+            },
+        )
+        session.execute(stmt)
+        return signature_hash
+
+    @staticmethod
+    def forget(session, project_id, signature_hash: str):
+        """Count one less crash with this signature, e.g. when a minidump is re-decoded with better symbols"""
+        session.query(CrashSignature).filter_by(project_id=project_id, signature_hash=signature_hash).update(
+            {CrashSignature.crash_count: CrashSignature.crash_count - 1},
+            synchronize_session=False,
+        )
+
+    @staticmethod
+    def top(session, project_id, since: datetime.datetime, limit: int = 10):
+        """
+        The most frequent signatures of a project since the given time, as (CrashSignature, count) tuples.
+        Only the indexed `minidump.signature_hash` is aggregated, no stacktrace is read.
+        """
+        counts = (
+            session.query(Minidump.signature_hash, func.count().label("num_crashes"))
+            .filter(Minidump.project_id == project_id, Minidump.date_created >= since, Minidump.signature_hash.isnot(None))
+            .group_by(Minidump.signature_hash)
+            .order_by(func.count().desc())
+            .limit(limit)
+            .subquery()
+        )
+        return (
+            session.query(CrashSignature, counts.c.num_crashes)
+            .join(counts, CrashSignature.signature_hash == counts.c.signature_hash)
+            .filter(CrashSignature.project_id == project_id)
+            .order_by(counts.c.num_crashes.desc())
+            .all()
+        )
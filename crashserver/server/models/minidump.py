@@ -1,13 +1,18 @@
+import datetime
+import hashlib
+import json
 import uuid
 from functools import cached_property
 from pathlib import Path
 
 import redis
 import rq
+import zstandard
 from sqlalchemy.dialects.postgresql import UUID, JSONB, INET
 from sqlalchemy.sql import func, text, expression
 
 from crashserver import config
+from crashserver.config import settings
 from crashserver.server import db, queue
 from crashserver.utility import processor
 from .storage import Storage
@@ -24,9 +29,24 @@ class Minidump(db.Model):
     filename: The filename of the guid stored in the MINIDUMP_STORE directory
     client_guid: The guid parameter passed in from the post parameters. Optional.
     stacktrace: Stacktrace decoded with `./stackwalker <dmp> [<symbol_dirs>]`
+    stacktrace_location: Path in storage of the full, zstd compressed stacktrace, if `stacktrace` only holds its
+        crashing thread. Set when `decode.stacktrace_storage` is "split".
+    content_hash: Hash of the minidump file, to recognize repeated uploads of the same minidump
+    duplicate_count: Number of identical uploads received after this one, which were not stored
+
+    The module list of a decoded stacktrace is moved out of `stacktrace` by `update_modules`, into the module
+    catalogue (see `Module`) and this minidump's `loaded_modules`.
+
+    The summary columns describe the stacktrace, so crash lists can be shown without loading it. They are
+    written along with the stacktrace by `set_stacktrace`. `signature_hash` buckets the minidump with others that
+    crashed in the same place (see `CrashSignature`), and is written by `update_signature`.
     """
 
     __tablename__ = "minidump"
+    __table_args__ = (
+        db.Index("ix_minidump_project_date_signature", "project_id", "date_created", "signature_hash"),
+        db.Index("ix_minidump_project_content_hash", "project_id", "content_hash", "date_created"),
+    )
     id = db.Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     project_id = db.Column(UUID(as_uuid=True), db.ForeignKey("project.id"), nullable=False)
     build_metadata_id = db.Column(
@@ -41,8 +61,21 @@ class Minidump(db.Model):
     upload_ip = db.Column(INET(), nullable=True, server_default=None)
     filename = db.Column(db.Text(), nullable=False)
     stacktrace = db.Column(JSONB, nullable=True)
+    stacktrace_location = db.Column(db.Text(), nullable=True)
     decode_task_id = db.Column(db.String(36))
     decode_task_complete = db.Column(db.Boolean())
+    content_hash = db.Column(db.String(length=64), nullable=True)
+    duplicate_count = db.Column(db.Integer(), nullable=False, default=0, server_default="0")
+
+    # Stacktrace summary
+    crash_type = db.Column(db.Text(), nullable=True)
+    crash_address = db.Column(db.Text(), nullable=True)
+    os_name = db.Column(db.Text(), nullable=True)
+    cpu_arch = db.Column(db.Text(), nullable=True)
+    main_module = db.Column(db.Text(), nullable=True)
+    crashing_function = db.Column(db.Text(), nullable=True)
+    thread_count = db.Column(db.Integer(), nullable=True)
+    signature_hash = db.Column(db.String(length=64), nullable=True, index=True)
 
     # Relationships
     project = db.relationship("Project")
@@ -56,11 +89,36 @@ class Minidump(db.Model):
         uselist=False,
     )
     attachments = db.relationship("Attachment")
+    loaded_modules = db.relationship("MinidumpModule", order_by="MinidumpModule.module_index", cascade="all, delete-orphan", passive_deletes=True)
 
     @property
     def file_location(self) -> Path:
         return Path("minidump", str(self.project_id), self.filename)
 
+    @staticmethod
+    def hash_content(file_contents: bytes) -> str:
+        return str(hashlib.blake2s(file_contents).hexdigest())
+
+    @staticmethod
+    def find_duplicate(session, project_id, content_hash: str, window: int):
+        """Find a minidump of the project with identical content, uploaded within the last `window` seconds"""
+        if window <= 0:
+            return None
+        return (
+            session.query(Minidump)
+            .filter(
+                Minidump.project_id == project_id,
+                Minidump.content_hash == content_hash,
+                Minidump.date_created >= func.now() - datetime.timedelta(seconds=window),
+            )
+            .order_by(Minidump.date_created)
+            .first()
+        )
+
+    @property
+    def full_stacktrace_location(self) -> Path:
+        return self.file_location.with_suffix(".stacktrace.json.zst")
+
     def store_minidump(self, file_contents: bytes):
         filename = "minidump-%s.dmp" % str(uuid.uuid4().hex)
 
@@ -81,6 +139,8 @@ class Minidump(db.Model):
             db.session.delete(a)
 
         Storage.delete(self.file_location)
+        if self.stacktrace_location:
+            Storage.delete(Path(self.stacktrace_location))
 
     def decode_task(self, *args, **kwargs):
         rq_job = queue.enqueue("crashserver.server.jobs." + "decode_minidump", self.id, *args, **kwargs)
@@ -95,9 +155,101 @@ class Minidump(db.Model):
             return None
         return rq_job
 
+    def with_modules(self, stacktrace: dict) -> dict:
+        """The stacktrace with its module list, which is rebuilt from `loaded_modules` once catalogued"""
+        if "modules" in stacktrace or not self.loaded_modules:
+            return stacktrace
+        return dict(stacktrace, modules=[link.to_json() for link in self.loaded_modules])
+
     @cached_property
     def json(self):
-        return processor.ProcessedCrash.generate(self.stacktrace)
+        return processor.ProcessedCrash.generate(self.with_modules(self.stacktrace)) if self.stacktrace else None
+
+    @cached_property
+    def full_json(self):
+        """Like `json`, but includes the frames of every thread. They are loaded from storage if the stacktrace is split."""
+        if not self.stacktrace_location:
+            return self.json
+        compressed = Storage.retrieve(Path(self.stacktrace_location)).read()
+        return processor.ProcessedCrash.generate(json.loads(zstandard.ZstdDecompressor().decompress(compressed)))
+
+    def set_stacktrace(self, stacktrace: dict):
+        """
+        Store a stacktrace, along with the summary columns shown in crash lists. When `decode.stacktrace_storage` is
+        "split", only the crashing thread is stored in the database, and the full stacktrace is compressed in storage.
+        """
+        crash = processor.ProcessedCrash.generate(stacktrace)
+        modules = crash.modules
+        main_module = crash.main_module_index
+
+        if settings.decode.stacktrace_storage == "split" and len(stacktrace.get("threads") or []) > 1:
+            compressed = zstandard.ZstdCompressor(level=settings.decode.stacktrace_zstd_level).compress(json.dumps(stacktrace).encode())
+            Storage.create(self.full_stacktrace_location, compressed)
+            self.stacktrace_location = str(self.full_stacktrace_location)
+            self.stacktrace = processor.split_stacktrace(stacktrace)
+        else:
+            if self.stacktrace_location:
+                Storage.delete(Path(self.stacktrace_location))
+            self.stacktrace_location = None
+            self.stacktrace = stacktrace
+        self.crash_type = crash.crash_reason.crash_type
+        self.crash_address = crash.crash_reason.crash_address
+        self.os_name = crash.system.os_name
+        self.cpu_arch = crash.system.cpu_arch
+        self.main_module = modules[main_module].debug_file if main_module is not None and 0 <= main_module < len(modules) else None
+        self.crashing_function = crash.crashing_function
+        self.thread_count = len(crash.threads)
+        self.__dict__.pop("json", None)  # Clear the cached ProcessedCrash of the previous stacktrace
+        self.__dict__.pop("full_json", None)
+
+    def update_modules(self, session):
+        """
+        Move the module list out of the stacktrace. Each module is added to the catalogue if it is new, and only
+        the fields particular to this crash are linked to the minidump.
+        """
+        from crashserver.server.models import Module, MinidumpModule
+        from crashserver.server.models.module import MODULE_COLUMNS, MODULE_IDENTITY
+
+        if not self.stacktrace or "modules" not in self.stacktrace:
+            return
+
+        modules = self.stacktrace["modules"] or []
+        catalogue = Module.catalogue(session, modules)
+        self.loaded_modules = [
+            MinidumpModule(
+                module_index=i,
+                module=catalogue[Module.hash(mod)],
+                base_address=mod.get("base_addr"),
+                end_address=mod.get("end_addr"),
+                missing_symbols=mod.get("missing_symbols", False),
+                fields={key: value for key, value in mod.items() if key not in MODULE_IDENTITY + MODULE_COLUMNS},
+            )
+            for i, mod in enumerate(modules)
+        ]
+        self.stacktrace = {key: value for key, value in self.stacktrace.items() if key != "modules"}
+
+    def update_signature(self, session, depth: int):
+        """Bucket this minidump by the signature of its stacktrace, and keep the project's signature counts in step"""
+        from crashserver.server.models import CrashSignature
+
+        signature = self.json.signature(depth) if self.json else None
+        signature_hash = CrashSignature.hash(signature) if signature else None
+        if signature_hash == self.signature_hash:
+            return
+
+        if self.signature_hash:
+            CrashSignature.forget(session, self.project_id, self.signature_hash)
+        if signature:
+            CrashSignature.record(session, self.project_id, signature, self.date_created)
+        self.signature_hash = signature_hash
+
+    @property
+    def has_summary(self) -> bool:
+        return self.thread_count is not None
+
+    @property
+    def os_icon(self) -> str:
+        return processor.OS_ICONS.get(self.os_name, "")
 
     def symbols_exist(self):
         return self.symbol is not None
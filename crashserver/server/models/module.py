@@ -0,0 +1,115 @@
+import hashlib
+
+from sqlalchemy.dialects.postgresql import JSONB, UUID, insert
+from sqlalchemy.sql import text
+
+from crashserver.server import db
+
+# Fields of a stackwalker module which identify it. The remaining fields differ between crashes of the same module.
+MODULE_IDENTITY = ("debug_file", "debug_id", "code_id", "filename", "version")
+
+# Fields of a stackwalker module which `MinidumpModule` keeps in columns of their own
+MODULE_COLUMNS = ("base_addr", "end_addr", "missing_symbols")
+
+
+class Module(db.Model):
+    """
+    Catalogue of every distinct module loaded by a decoded minidump. Minidumps refer to these through
+    `MinidumpModule`, instead of each stacktrace repeating the full module list.
+
+    module_hash: Hash of the identifying fields, so a module is only catalogued once
+    """
+
+    __tablename__ = "module"
+    __table_args__ = (
+        db.Index("ix_module_debug", "debug_file", "debug_id"),
+        db.Index("ix_module_filename_version", "filename", "version"),
+    )
+    id = db.Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    module_hash = db.Column(db.String(length=64), nullable=False, unique=True)
+    debug_file = db.Column(db.Text(), nullable=True)
+    debug_id = db.Column(db.Text(), nullable=True)
+    code_id = db.Column(db.Text(), nullable=True)
+    filename = db.Column(db.Text(), nullable=True)
+    version = db.Column(db.Text(), nullable=True)
+
+    @staticmethod
+    def hash(module: dict) -> str:
+        identity = "\0".join(module.get(field) or "" for field in MODULE_IDENTITY)
+        return str(hashlib.blake2s(identity.encode()).hexdigest())
+
+    @staticmethod
+    def catalogue(session, modules: list) -> dict:
+        """Add any modules (in the stackwalker format) not yet catalogued. Returns each `Module` by its hash."""
+        rows = {Module.hash(m): {field: m.get(field) for field in MODULE_IDENTITY} for m in modules}
+        if not rows:
+            return {}
+
+        stmt = insert(Module).values([dict(module_hash=module_hash, **fields) for module_hash, fields in rows.items()])
+        session.execute(stmt.on_conflict_do_nothing(index_elements=[Module.module_hash]))
+        return {module.module_hash: module for module in session.query(Module).filter(Module.module_hash.in_(rows.keys()))}
+
+    @staticmethod
+    def minidumps(session, project_id, name: str, version: str = None):
+        """Query of the minidumps in a project which loaded the named module (by filename or debug file), optionally of one version"""
+        from crashserver.server.models import Minidump
+
+        query = (
+            session.query(Minidump)
+            .join(MinidumpModule, MinidumpModule.minidump_id == Minidump.id)
+            .join(Module, Module.id == MinidumpModule.module_id)
+            .filter(Minidump.project_id == project_id, db.or_(Module.filename == name, Module.debug_file == name))
+        )
+        if version is not None:
+            query = query.filter(Module.version == version)
+        return query.distinct()
+
+    @staticmethod
+    def minidumps_missing_symbols(session, project_id, debug_file: str, debug_id: str):
+        """Query of (minidump id, build metadata id) for the minidumps of a project which loaded the module without symbols"""
+        from crashserver.server.models import Minidump
+
+        return (
+            session.query(Minidump.id, Minidump.build_metadata_id)
+            .join(MinidumpModule, MinidumpModule.minidump_id == Minidump.id)
+            .join(Module, Module.id == MinidumpModule.module_id)
+            .filter(Minidump.project_id == project_id, Module.debug_file == debug_file, Module.debug_id == debug_id, MinidumpModule.missing_symbols.is_(True))
+            .distinct()
+        )
+
+
+class MinidumpModule(db.Model):
+    """
+    A module loaded by a minidump, at its position in the stacktrace's module list. Only the fields which differ
+    between crashes of the same module are kept here.
+
+    fields: The remaining fields of the stackwalker module, such as `loaded_symbols` and `symbol_url`, besides those
+        identifying it and those held by the other columns. None for modules catalogued without them.
+    """
+
+    __tablename__ = "minidump_module"
+    __table_args__ = (db.Index("ix_minidump_module_missing_symbols", "module_id", postgresql_where=text("missing_symbols")),)
+    minidump_id = db.Column(UUID(as_uuid=True), db.ForeignKey("minidump.id", ondelete="CASCADE"), primary_key=True)
+    module_index = db.Column(db.Integer(), primary_key=True)
+    module_id = db.Column(UUID(as_uuid=True), db.ForeignKey("module.id"), nullable=False, index=True)
+    base_address = db.Column(db.Text(), nullable=True)
+    end_address = db.Column(db.Text(), nullable=True)
+    missing_symbols = db.Column(db.Boolean(), nullable=False, default=False)
+    fields = db.Column(JSONB, nullable=True)
+
+    # Relationships
+    module = db.relationship("Module", lazy="joined")
+
+    def to_json(self) -> dict:
+        """The module in the stackwalker format, as it was before being catalogued"""
+        mod = {field: getattr(self.module, field) for field in MODULE_IDENTITY}
+        mod.update(base_addr=self.base_address, end_addr=self.end_address)
+        if self.fields is None:
+            # Catalogued without its remaining fields, when `missing_symbols` was only kept if set
+            if self.missing_symbols:
+                mod["missing_symbols"] = True
+            return mod
+
+        mod["missing_symbols"] = self.missing_symbols
+        mod.update(self.fields)
+        return mod
@@ -1,3 +1,6 @@
+import io
+import os
+import shutil
 from pathlib import Path
 from typing import IO, Optional
 from functools import cache
@@ -6,12 +9,16 @@ from loguru import logger
 from sqlalchemy.dialects.postgresql import JSONB
 
 import crashserver.server.storage.modules
-from crashserver.server import db
+from crashserver.config import settings
+from crashserver.server import db, queue
+from crashserver.server.storage import codec
+from crashserver.server.storage.cache import CachedStorage, StorageCache
 from crashserver.server.storage import loader as storage_loader
 from crashserver.server.storage import storage_factory
 from crashserver.server.storage.backend import StorageBackend
 
 STORAGE_INSTANCES: dict[str, StorageBackend] = {}
+STREAM_CHUNK_SIZE = 1024 * 1024
 PRIMARY_STORAGE = ""
 
 
@@ -86,15 +93,26 @@ class Storage(db.Model):
         PRIMARY_STORAGE = db.session.query(Storage.key).filter_by(is_primary=True).first()[0]
         active_targets: [Storage] = db.session.query(Storage).filter_by(is_enabled=True).all()
         for target in sorted(active_targets, key=lambda x: x.key):
-            STORAGE_INSTANCES[target.key] = storage_factory.get_storage_method(target.key)(target.config)
+            instance = storage_factory.get_storage_method(target.key)(target.config)
+            if target.key in settings.storage.cache_backends and settings.storage.cache_bytes > 0:
+                instance = CachedStorage(instance, StorageCache(Path(settings.storage.cache_path), settings.storage.cache_bytes, redis_conn=queue.connection))
+            STORAGE_INSTANCES[target.key] = instance
             STORAGE_INSTANCES[target.key].init()
 
+    @staticmethod
+    def cache_stats() -> dict:
+        """Counters of the read-through cache, shared by every host"""
+        return StorageCache.read_stats(queue.connection)
+
     @property
     def meta(self):
         return storage_factory.get_metadata(self.key)
 
     @staticmethod
     def create(path: Path, file_contents: bytes, backend: str = None):
+        # Compressed when `storage.compression` is set. Tagged with its codec, so `retrieve` can always decode it.
+        file_contents = codec.encode(file_contents, settings.storage.compression, settings.storage.compression_level)
+
         if backend:
             STORAGE_INSTANCES[backend].create(path, file_contents)
             return
@@ -112,21 +130,117 @@ class Storage(db.Model):
         # If we reach here, saving was unsuccessful.
         logger.error(f"Failed [{PRIMARY_STORAGE}] storage of file [{path}]. Successfully stored in {success_backends}.")
 
+    @staticmethod
+    def create_stream(path: Path, file: IO):
+        """
+        Store an object read from a file-like object in chunks, so it's never held in memory. Should the primary
+        backend fail, the file is rewound with `seek(0)`, and read again for each other backend.
+        """
+
+        def encoded():
+            file.seek(0)
+            return codec.encode_stream(file, settings.storage.compression, settings.storage.compression_level)
+
+        if STORAGE_INSTANCES[PRIMARY_STORAGE].create_stream(path, encoded()):
+            return
+
+        success_backends = []
+        for key, instance in STORAGE_INSTANCES.items():
+            if instance.create_stream(path, encoded()):
+                success_backends.append(key)
+
+        logger.error(f"Failed [{PRIMARY_STORAGE}] storage of file [{path}]. Successfully stored in {success_backends}.")
+
     @staticmethod
     def retrieve(path: Path) -> Optional[IO]:
         for key, instance in STORAGE_INSTANCES.items():
             file = instance.read(path)
             if file is not None:
-                return file
+                return codec.decode(file)
         raise FileNotFoundError
 
     @staticmethod
     def retrieve_from_backend(path: Path, key: str) -> Optional[IO]:
         file = STORAGE_INSTANCES[key].read(path)
         if file is not None:
-            return file
+            return codec.decode(file)
+        raise FileNotFoundError
+
+    @staticmethod
+    def open(path: Path) -> IO:
+        """Open a stored object to be read as a stream, decoded as it is read, without loading it in full"""
+        for key, instance in STORAGE_INSTANCES.items():
+            file = instance.open(path)
+            if file is not None:
+                return codec.decode_stream(file)
+        raise FileNotFoundError
+
+    @staticmethod
+    def read_range(path: Path, start: int, length: int) -> bytes:
+        """
+        Read at most length bytes of a stored object, from byte start. Only the range is transferred for objects
+        stored as they were given. An encoded object is decoded as a stream, up to the end of the range.
+        """
+        if length <= 0:
+            return b""
+
+        for key, instance in STORAGE_INSTANCES.items():
+            head = instance.read_range(path, 0, codec.HEADER_SIZE)
+            if head is None:
+                continue
+            if not codec.is_encoded(head):
+                return instance.read_range(path, start, length)
+
+            with codec.decode_stream(instance.open(path)) as file:
+                while start > 0:
+                    skipped = file.read(min(start, STREAM_CHUNK_SIZE))
+                    if not skipped:
+                        return b""
+                    start -= len(skipped)
+                return codec.read_exactly(file, length)
         raise FileNotFoundError
 
+    @staticmethod
+    def materialize(path: Path, dest: Path) -> Path:
+        """
+        Place a stored object, decoded, at the local path dest, without holding it in memory. The filesystem backend
+        links the stored file when it was stored as given, so nothing is copied.
+        """
+        for key, instance in STORAGE_INSTANCES.items():
+            if instance.materialize(path, dest):
+                break
+        else:
+            raise FileNotFoundError
+
+        with open(dest, "rb") as file:
+            encoded = codec.is_encoded(file.read(codec.HEADER_SIZE))
+        if encoded:
+            # Decoded beside dest and moved into place, as dest may be a link to the stored file
+            decoded = dest.with_name(f".{dest.name}.decoded")
+            with open(dest, "rb") as file, open(decoded, "wb") as out:
+                shutil.copyfileobj(codec.decode_stream(file), out, STREAM_CHUNK_SIZE)
+            os.replace(decoded, dest)
+        return dest
+
+    @staticmethod
+    def recode(path: Path) -> int:
+        """
+        Store an existing object again in every backend holding it, encoded as set by `storage.compression`.
+        :return: The number of bytes saved, which is negative if the object grew
+        """
+        saved = 0
+        for key, instance in STORAGE_INSTANCES.items():
+            file = instance.read(path)
+            if file is None:
+                continue
+
+            with file:
+                stored = file.read()
+            encoded = codec.encode(codec.decode(io.BytesIO(stored)).read(), settings.storage.compression, settings.storage.compression_level)
+            if encoded != stored and instance.create(path, encoded):
+                saved += len(stored) - len(encoded)
+        return saved
+
     @staticmethod
     def delete(path: Path):
         for key, instance in STORAGE_INSTANCES.items():
@@ -1,10 +1,12 @@
-import hashlib
 from pathlib import Path
 
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.sql import func, text
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.sql import func, text, tuple_
 
-from crashserver.server import db
+from crashserver.config import settings
+from crashserver.server import db, queue
+from crashserver.utility.symstream import SymbolStream
 from .storage import Storage
 
 
@@ -14,6 +16,7 @@ class Symbol(db.Model):
     project_id: The project which this minidump relates to
     date_created: The timestamp of when the minidump was uploaded
     file_location: The location of the minidump file, with respect to the root storage location
+    index_size_bytes: Size of the address index of the symbol (see `symindex`), stored alongside it. None until built.
     """
 
     __tablename__ = "symbol"
@@ -27,22 +30,47 @@ class Symbol(db.Model):
     file_location = db.Column(db.Text(), nullable=False)
     file_size_bytes = db.Column(db.Integer(), nullable=False)
     file_hash = db.Column(db.String(length=64), nullable=False)
+    index_size_bytes = db.Column(db.BigInteger(), nullable=True)
 
     # Relationships
     project = db.relationship("Project", back_populates="symbol")
     build = db.relationship("BuildMetadata")
 
+    @staticmethod
+    def for_modules(session, project_id, modules: list) -> ["Symbol"]:
+        """Uploaded symbols of a project for any of the given modules (`processor.DumpModule`), along with their build"""
+        from .build_metadata import BuildMetadata
+
+        keys = {(m.debug_file, m.debug_id) for m in modules if m.debug_file and m.debug_id}
+        if not keys:
+            return []
+        return (
+            session.query(Symbol)
+            .join(BuildMetadata, Symbol.build_metadata_id == BuildMetadata.id)
+            .options(contains_eager(Symbol.build))
+            .filter(BuildMetadata.project_id == project_id, tuple_(BuildMetadata.module_id, BuildMetadata.build_id).in_(keys))
+            .all()
+        )
+
     @property
     def file_location_stored(self) -> Path:
         return Path("symbol", str(self.project_id), self.file_location)
 
-    def store_file(self, file_content: bytes):
+    @property
+    def index_location_stored(self) -> Path:
+        return self.file_location_stored.with_suffix(".symidx")
+
+    def index_task(self):
+        return queue.enqueue("crashserver.server.jobs." + "build_symbol_index", self.id, job_timeout=settings.decode.symbol_index_timeout)
+
+    def store_file(self, symbol_file: SymbolStream):
         filesystem_module_id = self.build.module_id.split(".")[0]
         dir_location = Path(self.build.module_id, self.build.build_id, filesystem_module_id + ".sym")
 
+        # Sent to storage in chunks. The size and hash are known once it has been read in full.
         sym_loc = Path("symbol", str(self.project_id), dir_location)
-        Storage.create(sym_loc, file_content)
+        Storage.create_stream(sym_loc, symbol_file)
 
-        self.file_size_bytes = len(file_content)
+        self.file_size_bytes = symbol_file.size
         self.file_location = str(dir_location)
-        self.file_hash = str(hashlib.blake2s(file_content).hexdigest())
+        self.file_hash = symbol_file.hexdigest()
@@ -1,4 +1,5 @@
-import hashlib
+import shutil
+import typing
 from pathlib import Path
 
 from sqlalchemy.dialects.postgresql import UUID
@@ -6,6 +7,7 @@ from sqlalchemy.sql import func, text
 
 from crashserver.server import db
 from crashserver.utility.misc import SymbolData
+from crashserver.utility.symstream import CHUNK_SIZE, SymbolStream
 
 
 class SymbolUploadV2(db.Model):
@@ -38,12 +40,13 @@ class SymbolUploadV2(db.Model):
     def symbol_data(self):
         return SymbolData(module_id=self.module_id, build_id=self.build_id, arch=self.arch, os=self.os)
 
-    def store_file(self, file_content: bytes):
-        # Ensure very first line starts with word "MODULE"
-        file_content = file_content[file_content.find("MODULE".encode()) :]
-
-        first_line = file_content[: file_content.find("\n".encode())].decode("utf-8")
-        symbol_data = SymbolData.from_module_line(first_line)
+    def store_file(self, stream: typing.BinaryIO):
+        """
+        Store the uploaded symbol, from its MODULE line onward, as it is read from the request.
+        :raises ValueError: If the upload has no MODULE line
+        """
+        symbol_file = SymbolStream(stream)
+        symbol_data = symbol_file.symbol_data
         self.build_id = symbol_data.build_id
         self.module_id = symbol_data.module_id
         self.arch = symbol_data.arch
@@ -51,11 +54,9 @@ class SymbolUploadV2(db.Model):
 
         self.file_location.parent.mkdir(parents=True, exist_ok=True)
         with open(self.file_location.absolute(), "wb") as f:
-            f.write(file_content)
+            shutil.copyfileobj(symbol_file, f, CHUNK_SIZE)
 
-        self.file_hash = str(hashlib.blake2s(file_content).hexdigest())
+        self.file_hash = symbol_file.hexdigest()
 
-    def load_file(self) -> bytes:
-        with open(self.file_location.absolute(), "rb") as f:
-            file_content = f.read()
-        return file_content
+    def open_file(self) -> typing.BinaryIO:
+        return open(self.file_location.absolute(), "rb")
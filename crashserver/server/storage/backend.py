@@ -11,9 +11,21 @@ class StorageBackend(typing.Protocol):
     def create(self, path: Path, file_content: bytes) -> bool:
         """Store file_content at the given path. Return true for success, otherwise false"""
 
+    def create_stream(self, path: Path, file: typing.IO) -> bool:
+        """Store the contents of a file-like object at the given path, read in chunks. Return true for success, otherwise false"""
+
     def read(self, path: Path) -> typing.Optional[typing.IO]:
         """Read data from given path. Return bytes of result. May raise storage.errors.FileNotFound"""
 
+    def open(self, path: Path) -> typing.Optional[typing.IO]:
+        """Open the file at path to be read as a stream, without loading it in full. Return None if it does not exist"""
+
+    def read_range(self, path: Path, start: int, length: int) -> typing.Optional[bytes]:
+        """Read at most length bytes of the file at path, from byte start. Return None if it does not exist"""
+
+    def materialize(self, path: Path, dest: Path) -> bool:
+        """Place the file at path at the local path dest. Return true for success, or false if it does not exist"""
+
     def delete(self, path: Path) -> bool:
         """Delete file at given path. Return bool for success"""
 
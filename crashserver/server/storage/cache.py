@@ -0,0 +1,213 @@
+"""
+cache: A read-through cache on local disk, in front of a storage backend such as S3.
+
+`CachedStorage` wraps any backend registered with `storage_factory`. Objects read from the backend are kept as the
+entries of a `DiskLRUCache` within a byte budget, so hot symbols and minidumps are read from local disk. Writes go to
+the backend, and drop the cached entry. Objects are only cached by the hosts which read them.
+
+The blake2s hash of each entry is recorded when it is cached, and checked when it's first read on the host, so a
+damaged entry is dropped and read from the backend again rather than returned.
+"""
+import fcntl
+import hashlib
+import io
+import os
+import tempfile
+import typing
+from pathlib import Path
+
+from loguru import logger
+
+from crashserver.utility.diskcache import DiskLRUCache, link_or_copy
+
+STATS_KEY = "crashserver:stats:storage_cache"
+COUNTERS = ("hits", "misses", "evictions", "invalid")
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(file: typing.BinaryIO) -> str:
+    digest = hashlib.blake2s()
+    while chunk := file.read(CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StorageCache(DiskLRUCache):
+    """
+    Entries are keyed by the hash of their storage path. The content hash of each entry is kept under `digests/`,
+    which eviction skips as it's a directory. Once an entry has been checked against its hash, the inode and size it
+    had are recorded beside the hash, so other processes on the host skip the check until the entry is replaced.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, redis_conn=None):
+        super().__init__(root, max_bytes, redis_conn=redis_conn, stats_key=STATS_KEY)
+        self.counters["invalid"] = 0
+        self.digest_root = self.root / "digests"
+        self.digest_root.mkdir(exist_ok=True)
+
+    @staticmethod
+    def key(path: Path) -> str:
+        return hashlib.blake2s(str(path).encode()).hexdigest()
+
+    @staticmethod
+    def read_stats(redis_conn) -> dict:
+        """Counters shared by the caches of all hosts, and the fraction of lookups served from a valid entry"""
+        res = {key.decode(): int(value) for key, value in redis_conn.hgetall(STATS_KEY).items()}
+        stats = {counter: res.get(counter, 0) for counter in COUNTERS}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] - stats["invalid"]) / lookups if lookups else None
+        return stats
+
+    def digest_path(self, key: str) -> Path:
+        return self.digest_root / key
+
+    def checked_path(self, key: str) -> Path:
+        return self.digest_root / f"{key}.checked"
+
+    def remove(self, key: str):
+        super().remove(key)
+        self.digest_path(key).unlink(missing_ok=True)
+        self.checked_path(key).unlink(missing_ok=True)
+
+    def put_validated(self, key: str, src: Path, dest: typing.Optional[Path] = None) -> Path:
+        """Move the file at src into the cache as the entry for key, recording its hash"""
+        with open(src, "rb") as f:
+            digest = file_digest(f)
+        self.checked_path(key).unlink(missing_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=self.digest_root, prefix=".tmp-", delete=False) as tmp:
+            tmp.write(digest)
+        os.replace(tmp.name, self.digest_path(key))
+        return self.put_file(key, src, dest)
+
+    def is_checked(self, key: str, checked: str) -> bool:
+        try:
+            return self.checked_path(key).read_text() == checked
+        except FileNotFoundError:
+            return False
+
+    def validate(self, key: str, file: typing.BinaryIO) -> bool:
+        """
+        Check an opened entry against the hash recorded when it was cached, unless it has already been checked on
+        this host. Readers of a checked entry share a lock. Processes checking an entry hold it exclusively, so it is
+        hashed once, and the lock is upgraded with the check repeated, as another process may have finished it first.
+        An invalid entry is removed.
+        """
+        stat = os.fstat(file.fileno())
+        checked = f"{stat.st_ino} {stat.st_size}"
+        try:
+            with open(self.digest_path(key)) as digest:
+                fcntl.flock(digest, fcntl.LOCK_SH)
+                if self.is_checked(key, checked):
+                    return True
+                fcntl.flock(digest, fcntl.LOCK_EX)
+                if self.is_checked(key, checked):
+                    return True
+
+                if digest.read() == file_digest(file):
+                    file.seek(0)
+                    self.checked_path(key).write_text(checked)
+                    return True
+        except FileNotFoundError:
+            pass
+
+        logger.warning(f"[CACHE] Entry {key} in {self.root} failed validation. Removed.")
+        self.remove(key)
+        self.count("invalid")
+        return False
+
+    def open_entry(self, key: str) -> typing.Optional[typing.BinaryIO]:
+        """Open the entry for key, if it exists and is valid. It remains readable even if it is evicted."""
+        entry = self.entry_path(key)
+        try:
+            os.utime(entry)  # Mark as recently used
+            file = open(entry, "rb")
+        except FileNotFoundError:
+            self.count("misses")
+            return None
+
+        self.count("hits")
+        if not self.validate(key, file):
+            file.close()
+            return None
+        return file
+
+
+class CachedStorage:
+    """A storage backend, read through a `StorageCache`"""
+
+    def __init__(self, backend, cache: StorageCache):
+        self.backend = backend
+        self.cache = cache
+
+    def init(self) -> None:
+        self.backend.init()
+
+    def create(self, path: Path, file_contents: bytes) -> bool:
+        """Store the data at path in the backend. The cached entry is dropped, and the data is cached once read."""
+        self.cache.remove(self.cache.key(path))
+        return self.backend.create(path, file_contents)
+
+    def create_stream(self, path: Path, file: typing.IO) -> bool:
+        """Store the contents of a file-like object at path in the backend. The cached entry is dropped."""
+        self.cache.remove(self.cache.key(path))
+        return self.backend.create_stream(path, file)
+
+    def fill(self, path: Path) -> typing.Optional[typing.BinaryIO]:
+        """
+        Read the object at path from the backend into the cache. It's returned opened, as it may be evicted as soon
+        as it is cached. Objects larger than the whole cache are returned without being cached.
+        """
+        with tempfile.NamedTemporaryFile(dir=self.cache.root, prefix=".tmp-", delete=False) as tmp:
+            pass
+        fetched = Path(tmp.name)
+        if not self.backend.materialize(path, fetched):
+            fetched.unlink(missing_ok=True)
+            return None
+
+        file = open(fetched, "rb")
+        if os.fstat(file.fileno()).st_size > self.cache.max_bytes:
+            fetched.unlink()
+        else:
+            self.cache.put_validated(self.cache.key(path), fetched)
+        return file
+
+    def read(self, path: Path) -> typing.Optional[typing.IO]:
+        """Retrieve and return the file at path as a file-like object, from the cache, or from the backend on a miss"""
+        file = self.open(path)
+        if file is None:
+            return None
+        with file:
+            return io.BytesIO(file.read())
+
+    def open(self, path: Path) -> typing.Optional[typing.IO]:
+        """Open the cached entry for the file at path, reading it from the backend into the cache on a miss"""
+        return self.cache.open_entry(self.cache.key(path)) or self.fill(path)
+
+    def read_range(self, path: Path, start: int, length: int) -> typing.Optional[bytes]:
+        """Read a range from the cached entry. On a miss, only the range is read from the backend, and nothing is cached."""
+        file = self.cache.open_entry(self.cache.key(path))
+        if file is None:
+            return self.backend.read_range(path, start, length)
+        with file:
+            file.seek(start)
+            return file.read(length)
+
+    def materialize(self, path: Path, dest: Path) -> bool:
+        """Link the cached entry to dest, reading it from the backend into the cache on a miss"""
+        file = self.open(path)
+        if file is None:
+            return False
+
+        with file:
+            try:
+                link_or_copy(self.cache.entry_path(self.cache.key(path)), dest)
+            except FileNotFoundError:
+                # Evicted since it was opened, or too large to be cached, so it's copied from the opened file
+                with open(dest, "wb") as out:
+                    while chunk := file.read(CHUNK_SIZE):
+                        out.write(chunk)
+        return True
+
+    def delete(self, path: Path) -> bool:
+        self.cache.remove(self.cache.key(path))
+        return self.backend.delete(path)
@@ -0,0 +1,115 @@
+"""
+codec: Compression of stored objects, tagged per object, so every object can be read no matter how it was stored.
+
+An encoded object starts with CODEC_MAGIC, and a byte naming its codec. Objects without the magic are stored as
+they were given, as was every object stored before compression existed. An object which happens to begin with the
+magic is stored with the identity codec, so it is never mistaken for an encoded object.
+"""
+import io
+import typing
+
+import zstandard
+
+CODEC_MAGIC = b"\x89CSZ\r\n\x1a\n"
+HEADER_SIZE = len(CODEC_MAGIC) + 1
+IDENTITY = 0
+ZSTD = 1
+CODECS = {"none": IDENTITY, "zstd": ZSTD}
+
+
+def encode(file_contents: bytes, compression: str, level: int = 3) -> bytes:
+    """Encode an object to be stored. Objects which do not shrink when compressed are stored as they are."""
+    if CODECS[compression] == ZSTD:
+        compressed = zstandard.ZstdCompressor(level=level).compress(file_contents)
+        if len(compressed) + HEADER_SIZE < len(file_contents):
+            return CODEC_MAGIC + bytes([ZSTD]) + compressed
+
+    if file_contents.startswith(CODEC_MAGIC):
+        return CODEC_MAGIC + bytes([IDENTITY]) + file_contents
+    return file_contents
+
+
+def is_encoded(head: bytes) -> bool:
+    """If an object beginning with `head` (at least HEADER_SIZE bytes of it) was encoded, rather than stored as given"""
+    return len(head) >= HEADER_SIZE and head.startswith(CODEC_MAGIC)
+
+
+def read_exactly(file: typing.IO, size: int) -> bytes:
+    """Read size bytes from a stream which may return less per read. Fewer are only returned at the end of the stream."""
+    data = b""
+    while len(data) < size:
+        chunk = file.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class PrefixedReader:
+    """A file-like object reading `prefix`, then the rest of `file`"""
+
+    def __init__(self, prefix: bytes, file: typing.IO):
+        self.prefix = prefix
+        self.file = file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data, self.prefix = self.prefix + self.file.read(), b""
+            return data
+        if self.prefix:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+            return data
+        return self.file.read(size)
+
+
+def encode_stream(file: typing.IO, compression: str, level: int = 3) -> typing.IO:
+    """
+    Encode an object to be stored as it is read from `file`, as a file-like object. Unlike `encode`, a compressed
+    object is stored compressed even if it grows, as that is only known once it has been read in full.
+    """
+    if CODECS[compression] == ZSTD:
+        return PrefixedReader(CODEC_MAGIC + bytes([ZSTD]), zstandard.ZstdCompressor(level=level).stream_reader(file))
+
+    head = read_exactly(file, HEADER_SIZE)
+    if head.startswith(CODEC_MAGIC):
+        head = CODEC_MAGIC + bytes([IDENTITY]) + head
+    return PrefixedReader(head, file)
+
+
+def decode(file: typing.IO) -> typing.IO:
+    """Decode a stored object, read from the start of a seekable file-like object"""
+    header = file.read(HEADER_SIZE)
+    if not is_encoded(header):
+        file.seek(0)
+        return file
+
+    codec = header[-1]
+    if codec == IDENTITY:
+        return io.BytesIO(file.read())
+    if codec == ZSTD:
+        # Objects encoded as they were streamed have no content size in their frame header
+        return io.BytesIO(zstandard.ZstdDecompressor().decompressobj().decompress(file.read()))
+    raise ValueError(f"Stored object has unknown codec {codec}")
+
+
+def decode_stream(file: typing.IO) -> typing.IO:
+    """Decode a stored object as it is read from a file-like object, which need not be seekable"""
+    header = read_exactly(file, HEADER_SIZE)
+    if not is_encoded(header):
+        return PrefixedReader(header, file)
+
+    codec = header[-1]
+    if codec == IDENTITY:
+        return file
+    if codec == ZSTD:
+        return zstandard.ZstdDecompressor().stream_reader(file)
+    raise ValueError(f"Stored object has unknown codec {codec}")
@@ -1,8 +1,24 @@
 import io
+import os
+import shutil
+import tempfile
 import typing
 from pathlib import Path
 from loguru import logger
 from crashserver.server.storage import storage_factory
+from crashserver.utility.diskcache import link_or_copy
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Stored files get the permissions of a file created with open()
+FILE_MODE = 0o666 & ~current_umask()
 
 
 class DiskStorage:
@@ -17,16 +33,35 @@ class DiskStorage:
 
     def create(self, path: Path, file_contents: bytes) -> bool:
         """Store the data in file at path. Return bool for success"""
+        return self.write_file(path, lambda outfile: outfile.write(file_contents))
+
+    def create_stream(self, path: Path, file: typing.IO) -> bool:
+        """Store the contents of a file-like object at path, copied in chunks. Return bool for success"""
+        return self.write_file(path, lambda outfile: shutil.copyfileobj(file, outfile, CHUNK_SIZE))
+
+    def write_file(self, path: Path, write: typing.Callable[[typing.IO], typing.Any]) -> bool:
+        """
+        Write a file at path through the write callback. It's written beside the file and moved into place, as the
+        existing file may have been linked elsewhere by `materialize`, so must never be changed.
+        """
         filepath = Path(self.config.get("path"), path)
         filepath.parent.mkdir(parents=True, exist_ok=True)
 
         logger.debug(f"[STORAGE/DISK] Creating file {filepath}")
+        tmp = tempfile.NamedTemporaryFile(dir=filepath.parent, prefix=".tmp-", delete=False)
         try:
-            with open(filepath, "wb+") as outfile:
-                outfile.write(file_contents)
+            with tmp as outfile:
+                write(outfile)
+            os.chmod(tmp.name, FILE_MODE)  # Temporary files are only readable by their owner
+            os.replace(tmp.name, filepath)
             return True
-        except:
+        except Exception as ex:
+            os.unlink(tmp.name)
+            logger.error(f"[STORAGE/DISK] Failed to create file {filepath}: {ex}")
             return False
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
 
     def read(self, path: Path) -> typing.Optional[typing.IO]:
         """Retrieve and return the file at path as a file-like object"""
@@ -36,8 +71,37 @@ class DiskStorage:
             return None
 
         logger.debug(f"[STORAGE/DISK] Reading file {filepath}")
-        with open(filepath, "rb") as outfile:
-            return io.BytesIO(outfile.read())
+        with open(filepath, "rb") as file:
+            return io.BytesIO(file.read())
+
+    def open(self, path: Path) -> typing.Optional[typing.IO]:
+        """Open the file at path to be read as a stream"""
+        filepath = self.config.get("path") / path
+        try:
+            return open(filepath, "rb")
+        except FileNotFoundError:
+            logger.debug(f"[STORAGE/DISK] Cannot load file [{filepath}]. File does not exist.")
+            return None
+
+    def read_range(self, path: Path, start: int, length: int) -> typing.Optional[bytes]:
+        """Read at most length bytes of the file at path, from byte start"""
+        file = self.open(path)
+        if file is None:
+            return None
+        with file:
+            file.seek(start)
+            return file.read(length)
+
+    def materialize(self, path: Path, dest: Path) -> bool:
+        """Hard-link the file at path to dest, so nothing is copied unless dest is on another filesystem"""
+        filepath = self.config.get("path") / path
+        logger.debug(f"[STORAGE/DISK] Linking file {filepath} to {dest}")
+        try:
+            link_or_copy(filepath, dest)
+            return True
+        except FileNotFoundError:
+            logger.debug(f"[STORAGE/DISK] Cannot load file [{filepath}]. File does not exist.")
+            return False
 
     def delete(self, path: Path) -> bool:
         """Delete the file at path. Return bool for success"""
@@ -4,16 +4,67 @@ from pathlib import Path
 
 import boto3
 import botocore.exceptions
+from boto3.s3.transfer import TransferConfig
 from loguru import logger
 
 from crashserver.server.storage import storage_factory
 
+MiB = 1024 * 1024
+
+# Multipart transfer tuning, stored within the config of each S3 backend alongside its credentials
+TRANSFER_DEFAULTS = {
+    "multipart_threshold_mb": 16,
+    "multipart_chunksize_mb": 16,
+    "max_concurrency": 8,
+}
+TRANSFER_OPTIONS = [
+    {"key": "multipart_threshold_mb", "title": "Multipart Threshold (MiB)", "desc": "Objects at least this large are uploaded and downloaded in parts"},
+    {"key": "multipart_chunksize_mb", "title": "Part Size (MiB)", "desc": "Size of each part of a multipart transfer. At least 5 MiB for S3."},
+    {"key": "max_concurrency", "title": "Concurrent Parts", "desc": "Number of parts transferred at once, per object"},
+]
+
+
+def transfer_config(config: dict) -> TransferConfig:
+    """Build the multipart transfer settings of a backend config. Values from the web config are strings."""
+    settings = {key: int(config.get(key) or default) for key, default in TRANSFER_DEFAULTS.items()}
+    if min(settings.values()) < 1:
+        raise ValueError(f"S3 transfer settings must be positive: {settings}")
+    return TransferConfig(
+        multipart_threshold=settings["multipart_threshold_mb"] * MiB,
+        multipart_chunksize=settings["multipart_chunksize_mb"] * MiB,
+        max_concurrency=settings["max_concurrency"],
+        use_threads=settings["max_concurrency"] > 1,
+    )
+
+
+class IterableReader:
+    """A file-like object reading the chunks of an iterable of bytes"""
+
+    def __init__(self, chunks: typing.Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.buffer = b""
+
+    def read(self, size: int = -1) -> bytes:
+        while size is None or size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
 
 class S3CompatibleStorage:
     def __init__(self, storage_name: str, config: dict = None):
         self.storage_name = storage_name
-        self.config = config
+        self.config = dict(config)  # Left as given, as S3Generic builds its own store from the same config
         self.bucket_name = self.config.pop("bucket_name", "crashserver")
+        self.transfer_config = transfer_config(self.config)
+        for key in TRANSFER_DEFAULTS:
+            self.config.pop(key, None)
         self.s3 = None
 
     def init_storage(self):
@@ -25,22 +76,64 @@ class S3CompatibleStorage:
     def create(self, path: Path, file_contents: bytes) -> bool:
         logger.debug(f"[STORAGE/{self.storage_name}] Creating file {path}")
         try:
-            self.s3.upload_fileobj(io.BytesIO(file_contents), self.bucket_name, str(path))
+            self.s3.upload_fileobj(io.BytesIO(file_contents), self.bucket_name, str(path), Config=self.transfer_config)
             return True
         except:
             return False
 
+    def create_stream(self, path: Path, file: typing.Union[typing.IO, typing.Iterable[bytes]]) -> bool:
+        """Objects larger than the multipart threshold are uploaded in parts, concurrently, as they are read"""
+        logger.debug(f"[STORAGE/{self.storage_name}] Creating file {path}")
+        if not hasattr(file, "read"):
+            file = IterableReader(file)
+        try:
+            self.s3.upload_fileobj(file, self.bucket_name, str(path), Config=self.transfer_config)
+            return True
+        except:
+            logger.exception(f"[STORAGE/{self.storage_name}] Unable to create file [{path}]")
+            return False
+
     def retrieve(self, path: Path) -> typing.Optional[typing.IO]:
         logger.debug(f"[STORAGE/{self.storage_name}] Reading file {path}")
         data = io.BytesIO()
         try:
-            self.s3.download_fileobj(self.bucket_name, str(path), data)
+            self.s3.download_fileobj(self.bucket_name, str(path), data, Config=self.transfer_config)
             data.seek(0)
             return data
         except botocore.exceptions.ClientError:  # Thrown when file is not available
             logger.debug(f"[STORAGE/{self.storage_name}] Unable to read file [{path}]")
             return None
 
+    def open(self, path: Path) -> typing.Optional[typing.IO]:
+        logger.debug(f"[STORAGE/{self.storage_name}] Opening file {path}")
+        try:
+            return self.s3.get_object(Bucket=self.bucket_name, Key=str(path))["Body"]
+        except botocore.exceptions.ClientError:
+            logger.debug(f"[STORAGE/{self.storage_name}] Unable to read file [{path}]")
+            return None
+
+    def read_range(self, path: Path, start: int, length: int) -> typing.Optional[bytes]:
+        logger.debug(f"[STORAGE/{self.storage_name}] Reading {length} bytes of file {path} from {start}")
+        try:
+            res = self.s3.get_object(Bucket=self.bucket_name, Key=str(path), Range=f"bytes={start}-{start + length - 1}")
+            return res["Body"].read()
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":  # Starts past the end of the file
+                return b""
+            logger.debug(f"[STORAGE/{self.storage_name}] Unable to read file [{path}]")
+            return None
+
+    def materialize(self, path: Path, dest: Path) -> bool:
+        """Download the file at path to dest, in concurrent ranged parts if it is larger than the multipart threshold"""
+        logger.debug(f"[STORAGE/{self.storage_name}] Downloading file {path} to {dest}")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self.s3.download_file(self.bucket_name, str(path), str(dest), Config=self.transfer_config)
+            return True
+        except botocore.exceptions.ClientError:
+            logger.debug(f"[STORAGE/{self.storage_name}] Unable to read file [{path}]")
+            return False
+
     def delete(self, path: Path) -> bool:
         logger.debug(f"[STORAGE/{self.storage_name}] Deleting file {path}")
         self.s3.delete_object(Bucket=self.bucket_name, Key=str(path))
@@ -59,10 +152,26 @@ class S3Storage:
         """Store the data in file at path. Return bool for success"""
         return self.store.create(path, file_contents)
 
+    def create_stream(self, path: Path, file: typing.IO) -> bool:
+        """Store the contents of a file-like object at path, uploaded in parts. Return bool for success"""
+        return self.store.create_stream(path, file)
+
     def read(self, path: Path) -> typing.Optional[typing.IO]:
         """Retrieve and return the file at path as a file-like object"""
         return self.store.retrieve(path)
 
+    def open(self, path: Path) -> typing.Optional[typing.IO]:
+        """Open the file at path to be read as a stream"""
+        return self.store.open(path)
+
+    def read_range(self, path: Path, start: int, length: int) -> typing.Optional[bytes]:
+        """Read at most length bytes of the file at path, from byte start"""
+        return self.store.read_range(path, start, length)
+
+    def materialize(self, path: Path, dest: Path) -> bool:
+        """Download the file at path to the local path dest"""
+        return self.store.materialize(path, dest)
+
     def delete(self, path: Path) -> bool:
         """Delete the file at path. Return bool for success"""
         return self.store.delete(path)
@@ -88,6 +197,7 @@ class S3Meta:
             "aws_secret_access_key": "",
             "bucket_name": "",
             "region_name": "",
+            **TRANSFER_DEFAULTS,
         }
 
     @staticmethod
@@ -99,6 +209,7 @@ class S3Meta:
                 {"key": "aws_access_key_id", "title": "Access Key ID", "desc": "The Access Key ID"},
                 {"key": "aws_secret_access_key", "title": "Secret Access Key", "desc": "The Access Key Secret for the Access Key ID"},
                 {"key": "region_name", "title": "Bucket Region", "desc": "The region for the bucket"},
+                *TRANSFER_OPTIONS,
             ],
             "actions": [
                 {"func": "upload_data", "desc": "Upload all local data to AWS S3"},
@@ -118,6 +229,7 @@ class S3Meta:
             region_name=config.get("region_name", ""),
         )
         try:
+            transfer_config(config)
             res = client.head_bucket(Bucket=config.get("bucket_name", ""))
             return res
         except:
@@ -153,6 +265,7 @@ class S3GenericMeta:
             "endpoint_url": "",
             "bucket_name": "",
             "region_name": "",
+            **TRANSFER_DEFAULTS,
         }
 
     @staticmethod
@@ -165,6 +278,7 @@ class S3GenericMeta:
                 {"key": "aws_access_key_id", "title": "Access Key ID", "desc": "The Access Key ID"},
                 {"key": "aws_secret_access_key", "title": "Secret Access Key", "desc": "The Access Key Secret for the Access Key ID"},
                 {"key": "region_name", "title": "Bucket Region", "desc": "The region for the bucket"},
+                *TRANSFER_OPTIONS,
             ],
             "actions": [
                 {"func": "upload_data", "desc": "Upload all local data to AWS S3"},
@@ -182,6 +296,7 @@ class S3GenericMeta:
             region_name=config.get("region_name", ""),
         )
         try:
+            transfer_config(config)
             res = client.head_bucket(Bucket=config.get("bucket_name", ""))
             return res
         except:
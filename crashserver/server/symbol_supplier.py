@@ -0,0 +1,300 @@
+"""
+symbol_supplier: Download symbols for modules which CrashServer does not have symbols for.
+
+Upstream symbol servers are configured in order under `decode.symbol_servers`. Each server either hosts breakpad
+`.sym` files directly, or hosts debug files (e.g. PDBs on the Microsoft Symbol Server) which are converted to
+`.sym` files with `dump_syms`. Every symbol obtained is stored in a `LocalSymCache` on disk, shared by all workers
+on the host, and definite misses are remembered in redis so no worker asks for them again until they expire.
+"""
+import concurrent.futures
+import contextlib
+import dataclasses
+import fcntl
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+import typing
+from pathlib import Path
+
+import redis
+import requests
+from loguru import logger
+
+from crashserver.config import settings
+from crashserver.server.core.extensions import queue
+from crashserver.utility import symindex
+from crashserver.utility.diskcache import DiskLRUCache
+
+
+def sym_filename(module_id: str) -> str:
+    """Name of a breakpad symbol file for a module, following breakpad's symbol supplier convention"""
+    return (module_id[:-4] if module_id.lower().endswith(".pdb") else module_id) + ".sym"
+
+
+class LocalSymCache:
+    def __init__(self, root: Path, module_id: str, build_id: str):
+        self.root = root
+        self.module_id = module_id
+        self.build_id = build_id
+
+    @property
+    def sym_path(self) -> Path:
+        return Path(self.root, self.module_id, self.build_id, sym_filename(self.module_id))
+
+    @property
+    def index_path(self) -> Path:
+        return self.sym_path.with_suffix(".symidx")
+
+    def does_sym_exist(self) -> bool:
+        return self.sym_path.exists()
+
+    def sym_index(self) -> typing.Optional[Path]:
+        """Address index of the symbol (see `symindex`), built beside it the first time it is needed. None if there is no symbol."""
+        if self.index_path.exists():
+            return self.index_path
+        if not self.does_sym_exist():
+            return None
+
+        with open(self.sym_path, "rb") as sym, tempfile.NamedTemporaryFile(dir=self.sym_path.parent, prefix=".tmp-", delete=False) as f:
+            symindex.build_index(sym, f)
+        os.replace(f.name, self.index_path)
+        return self.index_path
+
+    def store_symbol(self, file_content: bytes, workspace: Path):
+        """Store a breakpad symbol file. It's written within the workspace, then moved into the shared cache"""
+        self.sym_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=workspace, delete=False) as f:
+            f.write(file_content)
+        os.replace(f.name, self.sym_path)
+
+    def store_and_convert_symbol(self, file_content: bytes, workspace: Path, converter: "SymbolConverter"):
+        converter.convert(file_content, self.module_id, self.sym_path, workspace)
+
+
+class SymbolConverter:
+    """
+    Converts PDBs to breakpad symbols with dump_syms. At most `concurrency` conversions run at once, so downloads
+    continue while large PDBs convert. Converted symbols are kept in a DiskLRUCache keyed by the PDB's content
+    hash, so the same PDB is only converted once on a host, no matter how many workers or crashes request it.
+    """
+
+    def __init__(self, cache_root: Path, max_bytes: int, concurrency: int, redis_conn=None):
+        self.cache = DiskLRUCache(cache_root, max_bytes, redis_conn=redis_conn, stats_key="crashserver:stats:converted_symbols")
+        self.slots = threading.BoundedSemaphore(concurrency)
+
+    def convert(self, pdb_content: bytes, module_id: str, dest: Path, workspace: Path) -> bool:
+        """
+        Place the breakpad symbol for a PDB at dest.
+        :return: True if the PDB was already converted, otherwise false
+        :raises RuntimeError: If dump_syms fails. Nothing is cached, so the PDB is converted again next time.
+        """
+        pdb_hash = hashlib.blake2s(pdb_content).hexdigest()
+        if self.cache.get(pdb_hash, dest):
+            return True
+
+        with self.slots, self.conversion_lock(pdb_hash):
+            # Another worker may have converted the same PDB while this one waited
+            if self.cache.get(pdb_hash, dest):
+                return True
+
+            # Store PDB within the job workspace. It's removed along with the workspace.
+            pdb_location = Path(workspace, "downloads", pdb_hash, module_id)
+            pdb_location.parent.mkdir(exist_ok=True, parents=True)
+            with open(pdb_location, "wb") as f:
+                f.write(pdb_content)
+
+            sym_location = pdb_location.with_name(sym_filename(module_id))
+            try:
+                self.run_dump_syms(pdb_location, sym_location)
+                if sym_location.stat().st_size == 0:
+                    raise RuntimeError(f"dump_syms wrote an empty symbol for {module_id}")
+            except (subprocess.CalledProcessError, OSError) as ex:
+                sym_location.unlink(missing_ok=True)
+                raise RuntimeError(f"dump_syms failed to convert {module_id}: {ex}") from ex
+            except RuntimeError:
+                sym_location.unlink(missing_ok=True)
+                raise
+            finally:
+                pdb_location.unlink(missing_ok=True)
+            self.cache.put_file(pdb_hash, sym_location, dest)
+        return False
+
+    @contextlib.contextmanager
+    def conversion_lock(self, pdb_hash: str):
+        """Exclusive lock on converting one PDB, held across every worker process on the host"""
+        with open(Path(self.cache.root, f".lock-{pdb_hash}"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def run_dump_syms(pdb_location: Path, sym_location: Path):
+        dump_syms = str(Path("res/bin/linux/dump_syms").absolute())
+        with open(sym_location, "wb") as f:
+            subprocess.run([dump_syms, pdb_location], stdout=f, check=True)
+
+
+class SymbolMissCache:
+    """
+    Shared record of symbols which a symbol server does not have, so workers skip asking for them again.
+    Entries expire after `ttl` seconds, in case the symbol server later receives the symbol.
+    """
+
+    STATS_KEY = "crashserver:stats:symbol_miss_cache"
+
+    def __init__(self, redis_conn, server: str, ttl: int):
+        self.redis = redis_conn
+        self.server = server
+        self.ttl = ttl
+
+    def key(self, module_id: str, build_id: str) -> str:
+        return f"crashserver:symbol_miss:{self.server}:{module_id}:{build_id}"
+
+    def is_known_miss(self, module_id: str, build_id: str) -> bool:
+        """Return true if the symbol server recently did not have this symbol. Counts each avoided lookup."""
+        try:
+            if not self.redis.exists(self.key(module_id, build_id)):
+                return False
+            self.redis.hincrby(self.STATS_KEY, "avoided", 1)
+        except redis.RedisError:
+            return False
+        return True
+
+    def add(self, module_id: str, build_id: str):
+        try:
+            self.redis.setex(self.key(module_id, build_id), self.ttl, 1)
+        except redis.RedisError:
+            logger.warning(f"Unable to record symbol server miss for {module_id}:{build_id}")
+
+    def stats(self) -> dict:
+        return {key.decode(): int(value) for key, value in self.redis.hgetall(self.STATS_KEY).items()}
+
+
+@dataclasses.dataclass
+class SymbolServer:
+    """
+    name: Unique name of the server. Used to track misses
+    url: Base url of the server
+    format: "breakpad" if the server hosts .sym files, or "pdb" if it hosts debug files to be converted
+    os: Operating systems (as named in breakpad symbol files) to use this server for. Empty for all
+    concurrency: Maximum simultaneous requests to this server
+    timeout: Seconds before a single request is abandoned
+    """
+
+    name: str
+    url: str
+    format: str = "breakpad"
+    os: typing.List[str] = dataclasses.field(default_factory=list)
+    concurrency: int = 8
+    timeout: int = 30
+
+    def __post_init__(self):
+        self.slots = threading.BoundedSemaphore(self.concurrency)
+
+    def serves(self, os_name: str) -> bool:
+        return not self.os or os_name.lower() in [o.lower() for o in self.os]
+
+    def symbol_url(self, module_id: str, build_id: str) -> str:
+        filename = module_id if self.format == "pdb" else sym_filename(module_id)
+        return f"{self.url.rstrip('/')}/{module_id}/{build_id}/{filename}"
+
+
+class HttpSymbolSupplier:
+    def __init__(self, servers: typing.List[SymbolServer], cache_root: Path, miss_ttl: int, converter: SymbolConverter, redis_conn=None):
+        self.servers = servers
+        self.cache_root = cache_root
+        self.converter = converter
+        self.redis = redis_conn if redis_conn is not None else queue.connection
+        self.miss_caches = {server.name: SymbolMissCache(self.redis, server.name, miss_ttl) for server in servers}
+
+    @staticmethod
+    def from_settings(cache_root: Path, converted_root: Path) -> "HttpSymbolSupplier":
+        servers = [SymbolServer(**dict(server)) for server in settings.decode.get("symbol_servers", [])]
+        concurrency = settings.decode.dump_syms_concurrency or os.cpu_count()
+        converter = SymbolConverter(converted_root, settings.decode.converted_symbol_cache_bytes, concurrency, redis_conn=queue.connection)
+        return HttpSymbolSupplier(servers, cache_root, settings.decode.symbol_miss_ttl, converter)
+
+    @staticmethod
+    def get_http_session(pool_size: int) -> requests.Session:
+        """Create a session which keeps up to pool_size connections alive to each symbol server"""
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def download_symbol(self, module_id: str, build_id: str, os_name: str, workspace: Path, session: requests.Session = None) -> (bool, bool):
+        """
+        Attempts to download a symbol from each symbol server in order, until one has it.
+        Returns tuple:
+            - 1st tuple: True if successful download, otherwise false
+            - 2nd tuple: True if already downloaded, otherwise false
+        """
+        cached_sym = LocalSymCache(self.cache_root, module_id, build_id)
+        if cached_sym.does_sym_exist():
+            return False, True  # Not downloaded, already exists
+
+        session = session or requests
+        for server in self.servers:
+            if not server.serves(os_name):
+                continue
+
+            miss_cache = self.miss_caches[server.name]
+            if miss_cache.is_known_miss(module_id, build_id):
+                continue  # Symbol server didn't have it last time we asked
+
+            logger.debug(f"LocalSymCache Miss. Attempting to download {module_id}:{build_id} from {server.name}")
+            try:
+                with server.slots:
+                    res = session.get(server.symbol_url(module_id, build_id), timeout=server.timeout)
+            except requests.RequestException as ex:
+                logger.warning(f"Symbol download failed => {module_id}:{build_id} from {server.name} ({type(ex).__name__})")
+                continue
+
+            if res.status_code != 200:
+                logger.debug(f"Symbol not available on {server.name} => {module_id}:{build_id}")
+                if res.status_code == 404:  # Only remember definite misses. Server errors may resolve themselves.
+                    miss_cache.add(module_id, build_id)
+                continue
+
+            if server.format == "pdb":
+                try:
+                    cached_sym.store_and_convert_symbol(res.content, workspace, self.converter)
+                except RuntimeError as ex:
+                    logger.warning(f"Symbol conversion failed => {module_id}:{build_id} from {server.name} ({ex})")
+                    continue
+            else:
+                cached_sym.store_symbol(res.content, workspace)
+            return True, False
+
+        return False, False
+
+    def download_symbols(self, crash_id, modules: list, os_name: str, workspace: Path) -> (int, int):
+        """
+        Attempt to download symbols for every given module. Downloads run concurrently over a shared session,
+        limited by the concurrency of each server, so this takes about as long as the slowest download.
+        :param modules: List of `processor.DumpModule`
+        :return: Tuple of (number downloaded, number already in the cache)
+        """
+        servers = [s for s in self.servers if s.serves(os_name)]
+        modules = [m for m in modules if m.debug_file and m.debug_id]
+        if not modules or not servers:
+            return 0, 0
+
+        logger.debug(f"Minidump [{crash_id}] - Attempting symbol server download for {len(modules)} modules")
+        pool_size = sum(s.concurrency for s in servers)
+        num_downloaded, num_existing = 0, 0
+        with self.get_http_session(pool_size) as session, concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+            results = executor.map(lambda m: self.download_symbol(m.debug_file, m.debug_id, os_name, workspace, session), modules)
+            for was_downloaded, already_downloaded in results:
+                if was_downloaded:
+                    num_downloaded += 1
+                if already_downloaded:
+                    num_existing += 1
+
+        logger.info(f"Minidump [{crash_id}] - Symbol Server Symbols Obtained - [{num_downloaded}] Downloaded - [{num_existing}] Preexisting")
+        return num_downloaded, num_existing
@@ -0,0 +1,123 @@
+"""
+diskcache: A directory of files with a byte budget.
+
+Entries are stored by key as a single file within the cache directory. Each time an entry is used, its
+modification time is updated, and once the byte budget is exceeded, the least recently used entries are deleted.
+Any number of processes on the same host may share one cache directory.
+"""
+import os
+import shutil
+import tempfile
+import typing
+from pathlib import Path
+
+from loguru import logger
+
+
+class DiskLRUCache:
+    def __init__(self, root: Path, max_bytes: int, redis_conn=None, stats_key: str = None):
+        """
+        :param root: Directory to store cache entries within
+        :param max_bytes: Total size the cache may grow to before entries are evicted
+        :param redis_conn: Optional redis connection, to share hit/miss counters between processes
+        :param stats_key: Redis hash to store counters within
+        """
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.redis = redis_conn
+        self.stats_key = stats_key
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def entry_path(self, key: str) -> Path:
+        return self.root / key
+
+    def get(self, key: str, dest: Path) -> bool:
+        """
+        Link the entry for key to dest. A link is used so the entry remains readable at dest even if it is evicted
+        by another process. Returns true on a cache hit, otherwise false.
+        """
+        entry = self.entry_path(key)
+        try:
+            os.utime(entry)  # Mark as recently used
+            link_or_copy(entry, dest)
+        except FileNotFoundError:
+            self.count("misses")
+            return False
+        self.count("hits")
+        return True
+
+    def put(self, key: str, file_content: bytes, dest: typing.Optional[Path] = None) -> Path:
+        """Store file_content as the entry for key, and optionally link it to dest."""
+        entry = self.entry_path(key)
+        with tempfile.NamedTemporaryFile(dir=self.root, prefix=".tmp-", delete=False) as tmp:
+            tmp.write(file_content)
+        os.replace(tmp.name, entry)
+        return self.added(key, entry, dest)
+
+    def put_file(self, key: str, src: Path, dest: typing.Optional[Path] = None) -> Path:
+        """Move the file at src into the cache as the entry for key, and optionally link it to dest."""
+        entry = self.entry_path(key)
+        with tempfile.NamedTemporaryFile(dir=self.root, prefix=".tmp-", delete=False) as tmp:
+            pass
+        shutil.move(src, tmp.name)
+        os.replace(tmp.name, entry)
+        return self.added(key, entry, dest)
+
+    def added(self, key: str, entry: Path, dest: typing.Optional[Path]) -> Path:
+        if dest is not None:
+            link_or_copy(entry, dest)
+        self.evict(keep=key)
+        return entry
+
+    def evict(self, keep: str = None):
+        """Delete the least recently used entries until the cache is within its byte budget"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(".") or not entry.is_file():  # Skip partial writes and lock files
+                continue
+            stat = entry.stat()
+            total += stat.st_size
+            entries.append((stat.st_mtime, stat.st_size, entry.name))
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            self.remove(name)
+            total -= size
+            self.count("evictions")
+            logger.debug(f"[CACHE] Evicted {name} from {self.root}")
+
+    def remove(self, key: str):
+        """Delete the entry for key, if it exists"""
+        self.entry_path(key).unlink(missing_ok=True)
+
+    def count(self, counter: str):
+        self.counters[counter] += 1
+        if self.redis is not None:
+            self.redis.hincrby(self.stats_key, counter, 1)
+
+    def stats(self) -> dict:
+        """Get hit/miss/eviction counters. Shared between processes if redis is available"""
+        if self.redis is None:
+            return dict(self.counters)
+        res = {key.decode(): int(value) for key, value in self.redis.hgetall(self.stats_key).items()}
+        return {counter: res.get(counter, 0) for counter in self.counters}
+
+
+def link_or_copy(src: Path, dest: Path):
+    """Hard-link src to dest. If they are on separate filesystems, copy instead."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(src, dest)
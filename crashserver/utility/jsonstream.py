@@ -0,0 +1,103 @@
+"""
+jsonstream: Incrementally decode a JSON document from a binary stream, such as a subprocess pipe.
+
+The document is walked one container at a time, and only the text of the value currently being decoded is held
+in memory. Values are decoded with the standard library's C decoder, so decoding remains fast.
+"""
+import codecs
+import json
+import re
+import typing
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+NUMBER_TAIL = re.compile(r"[0-9+\-.eE]*")  # The rest of the buffer, if a number may continue into the next chunk
+
+
+class JsonStreamReader:
+    def __init__(self, stream: typing.BinaryIO, chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: int = None) -> bool:
+        """Read more of the stream into the buffer, discarding what was already consumed. Returns false at eof."""
+        if self.eof:
+            return False
+
+        data = self.stream.read(size or self.chunk_size)
+        self.buffer = self.buffer[self.pos :] + self.decoder.decode(data, final=not data)
+        self.pos = 0
+        self.eof = not data
+        return not self.eof
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character, without consuming it. Empty at the end of the stream."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of JSON stream")
+        self.pos += 1
+
+    def read_value(self):
+        """Decode the next complete value. The buffer grows until the whole value is available."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Value is incomplete. Double the buffer, so large values are only re-scanned a few times.
+                if not self.fill(max(self.chunk_size, len(self.buffer) - self.pos)):
+                    raise
+                continue
+
+            # A number may continue in the next chunk, whether the buffer ends within it, or just after its "." or "e"
+            # (e.g. "1." decodes as 1)
+            if not isinstance(value, (dict, list, str)) and NUMBER_TAIL.fullmatch(self.buffer, end) and self.fill():
+                continue
+
+            self.pos = end
+            return value
+
+    def iter_object(self) -> typing.Iterator[str]:
+        """Yield each key of the next object. The caller must consume the value of each key before continuing."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def iter_array(self) -> typing.Iterator[None]:
+        """Yield once for each element of the next array. The caller must consume each element before continuing."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+
+        while True:
+            yield
+
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
@@ -0,0 +1,103 @@
+"""
+metrics: Timing of job stages, aggregated in redis so every worker process contributes to the same histograms.
+
+Histograms are exported in the Prometheus text exposition format, so any compatible scraper can collect them.
+"""
+import contextlib
+import math
+import time
+import typing
+
+import redis
+from loguru import logger
+
+# Upper bounds (in seconds) of each histogram bucket
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class StageTimer:
+    """
+    Records how long each named stage of a single job takes. Repeated stages are summed. The total is the time since
+    the timer was created, so it includes any work outside the stages.
+    """
+
+    def __init__(self):
+        self.stages: typing.Dict[str, float] = {}
+        self.labels: typing.Dict[str, str] = {}
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def breakdown(self) -> str:
+        return ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.stages.items())
+
+
+class RedisHistogram:
+    """
+    A histogram with labels, stored in a single redis hash. Each field is one of
+    "<labels>|<bucket upper bound>", "<labels>|sum" or "<labels>|count", where <labels> is the
+    rendered Prometheus label set, e.g. `project="...",stage="stackwalk"`.
+    """
+
+    def __init__(self, redis_conn, name: str, description: str, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        self.redis = redis_conn
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    @property
+    def key(self) -> str:
+        return f"crashserver:metrics:{self.name}"
+
+    @staticmethod
+    def format_labels(labels: dict) -> str:
+        return ",".join(f'{key}="{str(value)}"' for key, value in sorted(labels.items()))
+
+    @staticmethod
+    def format_bound(bound: float) -> str:
+        return "+Inf" if bound == math.inf else repr(float(bound))
+
+    def observe_many(self, observations: typing.Iterable[typing.Tuple[dict, float]]):
+        """Record many (labels, value) observations in a single round trip"""
+        pipe = self.redis.pipeline(transaction=False)
+        for labels, value in observations:
+            label_str = self.format_labels(labels)
+            for bound in self.buckets:
+                if value <= bound:
+                    pipe.hincrby(self.key, f"{label_str}|{self.format_bound(bound)}", 1)
+            pipe.hincrbyfloat(self.key, f"{label_str}|sum", value)
+            pipe.hincrby(self.key, f"{label_str}|count", 1)
+        try:
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning(f"Unable to record observations for {self.name}")
+
+    def observe(self, labels: dict, value: float):
+        self.observe_many([(labels, value)])
+
+    def render(self) -> str:
+        """Render the histogram in the Prometheus text exposition format"""
+        series: typing.Dict[str, dict] = {}
+        for field, value in self.redis.hgetall(self.key).items():
+            label_str, _, suffix = field.decode().rpartition("|")
+            series.setdefault(label_str, {})[suffix] = float(value)
+
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_str, values in sorted(series.items()):
+            sep = "," if label_str else ""
+            for bound in self.buckets:
+                le = self.format_bound(bound)
+                lines.append(f'{self.name}_bucket{{{label_str}{sep}le="{le}"}} {int(values.get(le, 0))}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {values.get('sum', 0.0)}")
+            lines.append(f"{self.name}_count{{{label_str}}} {int(values.get('count', 0))}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,327 @@
+"""
+minidump_reader: Read identifying information straight from the bytes of a minidump.
+
+Only the stream directory, and a handful of small streams are parsed (module list, thread list, exception,
+system info, and misc info). This is enough to know which build a minidump came from without starting the
+stackwalker, which allows a minidump to be related to its `BuildMetadata` at upload time.
+
+Structure layouts are taken from breakpad's `minidump_format.h`.
+"""
+import mmap
+import struct
+import typing
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from crashserver.utility.sysinfo import get_filename_from_path
+
+MINIDUMP_SIGNATURE = b"MDMP"
+
+# Stream types
+STREAM_THREAD_LIST = 3
+STREAM_MODULE_LIST = 4
+STREAM_EXCEPTION = 6
+STREAM_SYSTEM_INFO = 7
+STREAM_MISC_INFO = 15
+
+# Structure formats. All minidump structures are little-endian, and packed.
+HEADER = struct.Struct("<4sIIIIIQ")
+DIRECTORY_ENTRY = struct.Struct("<III")
+MODULE = struct.Struct("<QIIII13I2I2I2Q")
+THREAD = struct.Struct("<IIIIQQIIII")
+EXCEPTION = struct.Struct("<IIIIQQII15Q")
+SYSTEM_INFO = struct.Struct("<HHHBBIIIII")
+MISC_INFO = struct.Struct("<III")
+CV_PDB70 = struct.Struct("<4sIHH8sI")
+CV_PDB20 = struct.Struct("<4sIII")
+
+# CodeView signatures, as they are stored. Breakpad writes MD_CVINFOELF_SIGNATURE (0x4270454c) little-endian.
+CV_PDB70_SIGNATURE = b"RSDS"
+CV_PDB20_SIGNATURE = b"NB10"
+CV_ELF_SIGNATURE = struct.pack("<I", 0x4270454C)
+
+VS_FFI_SIGNATURE = 0xFEEF04BD
+MISC_INFO_PROCESS_ID = 0x1
+
+# Names match the values reported by the stackwalker, so either may be stored as a stacktrace
+PLATFORM_NAMES = {
+    0x2: "Windows NT",
+    0x8101: "Mac OS X",
+    0x8102: "iOS",
+    0x8201: "Linux",
+    0x8202: "Solaris",
+    0x8203: "Android",
+    0x8206: "Fuchsia",
+}
+ARCH_NAMES = {
+    0: "x86",
+    2: "ppc",
+    3: "mips",
+    5: "arm",
+    6: "ia64",
+    9: "amd64",
+    12: "arm64",
+    0x8001: "sparc",
+    0x8002: "ppc64",
+    0x8003: "arm64",
+    0x8004: "mips64",
+}
+WINDOWS_EXCEPTIONS = {
+    0x80000003: "EXCEPTION_BREAKPOINT",
+    0x80000004: "EXCEPTION_SINGLE_STEP",
+    0xC0000005: "EXCEPTION_ACCESS_VIOLATION",
+    0xC0000006: "EXCEPTION_IN_PAGE_ERROR",
+    0xC000001D: "EXCEPTION_ILLEGAL_INSTRUCTION",
+    0xC0000025: "EXCEPTION_NONCONTINUABLE_EXCEPTION",
+    0xC0000094: "EXCEPTION_INT_DIVIDE_BY_ZERO",
+    0xC00000FD: "EXCEPTION_STACK_OVERFLOW",
+    0xC0000374: "EXCEPTION_HEAP_CORRUPTION",
+    0xC0000409: "EXCEPTION_STACK_BUFFER_OVERRUN",
+    0xE06D7363: "Unhandled C++ Exception",
+}
+ACCESS_VIOLATION_TYPES = {0: "_READ", 1: "_WRITE", 8: "_EXEC"}
+MAC_EXCEPTIONS = {1: "EXC_BAD_ACCESS", 2: "EXC_BAD_INSTRUCTION", 3: "EXC_ARITHMETIC", 5: "EXC_SOFTWARE", 6: "EXC_BREAKPOINT", 10: "EXC_CRASH", 12: "EXC_GUARD"}
+POSIX_SIGNALS = {4: "SIGILL", 5: "SIGTRAP", 6: "SIGABRT", 7: "SIGBUS", 8: "SIGFPE", 9: "SIGKILL", 11: "SIGSEGV", 13: "SIGPIPE", 15: "SIGTERM"}
+
+
+@dataclass
+class MinidumpModule:
+    base_address: int
+    size: int
+    filename: str
+    code_id: str
+    debug_file: str
+    debug_id: str
+    version: str
+
+    def to_json(self) -> dict:
+        """Format the module as it would be output by the stackwalker"""
+        return {
+            "base_addr": hex(self.base_address),
+            "end_addr": hex(self.base_address + self.size),
+            "code_id": self.code_id,
+            "debug_file": self.debug_file,
+            "debug_id": self.debug_id,
+            "filename": self.filename,
+            "version": self.version,
+            "missing_symbols": True,  # Symbols have not been applied to anything read from the minidump
+        }
+
+
+@dataclass
+class MinidumpInfo:
+    os: str = ""
+    os_version: str = ""
+    cpu_arch: str = ""
+    cpu_count: int = 0
+    pid: typing.Optional[int] = None
+    crash_type: str = ""
+    crash_address: str = ""
+    crashing_thread: typing.Optional[int] = None
+    modules: [MinidumpModule] = field(default_factory=list)
+
+    @property
+    def main_module(self) -> typing.Optional[MinidumpModule]:
+        """The first module in the module list is the executable of the process"""
+        return self.modules[0] if self.modules else None
+
+    @property
+    def build_module(self) -> typing.Optional[MinidumpModule]:
+        """The main module, if it has the debug file and id needed to match it to its symbol"""
+        main = self.main_module
+        return main if main and main.debug_file and main.debug_id else None
+
+    def to_stacktrace(self) -> dict:
+        """
+        Create a partial stacktrace in the same format as the stackwalker output. There are no threads, as
+        walking the stack is left to the stackwalker.
+        """
+        return {
+            "crash_info": {"type": self.crash_type, "address": self.crash_address, "crashing_thread": self.crashing_thread},
+            "system_info": {"os": self.os, "os_ver": self.os_version, "cpu_arch": self.cpu_arch, "cpu_count": self.cpu_count},
+            "modules": [m.to_json() for m in self.modules],
+            "main_module": 0 if self.modules else None,
+            "pid": self.pid,
+            "threads": [],
+        }
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "MinidumpInfo":
+        """Parse a minidump. Raises ValueError if the data is not a readable minidump"""
+        try:
+            return MinidumpReader(data).read()
+        except struct.error as ex:
+            raise ValueError(f"Truncated minidump: {ex}") from ex
+
+
+def read_minidump_info(data: bytes) -> typing.Optional[MinidumpInfo]:
+    """Parse a minidump, returning None if the data is not a readable minidump"""
+    try:
+        return MinidumpInfo.from_bytes(data)
+    except ValueError:
+        return None
+
+
+def read_minidump_file(path: Path) -> typing.Optional[MinidumpInfo]:
+    """
+    Parse a minidump file, returning None if it is not a readable minidump. The file is memory-mapped, so only the
+    pages holding the parsed streams are read, no matter how large the minidump is.
+    """
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            return None
+
+    with mapped:
+        reader = MinidumpReader(mapped)
+        try:
+            return reader.read()
+        except (ValueError, struct.error):
+            return None
+        finally:
+            reader.data.release()  # The map can't be closed while a view of it exists
+
+
+class MinidumpReader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.streams: dict[int, (int, int)] = {}  # stream_type: (rva, data_size)
+
+    def read(self) -> MinidumpInfo:
+        signature, _, stream_count, directory_rva, *_ = HEADER.unpack_from(self.data, 0)
+        if signature != MINIDUMP_SIGNATURE:
+            raise ValueError("Data is not a minidump")
+
+        for i in range(stream_count):
+            stream_type, data_size, rva = DIRECTORY_ENTRY.unpack_from(self.data, directory_rva + i * DIRECTORY_ENTRY.size)
+            self.streams.setdefault(stream_type, (rva, data_size))
+
+        info = MinidumpInfo(modules=self.read_modules())
+        self.read_system_info(info)
+        self.read_exception(info)
+        self.read_misc_info(info)
+        return info
+
+    def read_string(self, rva: int) -> str:
+        """Read an MDString. A uint32 byte length, followed by UTF-16LE characters"""
+        (length,) = struct.unpack_from("<I", self.data, rva)
+        return bytes(self.data[rva + 4 : rva + 4 + length]).decode("utf-16-le", "replace")
+
+    def read_modules(self) -> [MinidumpModule]:
+        if STREAM_MODULE_LIST not in self.streams:
+            return []
+
+        rva, _ = self.streams[STREAM_MODULE_LIST]
+        (count,) = struct.unpack_from("<I", self.data, rva)
+        modules = []
+        for i in range(count):
+            fields = MODULE.unpack_from(self.data, rva + 4 + i * MODULE.size)
+            base, size, _, timestamp, name_rva = fields[:5]
+            version_info = fields[5:18]
+            cv_size, cv_rva = fields[18:20]
+
+            path = self.read_string(name_rva)
+            filename = get_filename_from_path(path) or ""
+            module = MinidumpModule(
+                base_address=base,
+                size=size,
+                filename=filename,
+                code_id="%08X%x" % (timestamp, size),
+                debug_file=filename,
+                debug_id="",
+                version=self.format_version(version_info),
+            )
+            self.read_codeview(module, cv_rva, cv_size)
+            modules.append(module)
+        return modules
+
+    def read_codeview(self, module: MinidumpModule, rva: int, size: int):
+        """Fill in the debug_file and debug_id of a module from its CodeView record"""
+        if size < 4:
+            return
+
+        record = self.data[rva : rva + size]
+        signature = bytes(record[:4])
+        if signature == CV_PDB70_SIGNATURE:
+            _, data1, data2, data3, data4, age = CV_PDB70.unpack_from(record, 0)
+            module.debug_id = "%08X%04X%04X%s%X" % (data1, data2, data3, data4.hex().upper(), age)
+            module.debug_file = get_filename_from_path(self.read_cstring(record[CV_PDB70.size :])) or module.debug_file
+        elif signature == CV_PDB20_SIGNATURE:
+            _, _, timestamp, age = CV_PDB20.unpack_from(record, 0)
+            module.debug_id = "%08X%X" % (timestamp, age)
+            module.debug_file = get_filename_from_path(self.read_cstring(record[CV_PDB20.size :])) or module.debug_file
+        elif signature == CV_ELF_SIGNATURE:
+            # ELF build-id. The first 16 bytes are formatted like a GUID, with an age of zero.
+            build_id = bytes(record[4:])
+            guid = build_id[:16].ljust(16, b"\0")
+            data1, data2, data3 = struct.unpack_from("<IHH", guid, 0)
+            module.debug_id = "%08X%04X%04X%s0" % (data1, data2, data3, guid[8:].hex().upper())
+            module.code_id = build_id.hex()
+
+    @staticmethod
+    def read_cstring(data: memoryview) -> str:
+        raw = bytes(data)
+        return raw[: raw.find(b"\0")].decode("utf-8", "replace") if b"\0" in raw else raw.decode("utf-8", "replace")
+
+    @staticmethod
+    def format_version(version_info: tuple) -> str:
+        signature, _, file_version_hi, file_version_lo = version_info[:4]
+        if signature != VS_FFI_SIGNATURE:
+            return ""
+        return "%d.%d.%d.%d" % (file_version_hi >> 16, file_version_hi & 0xFFFF, file_version_lo >> 16, file_version_lo & 0xFFFF)
+
+    def read_system_info(self, info: MinidumpInfo):
+        if STREAM_SYSTEM_INFO not in self.streams:
+            return
+
+        rva, _ = self.streams[STREAM_SYSTEM_INFO]
+        arch, _, _, cpu_count, _, major, minor, build, platform, csd_rva = SYSTEM_INFO.unpack_from(self.data, rva)
+        info.os = PLATFORM_NAMES.get(platform, "0x%08x" % platform)
+        info.cpu_arch = ARCH_NAMES.get(arch, "0x%04x" % arch)
+        info.cpu_count = cpu_count
+        info.os_version = "%d.%d.%d" % (major, minor, build)
+        if csd_rva:
+            csd = self.read_string(csd_rva)
+            if csd:
+                info.os_version += " " + csd
+
+    def read_exception(self, info: MinidumpInfo):
+        if STREAM_EXCEPTION not in self.streams:
+            return
+
+        rva, _ = self.streams[STREAM_EXCEPTION]
+        thread_id, _, code, _, _, address, num_params, _, *params = EXCEPTION.unpack_from(self.data, rva)
+        info.crashing_thread = self.find_thread_index(thread_id)
+        info.crash_address = hex(address)
+
+        # The crash_type depends on the OS which produced the minidump. System info is always read first.
+        if info.os == "Windows NT":
+            info.crash_type = WINDOWS_EXCEPTIONS.get(code, "0x%08x" % code)
+            if code == 0xC0000005 and num_params >= 2:
+                info.crash_type += ACCESS_VIOLATION_TYPES.get(params[0], "")
+                info.crash_address = hex(params[1])
+        elif info.os in ("Mac OS X", "iOS"):
+            info.crash_type = MAC_EXCEPTIONS.get(code, "0x%08x" % code)
+        else:
+            info.crash_type = POSIX_SIGNALS.get(code, "0x%08x" % code)
+
+    def find_thread_index(self, thread_id: int) -> typing.Optional[int]:
+        if STREAM_THREAD_LIST not in self.streams:
+            return None
+
+        rva, _ = self.streams[STREAM_THREAD_LIST]
+        (count,) = struct.unpack_from("<I", self.data, rva)
+        for i in range(count):
+            if THREAD.unpack_from(self.data, rva + 4 + i * THREAD.size)[0] == thread_id:
+                return i
+        return None
+
+    def read_misc_info(self, info: MinidumpInfo):
+        if STREAM_MISC_INFO not in self.streams:
+            return
+
+        rva, _ = self.streams[STREAM_MISC_INFO]
+        _, flags, pid = MISC_INFO.unpack_from(self.data, rva)
+        if flags & MISC_INFO_PROCESS_ID:
+            info.pid = pid
@@ -1,7 +1,89 @@
+import collections.abc
+import typing
 from dataclasses import dataclass
 
+from crashserver.utility.jsonstream import JsonStreamReader
 
-@dataclass
+# Font Awesome icon, and display name, for each operating system reported by the stackwalker
+OS_ICONS = {"Windows NT": "fab fa-windows", "Mac OS X": "fab fa-apple", "Linux": "fab fa-linux"}
+OS_NAMES = {"Windows NT": "Windows", "Mac OS X": "macOS", "Linux": "Linux"}
+
+# Frame fields which repeat across many threads, e.g. every idle thread waiting within the same system function
+SHARED_FRAME_FIELDS = ("module", "function", "file", "trust")
+
+
+def read_stacktrace(stream: typing.BinaryIO) -> dict:
+    """
+    Read stackwalker JSON output from a stream as it is produced, one thread and one module at a time, so the full
+    output text is never held in memory. Strings repeated between frames are shared, and only the first frame of
+    the `crashing_thread` is kept, as its other frames duplicate the crashing entry of `threads`.
+    """
+    reader = JsonStreamReader(stream)
+    shared = {}
+    stacktrace = {}
+
+    for key in reader.iter_object():
+        if key in ("threads", "modules"):
+            items = []
+            for _ in reader.iter_array():
+                item = reader.read_value()
+                for frame in item.get("frames", ()) if key == "threads" else ():
+                    for field in SHARED_FRAME_FIELDS:
+                        if isinstance(frame.get(field), str):
+                            frame[field] = shared.setdefault(frame[field], frame[field])
+                items.append(item)
+            stacktrace[key] = items
+        elif key == "crashing_thread":
+            crashing_thread = reader.read_value()
+            if crashing_thread and crashing_thread.get("frames"):
+                crashing_thread["frames"] = crashing_thread["frames"][:1]
+            stacktrace[key] = crashing_thread
+        else:
+            stacktrace[key] = reader.read_value()
+
+    return stacktrace
+
+
+class LazySequence(collections.abc.Sequence):
+    """
+    A read-only sequence over raw stacktrace items, which builds each object only when it is accessed.
+    Objects are not kept, so iterating a large sequence never holds more than one at a time.
+    """
+
+    __slots__ = ("items", "factory")
+
+    def __init__(self, items: list, factory: typing.Callable[[int, dict], typing.Any]):
+        self.items = items
+        self.factory = factory
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.factory(i, self.items[i]) for i in range(*index.indices(len(self.items)))]
+        if index < 0:
+            index += len(self.items)
+        return self.factory(index, self.items[index])
+
+    def __iter__(self):
+        for i, item in enumerate(self.items):
+            yield self.factory(i, item)
+
+
+def split_stacktrace(stacktrace: dict) -> dict:
+    """
+    Create the part of a stacktrace which is kept in the database when stacktraces are split. It has everything but
+    the frames of threads other than the crashing thread, which are only available from the full stacktrace.
+    """
+    crashing_thread = (stacktrace.get("crash_info") or {}).get("crashing_thread")
+    threads = stacktrace.get("threads") or []
+    summary = dict(stacktrace)
+    summary["threads"] = [thread if i == crashing_thread else {k: v for k, v in thread.items() if k != "frames"} for i, thread in enumerate(threads)]
+    return summary
+
+
+@dataclass(slots=True)
 class DumpModule:
     base_address: str
     end_address: str
@@ -13,27 +95,25 @@ class DumpModule:
     missing_symbols: bool
 
     @staticmethod
-    def generate_list(json: dict):
-        res = []
-
-        for mod in json:
-            res.append(
-                DumpModule(
-                    base_address=mod.get("base_addr"),
-                    end_address=mod.get("end_addr"),
-                    code_id=mod.get("code_id"),
-                    debug_file=mod.get("debug_file"),
-                    debug_id=mod.get("debug_id"),
-                    filename=mod.get("filename"),
-                    version=mod.get("version"),
-                    # Default false, as the key won't be there if it's true
-                    missing_symbols=mod.get("missing_symbols", False),
-                )
-            )
-        return res
-
-
-@dataclass
+    def generate(mod: dict):
+        return DumpModule(
+            base_address=mod.get("base_addr"),
+            end_address=mod.get("end_addr"),
+            code_id=mod.get("code_id"),
+            debug_file=mod.get("debug_file"),
+            debug_id=mod.get("debug_id"),
+            filename=mod.get("filename"),
+            version=mod.get("version"),
+            # Default false, as the key won't be there if it's true
+            missing_symbols=mod.get("missing_symbols", False),
+        )
+
+    @staticmethod
+    def generate_list(json: list):
+        return LazySequence(json, lambda _, mod: DumpModule.generate(mod))
+
+
+@dataclass(slots=True)
 class SystemInfo:
     os_name: str = ""
     os_version: str = ""  # Linux | Windows NT | Mac OS X
@@ -54,7 +134,7 @@ class SystemInfo:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class CrashReason:
     crash_type: str
     crash_address: str
@@ -71,7 +151,7 @@ class CrashReason:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ThreadFrame:
     frame_index: int
     file: str
@@ -85,106 +165,143 @@ class ThreadFrame:
     trust: str  # none | scan | cfi_scan | frame_pointer | cfi | context | prewalked
 
     @staticmethod
-    def generate_list(frames: list):
-        res = []
-        for frame in frames:
-            res.append(
-                ThreadFrame(
-                    frame_index=frame.get("frame"),
-                    file=frame.get("file"),
-                    func=frame.get("function"),
-                    func_offset=frame.get("function_offset"),
-                    line=frame.get("line"),
-                    module=frame.get("module"),
-                    module_offset=frame.get("module_offset"),
-                    offset=frame.get("offset"),
-                    registers={},
-                    trust=frame.get("trust"),
-                )
-            )
-
-        res.sort(key=lambda x: x.frame_index)
-        return res
-
-
-@dataclass
-class StackThread:
-    thread_index: int
-    total_frames: int
-    frames: [ThreadFrame]
+    def generate(frame: dict, registers: dict = None):
+        return ThreadFrame(
+            frame_index=frame.get("frame"),
+            file=frame.get("file"),
+            func=frame.get("function"),
+            func_offset=frame.get("function_offset"),
+            line=frame.get("line"),
+            module=frame.get("module"),
+            module_offset=frame.get("module_offset"),
+            offset=frame.get("offset"),
+            registers=registers or {},
+            trust=frame.get("trust"),
+        )
 
     @staticmethod
-    def generate_list(threads: list):
-        res = []
+    def generate_list(frames: list, registers: dict = None):
+        """Frames are ordered by frame index. Registers, if known, belong to the first frame."""
+        if any(frame.get("frame") != i for i, frame in enumerate(frames)):
+            frames = sorted(frames, key=lambda x: x.get("frame"))
+        return LazySequence(frames, lambda i, frame: ThreadFrame.generate(frame, registers if i == 0 else None))
+
+
+class StackThread:
+    __slots__ = ("thread_index", "total_frames", "raw_frames", "registers")
 
-        for i in range(len(threads)):
-            res.append(
-                StackThread(
-                    thread_index=i,
-                    total_frames=threads[i].get("frame_count"),
-                    frames=ThreadFrame.generate_list(threads[i].get("frames")),
-                )
-            )
+    def __init__(self, thread_index: int, total_frames: int, frames: list, registers: dict = None):
+        self.thread_index = thread_index
+        self.total_frames = total_frames
+        self.raw_frames = frames
+        self.registers = registers
 
-        res.sort(key=lambda x: x.thread_index)
-        return res
+    @property
+    def frames(self) -> typing.Sequence[ThreadFrame]:
+        return ThreadFrame.generate_list(self.raw_frames, self.registers)
+
+    @staticmethod
+    def generate(thread_index: int, thread: dict, registers: dict = None):
+        return StackThread(thread_index=thread_index, total_frames=thread.get("frame_count"), frames=thread.get("frames") or [], registers=registers)
+
+    @staticmethod
+    def generate_list(threads: list, crashing_thread: int = None, registers: dict = None):
+        return LazySequence(threads, lambda i, thread: StackThread.generate(i, thread, registers if i == crashing_thread else None))
 
 
-@dataclass
 class ProcessedCrash:
-    crash_reason: CrashReason
-    system: SystemInfo
-    modules: [DumpModule]
-    threads: [StackThread]
+    """
+    A view over a stacktrace in the stackwalker's JSON format. Only the raw JSON is kept. Summary fields are built
+    on first access, while threads, frames and modules are built one at a time as they are iterated.
+    """
+
+    __slots__ = ("stacktrace", "_crash_reason", "_system")
 
-    main_module_index: int
-    read_success: bool
-    pid: int
+    def __init__(self, stacktrace: dict):
+        self.stacktrace = stacktrace
+        self._crash_reason = None
+        self._system = None
+
+    read_success = True
+
+    @property
+    def crash_reason(self) -> CrashReason:
+        if self._crash_reason is None:
+            self._crash_reason = CrashReason.generate(self.stacktrace.get("crash_info") or {})
+        return self._crash_reason
+
+    @property
+    def system(self) -> SystemInfo:
+        if self._system is None:
+            self._system = SystemInfo.generate(self.stacktrace.get("system_info") or {})
+        return self._system
+
+    @property
+    def modules(self) -> typing.Sequence[DumpModule]:
+        return DumpModule.generate_list(self.stacktrace.get("modules") or [])
+
+    @property
+    def threads(self) -> typing.Sequence[StackThread]:
+        # The registers should always be in the first frame of the crashing thread. A partial stacktrace read
+        # directly from the minidump (see `minidump_reader`) has no threads.
+        registers = None
+        crashing_thread = self.stacktrace.get("crashing_thread")
+        if crashing_thread and crashing_thread.get("frames"):
+            registers = crashing_thread.get("frames")[0].get("registers")
+        return StackThread.generate_list(self.stacktrace.get("threads") or [], self.crash_reason.crashing_thread, registers)
+
+    @property
+    def main_module_index(self) -> int:
+        return self.stacktrace.get("main_module")
+
+    @property
+    def pid(self) -> int:
+        return self.stacktrace.get("pid")
 
     @property
     def modules_no_symbols(self) -> [DumpModule]:
-        return [m for m in self.modules if m.missing_symbols]
+        return [DumpModule.generate(m) for m in self.stacktrace.get("modules") or [] if m.get("missing_symbols", False)]
 
     @property
     def main_module(self) -> DumpModule:
         return self.modules[self.main_module_index]
 
+    @property
+    def crashing_function(self) -> typing.Optional[str]:
+        """Function at the top of the crashing thread, if it is known"""
+        index = self.crash_reason.crashing_thread
+        threads = self.threads
+        if index is None or not 0 <= index < len(threads):
+            return None
+        frames = threads[index].frames
+        return frames[0].func if frames else None
+
+    def signature(self, depth: int) -> typing.Optional[str]:
+        """
+        Describe where this crash happened by the top `depth` frames of the crashing thread, so crashes in the same
+        place share a signature. Frames without symbols are described by their module.
+        """
+        index = self.crash_reason.crashing_thread
+        threads = self.threads
+        if index is None or not 0 <= index < len(threads):
+            return None
+
+        frames = []
+        for frame in threads[index].frames[:depth]:
+            if frame.func:
+                frames.append(" ".join(frame.func.split()))
+            else:
+                frames.append(frame.module or "??")
+        return " | ".join(frames) or None
+
     @property
     def os_icon(self):
-        if self.system.os_name == "Windows NT":
-            return "fab fa-windows"
-        if self.system.os_name == "Mac OS X":
-            return "fab fa-apple"
-        if self.system.os_name == "Linux":
-            return "fab fa-linux"
-        return ""
+        return OS_ICONS.get(self.system.os_name, "")
 
     @property
     def os_name(self):
-        if self.system.os_name == "Windows NT":
-            return "Windows"
-        if self.system.os_name == "Mac OS X":
-            return "macOS"
-        if self.system.os_name == "Linux":
-            return "Linux"
-        return ""
+        return OS_NAMES.get(self.system.os_name, "")
 
     @staticmethod
     def generate(json: dict):
-        res_reason = CrashReason.generate(json.get("crash_info"))
-        res_threads = StackThread.generate_list(json.get("threads"))
-
-        # Update first frame of crashing thread with registers.
-        # The registers should always be in the first frame of the crashing thread
-        crash_registers = json.get("crashing_thread").get("frames")[0]["registers"]
-        res_threads[res_reason.crashing_thread].frames[0].registers = crash_registers
-
-        return ProcessedCrash(
-            read_success=True,
-            crash_reason=res_reason,
-            system=SystemInfo.generate(json.get("system_info", {})),
-            modules=DumpModule.generate_list(json.get("modules", {})),
-            threads=res_threads,
-            main_module_index=json.get("main_module"),
-            pid=json.get("pid"),
-        )
+        return ProcessedCrash(json)
@@ -0,0 +1,74 @@
+"""
+symbolizer: Apply symbols to stackwalker output within the decode process, using symbol indexes (see `symindex`).
+
+The stackwalker reads symbols as text, parsing each one in full on every run. When every symbol a minidump needs
+has an index, the minidump is walked once without symbols, and the frames of all modules are resolved here in a
+single pass, by bisecting the memory-mapped indexes.
+"""
+import itertools
+import typing
+from pathlib import Path
+
+from crashserver.utility.symindex import SymbolIndex
+
+
+class Symbolizer:
+    def __init__(self, index_paths: typing.Dict[typing.Tuple[str, str], Path]):
+        """
+        :param index_paths: Path of the symbol index of each module, by (debug_file, debug_id)
+        """
+        self.index_paths = index_paths
+        self.indexes: typing.Dict[typing.Tuple[str, str], SymbolIndex] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for index in self.indexes.values():
+            index.close()
+        self.indexes.clear()
+
+    def index(self, key: typing.Tuple[str, str]) -> SymbolIndex:
+        """Indexes are only mapped once a frame of their module is resolved"""
+        if key not in self.indexes:
+            self.indexes[key] = SymbolIndex(self.index_paths[key])
+        return self.indexes[key]
+
+    def symbolize(self, stacktrace: dict) -> int:
+        """
+        Resolve every frame without a function, within a module that has an index, in place. The modules which
+        have an index are no longer marked as missing symbols.
+        :return: The number of frames resolved
+        """
+        modules = {}  # Frames name their module by filename
+        for module in stacktrace.get("modules") or []:
+            key = (module.get("debug_file"), module.get("debug_id"))
+            if key in self.index_paths:
+                modules[module.get("filename")] = key
+                module.pop("missing_symbols", None)
+                module["loaded_symbols"] = True
+
+        threads = stacktrace.get("threads") or []
+        crashing_thread = stacktrace.get("crashing_thread") or {}
+        frames = itertools.chain.from_iterable(thread.get("frames") or () for thread in itertools.chain(threads, [crashing_thread]))
+
+        num_resolved = 0
+        for frame in frames:
+            key = modules.get(frame.get("module"))
+            if key is None or frame.get("function") or not frame.get("module_offset"):
+                continue
+
+            found = self.index(key).lookup(int(frame["module_offset"], 16))
+            if found is None:
+                continue
+            frame["function"] = found.function
+            frame["function_offset"] = hex(found.function_offset)
+            if found.file is not None:
+                frame["file"] = found.file
+            if found.line is not None:
+                frame["line"] = found.line
+            num_resolved += 1
+        return num_resolved
@@ -0,0 +1,230 @@
+"""
+symindex: A compact, sorted, binary index of the FUNC, PUBLIC and line records of a Breakpad text symbol.
+
+Parsing a text symbol means reading every line of it, while the index is memory-mapped and searched by bisection,
+so a lookup only pages in the parts of the index around the addresses it needs.
+
+Index layout (little-endian). Every section starts on an 8 byte boundary, and all records are stored column by
+column, sorted by address:
+    header:     magic, version, then the count of functions, publics, lines, files, and the string table size
+    functions:  address u64[], size u32[], name u32[], first line u32[], line count u32[]
+    publics:    address u64[], name u32[]
+    lines:      address u64[], size u32[], line number u32[], file u32[]
+    files:      name u32[]
+    strings:    utf-8, each terminated by a null byte. Names above are offsets into this table.
+"""
+import array
+import bisect
+import mmap
+import struct
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+MAGIC = b"CSSYMIDX"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIII")
+NO_FILE = 0xFFFFFFFF
+
+
+@dataclass(slots=True)
+class SymbolLookup:
+    function: str
+    function_offset: int
+    file: typing.Optional[str] = None
+    line: typing.Optional[int] = None
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+# Columns in the order they are written, as (name, typecode, the header count giving their length)
+COLUMNS = [
+    ("func_addr", "Q", "funcs"),
+    ("func_size", "I", "funcs"),
+    ("func_name", "I", "funcs"),
+    ("func_line_start", "I", "funcs"),
+    ("func_line_count", "I", "funcs"),
+    ("public_addr", "Q", "publics"),
+    ("public_name", "I", "publics"),
+    ("line_addr", "Q", "lines"),
+    ("line_size", "I", "lines"),
+    ("line_number", "I", "lines"),
+    ("line_file", "I", "lines"),
+    ("file_names", "I", "files"),
+]
+
+
+class SymbolIndexBuilder:
+    """Reads a Breakpad text symbol line by line, and writes its index"""
+
+    def __init__(self):
+        self.strings = bytearray()
+        self.string_offsets = {}
+        self.files = {}  # Symbol file number -> index of its name in file_names
+        self.file_names = array.array("I")
+        self.func_addr, self.func_size, self.func_name = array.array("Q"), array.array("I"), array.array("I")
+        self.func_line_start, self.func_line_count = array.array("I"), array.array("I")
+        self.public_addr, self.public_name = array.array("Q"), array.array("I")
+        self.line_addr, self.line_size, self.line_number, self.line_file = array.array("Q"), array.array("I"), array.array("I"), array.array("I")
+        self.in_func = False
+
+    def string(self, value: str) -> int:
+        offset = self.string_offsets.get(value)
+        if offset is None:
+            offset = self.string_offsets[value] = len(self.strings)
+            self.strings += value.encode("utf-8", "replace") + b"\0"
+        return offset
+
+    def add_line(self, line: str):
+        record, _, rest = line.partition(" ")
+        if record == "FUNC":
+            if rest.startswith("m "):
+                rest = rest[2:]
+            address, size, _, name = rest.split(" ", 3)
+            self.func_addr.append(int(address, 16))
+            self.func_size.append(int(size, 16))
+            self.func_name.append(self.string(name))
+            self.func_line_start.append(len(self.line_addr))
+            self.func_line_count.append(0)
+            self.in_func = True
+        elif record == "PUBLIC":
+            if rest.startswith("m "):
+                rest = rest[2:]
+            address, _, name = rest.split(" ", 2)
+            self.public_addr.append(int(address, 16))
+            self.public_name.append(self.string(name))
+            self.in_func = False
+        elif record == "FILE":
+            number, name = rest.split(" ", 1)
+            self.files[int(number)] = len(self.file_names)
+            self.file_names.append(self.string(name))
+        elif record == "INLINE":
+            pass  # Within a FUNC block, before its line records, which still belong to the FUNC
+        elif record in ("MODULE", "INFO", "STACK", "INLINE_ORIGIN"):
+            self.in_func = False
+        elif self.in_func and rest:
+            # Line records belong to the FUNC above them: address size line file
+            address, size, number, file = line.split(" ", 3)
+            self.line_addr.append(int(address, 16))
+            self.line_size.append(int(size, 16))
+            self.line_number.append(int(number))
+            self.line_file.append(int(file))
+            self.func_line_count[-1] += 1
+
+    def sorted_columns(self) -> dict:
+        """All columns by name, with functions, publics and lines sorted by address"""
+        func_order = sorted(range(len(self.func_addr)), key=self.func_addr.__getitem__)
+        line_addr, line_size, line_number, line_file = array.array("Q"), array.array("I"), array.array("I"), array.array("I")
+        func_line_start = array.array("I")
+        for i in func_order:
+            start, count = self.func_line_start[i], self.func_line_count[i]
+            func_line_start.append(len(line_addr))
+            for j in sorted(range(start, start + count), key=self.line_addr.__getitem__):
+                line_addr.append(self.line_addr[j])
+                line_size.append(self.line_size[j])
+                line_number.append(self.line_number[j])
+                line_file.append(self.files.get(self.line_file[j], NO_FILE))
+
+        public_order = sorted(range(len(self.public_addr)), key=self.public_addr.__getitem__)
+        return {
+            "func_addr": array.array("Q", (self.func_addr[i] for i in func_order)),
+            "func_size": array.array("I", (self.func_size[i] for i in func_order)),
+            "func_name": array.array("I", (self.func_name[i] for i in func_order)),
+            "func_line_start": func_line_start,
+            "func_line_count": array.array("I", (self.func_line_count[i] for i in func_order)),
+            "public_addr": array.array("Q", (self.public_addr[i] for i in public_order)),
+            "public_name": array.array("I", (self.public_name[i] for i in public_order)),
+            "line_addr": line_addr,
+            "line_size": line_size,
+            "line_number": line_number,
+            "line_file": line_file,
+            "file_names": self.file_names,
+        }
+
+    def write(self, out: typing.BinaryIO) -> int:
+        """Write the index to a binary stream. Returns the number of bytes written."""
+        out.write(HEADER.pack(MAGIC, VERSION, len(self.func_addr), len(self.public_addr), len(self.line_addr), len(self.file_names), len(self.strings)))
+        position = HEADER.size
+        columns = self.sorted_columns()
+        for data in [columns[name].tobytes() for name, _, _ in COLUMNS] + [bytes(self.strings)]:
+            padding = _align(position) - position
+            out.write(b"\0" * padding)
+            out.write(data)
+            position += padding + len(data)
+        return position
+
+
+def build_index(sym_file: typing.BinaryIO, out: typing.BinaryIO) -> int:
+    """
+    Build the index of a Breakpad text symbol, read from a binary stream.
+    :return: The size of the index written to `out`
+    """
+    builder = SymbolIndexBuilder()
+    for line in sym_file:
+        builder.add_line(line.decode("utf-8", "replace").rstrip("\r\n"))
+    return builder.write(out)
+
+
+class SymbolIndex:
+    """A memory-mapped symbol index. Call `close` (or use as a context manager) when done with it."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *counts, strings_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a version {VERSION} symbol index")
+
+        # Each column is a typed view directly over the mapped file, which bisect searches like a list
+        counts = dict(zip(("funcs", "publics", "lines", "files"), counts))
+        self.view = memoryview(self.map)
+        self.columns = []
+        position = HEADER.size
+        for name, typecode, count in COLUMNS:
+            position = _align(position)
+            size = struct.calcsize(typecode) * counts[count]
+            column = self.view[position : position + size].cast(typecode)
+            setattr(self, name, column)
+            self.columns.append(column)
+            position += size
+        self.strings_start = _align(position)
+        self.strings_end = self.strings_start + strings_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for column in self.columns:
+            column.release()
+        self.view.release()
+        self.map.close()
+
+    def string(self, offset: int) -> str:
+        start = self.strings_start + offset
+        return self.map[start : self.map.find(b"\0", start, self.strings_end)].decode("utf-8")
+
+    def lookup(self, address: int) -> typing.Optional[SymbolLookup]:
+        """Find the function, and source line if known, containing an address relative to the module base"""
+        i = bisect.bisect_right(self.func_addr, address) - 1
+        if i >= 0 and address < self.func_addr[i] + self.func_size[i]:
+            result = SymbolLookup(function=self.string(self.func_name[i]), function_offset=address - self.func_addr[i])
+            start = self.func_line_start[i]
+            j = bisect.bisect_right(self.line_addr, address, start, start + self.func_line_count[i]) - 1
+            if j >= start and address < self.line_addr[j] + self.line_size[j]:
+                result.line = self.line_number[j]
+                if self.line_file[j] != NO_FILE:
+                    result.file = self.string(self.file_names[self.line_file[j]])
+            return result
+
+        # Addresses outside of any function are attributed to the closest public symbol below them, unless a
+        # function begins between that public symbol and the address
+        k = bisect.bisect_right(self.public_addr, address) - 1
+        if k >= 0 and (i < 0 or self.public_addr[k] > self.func_addr[i]):
+            return SymbolLookup(function=self.string(self.public_name[k]), function_offset=address - self.public_addr[k])
+        return None
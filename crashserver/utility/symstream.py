@@ -0,0 +1,81 @@
+"""
+symstream: Read an uploaded breakpad symbol from a binary stream, without holding the file in memory.
+
+Only the head of the stream is buffered, to find the MODULE line which identifies the symbol. Anything before the
+MODULE line is skipped. The blake2s hash and size of the symbol are computed as it is read, so it can be sent to
+storage in chunks, and recorded once it's stored.
+"""
+import hashlib
+import typing
+
+from crashserver.utility.misc import SymbolData
+
+CHUNK_SIZE = 64 * 1024
+HEAD_LIMIT = 1024 * 1024
+MODULE_PREFIX = b"MODULE"
+
+
+class SymbolStream:
+    def __init__(self, stream: typing.BinaryIO, chunk_size: int = CHUNK_SIZE):
+        """
+        :param stream: The symbol file. The MODULE line must begin within its first `HEAD_LIMIT` bytes.
+        :raises ValueError: If the stream has no MODULE line
+        """
+        self.stream = stream
+        self.start = stream.tell() if stream.seekable() else 0
+        self.hash = hashlib.blake2s()
+        self.size = 0
+
+        head = b""
+        while len(head) < HEAD_LIMIT:
+            chunk = stream.read(chunk_size)
+            head += chunk
+            module_pos = head.find(MODULE_PREFIX)
+            if module_pos >= 0 and (head.find(b"\n", module_pos) >= 0 or not chunk):
+                break
+            if not chunk:
+                raise ValueError("Symbol file has no MODULE line")
+        else:
+            raise ValueError("Symbol file has no MODULE line")
+
+        line_end = head.find(b"\n", module_pos)
+        self.module_line = head[module_pos : line_end if line_end >= 0 else len(head)].decode("utf-8").strip()
+        self.start += module_pos
+        self.pending = head[module_pos:]  # Read from the stream, not yet read from the symbol
+
+    @property
+    def symbol_data(self) -> SymbolData:
+        return SymbolData.from_module_line(self.module_line)
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return self.stream.seekable()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """Only rewinding to the MODULE line is supported, to read the symbol again. The hash and size start over."""
+        if offset != 0 or whence != 0:
+            raise ValueError("SymbolStream can only be rewound to the start of the symbol")
+        if self.size:
+            self.stream.seek(self.start)
+            self.pending = b""
+        self.hash = hashlib.blake2s()
+        self.size = 0
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self.pending + self.stream.read()
+            self.pending = b""
+        elif self.pending:
+            data, self.pending = self.pending[:size], self.pending[size:]
+        else:
+            data = self.stream.read(size)
+
+        self.hash.update(data)
+        self.size += len(data)
+        return data
@@ -221,6 +221,28 @@ class CrashAPI {
             })
             .then(json => present_contents(json["file_content"]));
     }
+
+    static getThreadFrames(minidump_id, thread_index){
+        function present_failed() {
+            let spinner = document.getElementById("thread_spinner_" + thread_index)
+            let msg = document.getElementById("thread_msg_" + thread_index)
+            spinner.classList.remove(...spinner.classList);
+            spinner.classList.add("fas", "fa-times-circle")
+            msg.innerText = "Unable to load thread."
+        }
+
+        fetch("/webapi/minidump/" + minidump_id + "/thread/" + thread_index)
+            .then(response => {
+                document.getElementById("thread_button_" + thread_index).removeAttribute("onclick");
+                if (response.ok) {
+                    return response.json()
+                } else {
+                    present_failed()
+                    throw new Error("Unable to load thread " + thread_index + " for " + minidump_id)
+                }
+            })
+            .then(json => document.getElementById("thread_frames_" + thread_index).innerHTML = json["html"]);
+    }
 }
 
 class Util {
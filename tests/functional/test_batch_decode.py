@@ -0,0 +1,69 @@
+import pytest
+
+from crashserver.server import db, jobs
+from crashserver.server.models import BuildMetadata, CrashSignature, Minidump, Project, Symbol
+from crashserver.server.models.project import ProjectType
+from crashserver.server.symbol_supplier import HttpSymbolSupplier
+
+
+def stacktrace(*libraries):
+    modules = [{"debug_file": "app", "debug_id": "APP1"}] + [{"debug_file": f"{name}.pdb", "debug_id": name.upper(), "missing_symbols": True} for name in libraries]
+    return {"crash_info": {"crashing_thread": 0}, "main_module": 0, "modules": modules, "threads": [{"frames": [{"frame": 0, "function": "crash"}]}]}
+
+
+@pytest.fixture
+def build():
+    project = Project(project_name="Batch", project_type=ProjectType.SIMPLE, minidump_api_key="0" * 32, symbol_api_key="1" * 32)
+    db.session.add(project)
+    db.session.flush()
+    build = BuildMetadata(project_id=project.id, module_id="app", build_id="APP1")
+    db.session.add(build)
+    db.session.flush()
+    db.session.add(Symbol(project_id=project.id, build_metadata_id=build.id, os="windows", arch="x86_64", file_location="app/APP1/app.sym", file_size_bytes=1, file_hash="0"))
+    db.session.commit()
+
+    yield build
+
+    db.session.query(Minidump).filter_by(project_id=project.id).delete()
+    db.session.query(Symbol).filter_by(project_id=project.id).delete()
+    db.session.query(CrashSignature).filter_by(project_id=project.id).delete()
+    db.session.delete(build)
+    db.session.delete(project)
+    db.session.commit()
+
+
+def add_dumps(build, *stacktraces):
+    dumps = []
+    for i, stack in enumerate(stacktraces):
+        dump = Minidump(project_id=build.project_id, build_metadata_id=build.id, filename=f"batch-{i}.dmp", stacktrace=stack, symbolicated=False, decode_task_complete=False)
+        db.session.add(dump)
+        dumps.append(dump)
+    db.session.commit()
+    return dumps
+
+
+def test_batch_decode(build, monkeypatch, tmp_path):
+    dumps = add_dumps(build, stacktrace("liba", "libb"), stacktrace("libb", "libc"), stacktrace("liba"))
+
+    downloads = []
+    monkeypatch.setattr(jobs, "fetch_symbol", lambda symbol, symbol_dir: True)
+    monkeypatch.setattr(jobs, "fetch_module_symbols", lambda project_id, modules, symbol_dir: modules)
+    monkeypatch.setattr(jobs.Storage, "materialize", lambda location, dest: dest.write_bytes(b"MDMP"))
+    monkeypatch.setattr(HttpSymbolSupplier, "download_symbols", lambda self, crash_id, modules, os_name, workspace: downloads.append(sorted(m.debug_file for m in modules)))
+
+    def run_stackwalker(dump_path, *symbol_dirs, timer=None, stage="stackwalk"):
+        if dump_path.stem == str(dumps[2].id):
+            raise ValueError("Bad stackwalker output")
+        return dict(stacktrace(), threads=[{"frames": [{"frame": 0, "function": "symbolicated"}]}])
+
+    monkeypatch.setattr(jobs, "run_stackwalker", run_stackwalker)
+    jobs._decode_minidump_batch(build.id, [dump.id for dump in dumps], tmp_path)
+
+    # Every module without symbols is requested once, before any stackwalk
+    assert downloads == [["liba.pdb", "libb.pdb", "libc.pdb"]]
+
+    db.session.expire_all()
+    decoded = [db.session.query(Minidump).get(dump.id) for dump in dumps]
+    assert [(dump.symbolicated, dump.decode_task_complete) for dump in decoded] == [(True, True), (True, True), (False, True)]
+    assert decoded[0].crashing_function == "symbolicated"
+    assert decoded[2].json.crashing_function == "crash"
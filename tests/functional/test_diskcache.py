@@ -0,0 +1,127 @@
+import os
+import uuid
+
+import pytest
+
+from crashserver.server import queue
+from crashserver.utility import diskcache
+from crashserver.utility.diskcache import DiskLRUCache
+
+
+def use(cache, key, mtime):
+    """Set when an entry was last used, as modification times may not differ between quick writes"""
+    os.utime(cache.entry_path(key), (mtime, mtime))
+
+
+def test_get_put(tmp_path):
+    cache = DiskLRUCache(tmp_path / "cache", 1024)
+    assert not cache.get("a", tmp_path / "miss")
+    assert not (tmp_path / "miss").exists()
+
+    entry = cache.put("a", b"AAAA", tmp_path / "put")
+    assert entry == cache.entry_path("a") and entry.read_bytes() == b"AAAA"
+    assert (tmp_path / "put").read_bytes() == b"AAAA"
+
+    assert cache.get("a", tmp_path / "out" / "a")
+    assert (tmp_path / "out" / "a").read_bytes() == b"AAAA"
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_put_file(tmp_path):
+    cache = DiskLRUCache(tmp_path / "cache", 1024)
+    src = tmp_path / "src"
+    src.write_bytes(b"BBBB")
+
+    cache.put_file("b", src)
+    assert not src.exists()
+    assert cache.get("b", tmp_path / "b")
+    assert (tmp_path / "b").read_bytes() == b"BBBB"
+    assert [entry.name for entry in os.scandir(cache.root)] == ["b"]  # No temporary files are left behind
+
+
+def test_eviction_order(tmp_path):
+    cache = DiskLRUCache(tmp_path / "cache", 10)
+    for mtime, key in enumerate("abc"):
+        cache.put(key, b"1234")
+        use(cache, key, mtime)
+
+    # 12 bytes over a budget of 10. The least recently used entry goes first.
+    cache.evict()
+    assert not cache.entry_path("a").exists()
+    assert cache.entry_path("b").exists() and cache.entry_path("c").exists()
+
+    # A hit marks the entry as recently used, so "c" is evicted instead of "b"
+    use(cache, "c", 10)
+    assert cache.get("b", tmp_path / "b")
+    cache.put("d", b"1234")
+    assert [key for key in "bcd" if cache.entry_path(key).exists()] == ["b", "d"]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_evict_keeps_new_entry(tmp_path):
+    cache = DiskLRUCache(tmp_path / "cache", 4)
+    cache.put("a", b"1234")
+    use(cache, "a", 100)
+
+    # The entry being added is kept, even if it's the least recently used or larger than the whole budget
+    cache.put("big", b"123456")
+    use(cache, "big", 0)
+    cache.evict(keep="big")
+    assert cache.entry_path("big").exists()
+    assert not cache.entry_path("a").exists()
+
+
+def test_evict_skips_dotfiles(tmp_path):
+    cache = DiskLRUCache(tmp_path / "cache", 4)
+    (cache.root / ".tmp-partial").write_bytes(b"1234567890")
+    (cache.root / ".lock").write_bytes(b"")
+    (cache.root / "subdir").mkdir()
+
+    cache.put("a", b"1234")
+    assert cache.entry_path("a").exists()
+    assert (cache.root / ".tmp-partial").exists() and (cache.root / ".lock").exists() and (cache.root / "subdir").is_dir()
+    assert cache.stats()["evictions"] == 0
+
+
+def test_shared_counters(tmp_path):
+    stats_key = f"test:stats:{uuid.uuid4().hex}"
+    first = DiskLRUCache(tmp_path / "cache", 4, redis_conn=queue.connection, stats_key=stats_key)
+    second = DiskLRUCache(tmp_path / "cache", 4, redis_conn=queue.connection, stats_key=stats_key)
+
+    first.put("a", b"1234")
+    assert second.get("a", tmp_path / "a")
+    assert not first.get("b", tmp_path / "b")
+    second.put("c", b"1234")
+    stats = first.stats()
+    queue.connection.delete(stats_key)
+
+    assert stats == {"hits": 1, "misses": 1, "evictions": 1}
+    assert first.counters == {"hits": 0, "misses": 1, "evictions": 0}
+
+
+def test_link_or_copy(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.write_bytes(b"DATA")
+
+    diskcache.link_or_copy(src, tmp_path / "linked")
+    assert os.path.samefile(src, tmp_path / "linked")
+
+    # Across filesystems, linking fails and the file is copied
+    def cross_device_link(src, dest):
+        raise OSError(18, "Invalid cross-device link")
+
+    monkeypatch.setattr(diskcache.os, "link", cross_device_link)
+    (tmp_path / "copied").write_bytes(b"OLD")
+    diskcache.link_or_copy(src, tmp_path / "copied")
+    assert (tmp_path / "copied").read_bytes() == b"DATA"
+    assert not os.path.samefile(src, tmp_path / "copied")
+
+    cache = DiskLRUCache(tmp_path / "cache", 1024)
+    cache.put("a", b"AAAA")
+    assert cache.get("a", tmp_path / "a")
+    assert (tmp_path / "a").read_bytes() == b"AAAA"
+
+
+def test_link_missing_source(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        diskcache.link_or_copy(tmp_path / "missing", tmp_path / "dest")
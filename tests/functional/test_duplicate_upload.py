@@ -0,0 +1,84 @@
+import datetime
+import os
+import struct
+
+import pytest
+
+from crashserver.config import settings
+from crashserver.server import db
+from crashserver.server.models import Minidump, Project, Storage
+from crashserver.server.models.project import ProjectType
+
+API_KEY = "d" * 32
+
+
+@pytest.fixture
+def project(monkeypatch):
+    project = Project(project_name="Duplicates", project_type=ProjectType.SIMPLE, minidump_api_key=API_KEY, symbol_api_key="e" * 32)
+    db.session.add(project)
+    db.session.commit()
+
+    # Record stored minidumps instead of writing them, and don't queue decodes
+    stored = []
+    monkeypatch.setattr(Storage, "create", lambda path, file_contents: stored.append(path) or True)
+    monkeypatch.setattr(Minidump, "decode_task", lambda self, *args, **kwargs: None)
+
+    yield project, stored
+
+    db.session.query(Minidump).filter_by(project_id=project.id).delete()
+    db.session.delete(project)
+    db.session.commit()
+
+
+def minidump():
+    """Unique content with the minidump magic number, which is enough to be accepted as a minidump"""
+    return b"MDMP" + struct.pack("<HH", 0xA793, 0) + os.urandom(256)
+
+
+def upload(client, content: bytes):
+    return client.post(f"/api/minidump/upload?api_key={API_KEY}", data={"upload_file_minidump": (content, "crash.dmp")}, content_type="multipart/form-data")
+
+
+def test_duplicate_in_window(client, project):
+    project, stored = project
+    content = minidump()
+
+    first = upload(client, content)
+    assert first.status_code == 200 and "duplicate" not in first.json
+    second = upload(client, content)
+    assert second.status_code == 200 and second.json["duplicate"]
+    assert second.json["id"] == first.json["id"]
+
+    # Different content is stored as its own minidump
+    assert "duplicate" not in upload(client, minidump()).json
+
+    assert len(stored) == 2
+    dumps = db.session.query(Minidump).filter_by(project_id=project.id).all()
+    assert sorted(dump.duplicate_count for dump in dumps) == [0, 1]
+
+
+def test_duplicate_after_window(client, project):
+    project, stored = project
+    content = minidump()
+
+    first = upload(client, content)
+    window = datetime.timedelta(seconds=settings.upload.duplicate_window + 60)
+    db.session.query(Minidump).filter_by(id=first.json["id"]).update({Minidump.date_created: Minidump.date_created - window}, synchronize_session=False)
+    db.session.commit()
+
+    second = upload(client, content)
+    assert "duplicate" not in second.json
+    assert second.json["id"] != first.json["id"]
+    assert len(stored) == 2
+    assert db.session.query(Minidump).get(first.json["id"]).duplicate_count == 0
+
+
+def test_duplicate_detection_disabled(client, project, monkeypatch):
+    project, stored = project
+    monkeypatch.setitem(settings.upload, "duplicate_window", 0)
+    content = minidump()
+
+    responses = [upload(client, content) for _ in range(2)]
+    assert all("duplicate" not in response.json for response in responses)
+    assert len({response.json["id"] for response in responses}) == 2
+    assert len(stored) == 2
@@ -0,0 +1,58 @@
+import time
+import uuid
+
+from tests.util import login, logout
+from crashserver.config import settings
+from crashserver.server import queue
+from crashserver.utility.metrics import RedisHistogram, StageTimer
+
+
+class TestMetrics:
+    def test_stage_timer(self):
+        timer = StageTimer()
+        with timer.stage("stackwalk"):
+            pass
+        with timer.stage("stackwalk"):
+            pass
+        with timer.stage("commit"):
+            pass
+
+        assert list(timer.stages) == ["stackwalk", "commit"]
+        time.sleep(0.01)  # Outside any stage, but part of the total
+        assert timer.total >= sum(timer.stages.values()) + 0.01
+        assert timer.breakdown().startswith("stackwalk=")
+
+    def test_histogram_render(self):
+        histogram = RedisHistogram(queue.connection, f"test_{uuid.uuid4().hex}_seconds", "Test histogram", buckets=(0.1, 1))
+        histogram.observe_many([({"stage": "stackwalk"}, 0.05), ({"stage": "stackwalk"}, 0.5), ({"stage": "commit"}, 5)])
+
+        lines = histogram.render().splitlines()
+        queue.connection.delete(histogram.key)
+
+        assert lines[1] == f"# TYPE {histogram.name} histogram"
+        assert f'{histogram.name}_bucket{{stage="stackwalk",le="0.1"}} 1' in lines
+        assert f'{histogram.name}_bucket{{stage="stackwalk",le="1.0"}} 2' in lines
+        assert f'{histogram.name}_bucket{{stage="stackwalk",le="+Inf"}} 2' in lines
+        assert f'{histogram.name}_bucket{{stage="commit",le="1.0"}} 0' in lines
+        assert f'{histogram.name}_count{{stage="commit"}} 1' in lines
+        assert f'{histogram.name}_sum{{stage="stackwalk"}} 0.55' in lines
+
+    def test_export_unauthenticated(self, client):
+        logout(client)
+        response = client.get("/metrics")
+        assert response.status_code == 302
+        assert "/auth/login" in response.location
+
+        response = client.get("/metrics", headers={"Authorization": "Bearer wrong-token"})
+        assert response.status_code == 302
+
+    def test_export_token(self, client):
+        logout(client)
+        response = client.get("/metrics", headers={"Authorization": f"Bearer {settings.metrics.token}"})
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+
+    def test_export_authenticated(self, client):
+        login(client, settings.login.email, settings.login.passwd)
+        response = client.get("/metrics")
+        assert response.status_code == 200
@@ -0,0 +1,138 @@
+import struct
+
+import pytest
+
+from crashserver.utility import minidump_reader as reader
+
+
+def build_minidump(modules, platform=0x2, arch=9, exception=None):
+    """
+    Create a minimal minidump containing a module list, thread list, system info, and optionally exception stream.
+    modules: list of (name, base, size, codeview bytes)
+    exception: (code, address, params)
+    """
+    blobs = bytearray()
+    blob_start = reader.HEADER.size + 5 * reader.DIRECTORY_ENTRY.size
+
+    def append(data: bytes) -> int:
+        rva = blob_start + len(blobs)
+        blobs.extend(data)
+        return rva
+
+    def md_string(value: str) -> int:
+        encoded = value.encode("utf-16-le")
+        return append(struct.pack("<I", len(encoded)) + encoded)
+
+    module_entries = []
+    for name, base, size, codeview in modules:
+        name_rva = md_string(name)
+        cv_rva = append(codeview)
+        version = [reader.VS_FFI_SIGNATURE, 0, (1 << 16) | 2, (3 << 16) | 4] + [0] * 9
+        module_entries.append(reader.MODULE.pack(base, size, 0, 0x5F000000, name_rva, *version, len(codeview), cv_rva, 0, 0, 0, 0))
+    module_rva = append(struct.pack("<I", len(module_entries)) + b"".join(module_entries))
+
+    threads = [reader.THREAD.pack(tid, 0, 0, 0, 0, 0, 0, 0, 0, 0) for tid in (100, 200)]
+    thread_rva = append(struct.pack("<I", len(threads)) + b"".join(threads))
+    sysinfo_rva = append(reader.SYSTEM_INFO.pack(arch, 0, 0, 8, 0, 10, 0, 19041, platform, 0))
+    misc_rva = append(reader.MISC_INFO.pack(reader.MISC_INFO.size, reader.MISC_INFO_PROCESS_ID, 4321))
+
+    directory = [
+        (reader.STREAM_MODULE_LIST, module_rva),
+        (reader.STREAM_THREAD_LIST, thread_rva),
+        (reader.STREAM_SYSTEM_INFO, sysinfo_rva),
+        (reader.STREAM_MISC_INFO, misc_rva),
+    ]
+    if exception:
+        code, address, params = exception
+        params = list(params) + [0] * (15 - len(params))
+        exception_rva = append(reader.EXCEPTION.pack(200, 0, code, 0, 0, address, len(exception[2]), 0, *params))
+        directory.append((reader.STREAM_EXCEPTION, exception_rva))
+
+    header = reader.HEADER.pack(reader.MINIDUMP_SIGNATURE, 0xA793, len(directory), reader.HEADER.size, 0, 0, 0)
+    entries = b"".join(reader.DIRECTORY_ENTRY.pack(stream_type, 0, rva) for stream_type, rva in directory)
+    entries = entries.ljust(5 * reader.DIRECTORY_ENTRY.size, b"\0")
+    return header + entries + bytes(blobs)
+
+
+def pdb70(guid: bytes, age: int, pdb: str) -> bytes:
+    return b"RSDS" + guid + struct.pack("<I", age) + pdb.encode() + b"\0"
+
+
+class TestMinidumpReader:
+    guid = bytes.fromhex("78563412bc9af0de0123456789abcdef")
+
+    def test_windows_main_module(self):
+        data = build_minidump(
+            [
+                ("C:\\Program Files\\App\\app.exe", 0x140000000, 0x5000, pdb70(self.guid, 2, "D:\\build\\app.pdb")),
+                ("C:\\Windows\\System32\\ntdll.dll", 0x7FF800000000, 0x1000, pdb70(bytes(16), 1, "ntdll.pdb")),
+            ],
+            exception=(0xC0000005, 0x140001000, [1, 0xDEAD]),
+        )
+        info = reader.MinidumpInfo.from_bytes(data)
+
+        assert info.os == "Windows NT"
+        assert info.cpu_arch == "amd64"
+        assert info.pid == 4321
+        assert info.main_module.debug_file == "app.pdb"
+        assert info.main_module.debug_id == "123456789ABCDEF00123456789ABCDEF2"
+        assert info.main_module.filename == "app.exe"
+        assert info.main_module.version == "1.2.3.4"
+        assert info.crash_type == "EXCEPTION_ACCESS_VIOLATION_WRITE"
+        assert info.crash_address == "0xdead"
+        assert info.crashing_thread == 1
+        assert len(info.modules) == 2
+
+    def test_linux_build_id(self):
+        build_id = bytes(range(20))
+        data = build_minidump([("/usr/bin/app", 0x400000, 0x1000, reader.CV_ELF_SIGNATURE + build_id)], platform=0x8201, exception=(11, 0x0, []))
+        info = reader.MinidumpInfo.from_bytes(data)
+
+        assert info.os == "Linux"
+        assert info.crash_type == "SIGSEGV"
+        assert info.main_module.debug_file == "app"
+        assert info.main_module.debug_id == "030201000504070608090A0B0C0D0E0F0"
+        assert info.main_module.code_id == build_id.hex()
+
+    def test_linux_codeview_record(self):
+        # The CodeView record of /bin/ls, as written by Breakpad's Linux minidump writer
+        record = bytes.fromhex("4c457042" "15dfff3239aa7c3b16a71e6b2e3b6e4009dab998")
+        data = build_minidump([("/bin/ls", 0x55D0A2C00000, 0x24000, record)], platform=0x8201)
+        info = reader.MinidumpInfo.from_bytes(data)
+
+        assert info.main_module.debug_file == "ls"
+        assert info.main_module.debug_id == "32FFDF15AA393B7C16A71E6B2E3B6E400"
+        assert info.main_module.code_id == "15dfff3239aa7c3b16a71e6b2e3b6e4009dab998"
+
+    def test_build_module(self):
+        identified = build_minidump([("/bin/app", 0x1000, 0x100, reader.CV_ELF_SIGNATURE + bytes(range(20)))])
+        assert reader.MinidumpInfo.from_bytes(identified).build_module.debug_file == "app"
+
+        # Without a CodeView record there is no debug id to match a symbol against
+        unidentified = reader.MinidumpInfo.from_bytes(build_minidump([("/bin/app", 0x1000, 0x100, b"")]))
+        assert unidentified.main_module.debug_file == "app" and unidentified.main_module.debug_id == ""
+        assert unidentified.build_module is None
+
+    def test_partial_stacktrace(self):
+        data = build_minidump([("app.exe", 0x1000, 0x100, pdb70(self.guid, 1, "app.pdb"))])
+        stacktrace = reader.MinidumpInfo.from_bytes(data).to_stacktrace()
+
+        assert stacktrace["main_module"] == 0
+        assert stacktrace["threads"] == []
+        assert stacktrace["modules"][0]["debug_file"] == "app.pdb"
+        assert stacktrace["modules"][0]["end_addr"] == "0x1100"
+
+    def test_invalid_data(self):
+        assert reader.read_minidump_info(b"") is None
+        assert reader.read_minidump_info(b"NOTADUMP" + bytes(64)) is None
+        pytest.raises(ValueError, reader.MinidumpInfo.from_bytes, b"MDMP")
+
+    def test_read_file(self, tmp_path):
+        data = build_minidump([("app.exe", 0x1000, 0x100, pdb70(self.guid, 1, "app.pdb"))])
+        (tmp_path / "app.dmp").write_bytes(data)
+        (tmp_path / "empty.dmp").write_bytes(b"")
+        (tmp_path / "truncated.dmp").write_bytes(data[:40])
+
+        assert reader.read_minidump_file(tmp_path / "app.dmp").main_module.debug_file == "app.pdb"
+        assert reader.read_minidump_file(tmp_path / "empty.dmp") is None
+        assert reader.read_minidump_file(tmp_path / "truncated.dmp") is None
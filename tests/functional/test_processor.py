@@ -0,0 +1,121 @@
+from crashserver.server.models import Minidump, MinidumpModule, Module
+from crashserver.server.models.module import MODULE_IDENTITY
+from crashserver.utility import processor
+
+
+class TestProcessedCrash:
+    stacktrace = {
+        "crash_info": {"type": "SIGSEGV", "crashing_thread": 1},
+        "crashing_thread": {"frames": [{"frame": 0, "registers": {"rip": "0x1"}}]},
+        "main_module": 0,
+        "modules": [{"debug_file": "app", "debug_id": "A1"}, {"debug_file": "libc.so.6", "debug_id": "B1", "missing_symbols": True}],
+        "system_info": {"os": "Linux"},
+        "threads": [
+            {"frame_count": 1, "frames": [{"frame": 0, "function": "wait"}]},
+            {"frame_count": 2, "frames": [{"frame": 1, "function": "main"}, {"frame": 0, "function": "crash"}]},
+        ],
+    }
+
+    def test_summary(self):
+        crash = processor.ProcessedCrash.generate(self.stacktrace)
+        assert crash.os_icon == "fab fa-linux"
+        assert crash.crash_reason.crash_type == "SIGSEGV"
+        assert crash.main_module.debug_file == "app"
+        assert [m.debug_file for m in crash.modules_no_symbols] == ["libc.so.6"]
+
+    def test_threads(self):
+        threads = processor.ProcessedCrash.generate(self.stacktrace).threads
+        assert len(threads) == 2
+        assert [frame.func for frame in threads[1].frames] == ["crash", "main"]
+        assert threads[1].frames[0].registers == {"rip": "0x1"}
+        assert threads[0].frames[-1].registers == {}
+        assert [thread.thread_index for thread in threads[-1:]] == [1]
+
+    def test_minidump_summary(self):
+        dump = Minidump()
+        assert not dump.has_summary
+
+        dump.set_stacktrace(self.stacktrace)
+        assert dump.has_summary
+        assert (dump.crash_type, dump.os_name, dump.os_icon, dump.main_module) == ("SIGSEGV", "Linux", "fab fa-linux", "app")
+        assert (dump.crashing_function, dump.thread_count) == ("crash", 2)
+
+        dump.set_stacktrace({"modules": [], "threads": []})
+        assert (dump.main_module, dump.crashing_function, dump.thread_count) == (None, None, 0)
+
+    def test_signature(self):
+        crash = processor.ProcessedCrash.generate(self.stacktrace)
+        assert crash.signature(5) == "crash | main"
+        assert crash.signature(1) == "crash"
+
+        unsymbolicated = {"crash_info": {"crashing_thread": 0}, "threads": [{"frames": [{"frame": 0, "module": "app"}, {"frame": 1}]}]}
+        assert processor.ProcessedCrash.generate(unsymbolicated).signature(5) == "app | ??"
+        assert processor.ProcessedCrash.generate({"crash_info": {}, "threads": []}).signature(5) is None
+
+    def test_split_stacktrace(self):
+        summary = processor.split_stacktrace(self.stacktrace)
+        threads = processor.ProcessedCrash.generate(summary).threads
+
+        assert len(threads) == 2
+        assert len(threads[0].frames) == 0 and threads[0].total_frames == 1
+        assert [frame.func for frame in threads[1].frames] == ["crash", "main"]
+        assert summary["modules"] == self.stacktrace["modules"]
+        assert "frames" in self.stacktrace["threads"][0]
+
+    def test_catalogued_modules(self):
+        modules = self.stacktrace["modules"]
+        assert Module.hash(modules[0]) == Module.hash({**modules[0], "base_addr": "0x1000"})
+        assert Module.hash(modules[0]) != Module.hash(modules[1])
+
+        dump = Minidump()
+        dump.set_stacktrace({key: value for key, value in self.stacktrace.items() if key != "modules"})
+        dump.loaded_modules = [
+            MinidumpModule(module_index=i, module=Module(**{field: mod.get(field) for field in MODULE_IDENTITY}), missing_symbols=mod.get("missing_symbols", False))
+            for i, mod in enumerate(modules)
+        ]
+        assert dump.json.main_module.debug_file == "app"
+        assert [m.debug_file for m in dump.json.modules_no_symbols] == ["libc.so.6"]
+
+    def test_catalogued_module_fields(self, monkeypatch):
+        modules = [
+            {
+                "base_addr": "0x1000",
+                "end_addr": "0x2000",
+                "code_id": "5F0D1000",
+                "debug_file": "app.pdb",
+                "debug_id": "A1",
+                "filename": "app.exe",
+                "version": "1.2.3.4",
+                "missing_symbols": False,
+                "loaded_symbols": True,
+                "corrupt_symbols": False,
+                "symbol_url": "https://symbols.example.com/app.pdb/A1/app.sym",
+                "cert_subject": "Example Ltd",
+            },
+            {
+                "base_addr": "0x3000",
+                "end_addr": "0x4000",
+                "code_id": None,
+                "debug_file": "libc.so.6",
+                "debug_id": "B1",
+                "filename": "libc.so.6",
+                "version": None,
+                "missing_symbols": True,
+            },
+        ]
+        catalogue = {Module.hash(mod): Module(**{field: mod.get(field) for field in MODULE_IDENTITY}) for mod in modules}
+        monkeypatch.setattr(Module, "catalogue", staticmethod(lambda session, mods: catalogue))
+
+        dump = Minidump()
+        dump.set_stacktrace(dict(self.stacktrace, modules=modules))
+        dump.update_modules(None)
+        assert "modules" not in dump.stacktrace
+        assert dump.with_modules(dump.stacktrace)["modules"] == modules
+
+        # Fields with columns of their own aren't repeated
+        assert dump.loaded_modules[0].fields == {"loaded_symbols": True, "corrupt_symbols": False, "symbol_url": modules[0]["symbol_url"], "cert_subject": "Example Ltd"}
+        assert dump.loaded_modules[1].fields == {}
+
+        # Modules catalogued before every field was kept are rebuilt from the address range and missing_symbols
+        legacy = MinidumpModule(module_index=1, module=catalogue[Module.hash(modules[1])], base_address="0x3000", end_address="0x4000", missing_symbols=True)
+        assert legacy.to_json() == {field: modules[1][field] for field in MODULE_IDENTITY + ("base_addr", "end_addr", "missing_symbols")}
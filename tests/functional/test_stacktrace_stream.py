@@ -0,0 +1,70 @@
+import io
+import json
+import tracemalloc
+
+import pytest
+
+from crashserver.utility import processor
+from crashserver.utility.jsonstream import JsonStreamReader
+
+
+def stackwalker_output(num_threads: int, num_frames: int) -> bytes:
+    def frame(i):
+        return {"frame": i, "function": "NtWaitForSingleObject", "function_offset": "0x14", "module": "ntdll.dll", "module_offset": "0x9d4e4", "offset": f"0x{i:x}", "trust": "cfi"}
+
+    threads = [{"frame_count": num_frames, "frames": [frame(i) for i in range(num_frames)]} for _ in range(num_threads)]
+    crashing_thread = {"threads_index": 0, "total_frames": num_frames, "frames": [{**frame(0), "registers": {"rip": "0x1"}}] + [frame(i) for i in range(1, num_frames)]}
+    return json.dumps(
+        {
+            "crash_info": {"type": "EXCEPTION_ACCESS_VIOLATION_READ", "address": "0x0", "crashing_thread": 0},
+            "crashing_thread": crashing_thread,
+            "main_module": 0,
+            "modules": [{"debug_file": "app.pdb", "debug_id": "ABC1", "filename": "app.exe", "missing_symbols": True}],
+            "pid": 123456789,
+            "system_info": {"os": "Windows NT", "cpu_count": 8},
+            "threads": threads,
+        }
+    ).encode()
+
+
+class TestStacktraceStream:
+    @pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+    def test_reader_matches_json(self, chunk_size):
+        document = {"a": [1, 2.5, -3e10, "ü€😀", {"b": [], "c": {}}], "d": None, "e": True, "f": 1234567890}
+        reader = JsonStreamReader(io.BytesIO(json.dumps(document, ensure_ascii=False).encode()), chunk_size=chunk_size)
+        assert reader.read_value() == document
+
+    @pytest.mark.parametrize("document", ["1.5", "-3e10", "2.5E-7", "1234567890", "true", "null", '{"pid": 1.5}', "[1.25, 3e+2]"])
+    def test_split_scalars(self, document):
+        # Pipe reads may split a number after its "." or "e", where the part before is a valid number on its own
+        reader = JsonStreamReader(io.BytesIO(document.encode()), chunk_size=1)
+        assert reader.read_value() == json.loads(document)
+
+    def test_invalid_json(self):
+        with pytest.raises(ValueError):
+            processor.read_stacktrace(io.BytesIO(b'{"threads": [{"frames": ['))
+
+    def test_read_stacktrace(self):
+        output = stackwalker_output(4, 10)
+        stacktrace = processor.read_stacktrace(io.BytesIO(output))
+        expected = json.loads(output)
+
+        assert stacktrace["threads"] == expected["threads"]
+        assert stacktrace["pid"] == 123456789
+        assert stacktrace["crashing_thread"]["frames"] == expected["crashing_thread"]["frames"][:1]
+        assert processor.ProcessedCrash.generate(stacktrace).threads[0].frames[0].registers == {"rip": "0x1"}
+
+    def test_peak_memory(self):
+        output = stackwalker_output(400, 100)
+
+        def peak(parse):
+            tracemalloc.start()
+            stacktrace = parse(io.BytesIO(output))
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del stacktrace
+            return peak_bytes
+
+        captured = peak(lambda stream: json.loads(stream.read().decode("utf-8")))
+        streamed = peak(processor.read_stacktrace)
+        assert streamed < captured * 0.75
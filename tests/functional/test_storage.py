@@ -1,3 +1,4 @@
+import io
 from pathlib import Path
 
 import pytest
@@ -5,6 +6,8 @@ from minio import Minio
 
 from crashserver.server import db
 from crashserver.server.models import Storage
+from crashserver.server.storage.modules import filesystem
+from crashserver.server.storage.modules.s3 import S3CompatibleStorage
 
 
 def init_s3generic_config(bucket_name):
@@ -81,6 +84,19 @@ class TestFilesystem(StorageData):
             data = file.read()
         assert data == self.file_all.content
 
+    def test_fileio_stream_read(self, tmp_path):
+        with Storage.open(self.file_all.path) as file:
+            assert file.read() == self.file_all.content
+        assert Storage.read_range(self.file_all.path, 4, 3) == self.file_all.content[4:7]
+        assert Storage.read_range(self.file_all.path, 1000, 3) == b""
+
+        # Materialized files are linked, not copied, within the same filesystem
+        dest = Storage.materialize(self.file_all.path, tmp_path / "materialized.txt")
+        stored = Path(self.storage_config.get("path"), self.file_all.path).stat()
+        assert dest.read_bytes() == self.file_all.content
+        if dest.stat().st_dev == stored.st_dev:
+            assert dest.stat().st_ino == stored.st_ino
+
     def test_fileio_delete(self):
         Storage.delete(self.file_all.path)
 
@@ -88,6 +104,45 @@ class TestFilesystem(StorageData):
         assert not Path(self.storage_config.get("path"), self.file_all.path).exists()
 
 
+class TestDiskStorage:
+    def test_file_mode(self, tmp_path):
+        storage = filesystem.DiskStorage({"path": tmp_path})
+        assert storage.create(Path("a/b.dmp"), b"MDMP")
+        assert (tmp_path / "a" / "b.dmp").stat().st_mode & 0o777 == filesystem.FILE_MODE
+
+    def test_failed_write(self, tmp_path):
+        storage = filesystem.DiskStorage({"path": tmp_path})
+        assert storage.create(Path("a.dmp"), b"MDMP1")
+
+        class BrokenStream:
+            def read(self, size=-1):
+                raise OSError("Connection reset")
+
+        # The stored file is untouched, and no partial write is left beside it
+        assert not storage.create_stream(Path("a.dmp"), BrokenStream())
+        assert (tmp_path / "a.dmp").read_bytes() == b"MDMP1"
+        assert [p.name for p in tmp_path.iterdir()] == ["a.dmp"]
+
+        class Interrupted:
+            def read(self, size=-1):
+                raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            storage.create_stream(Path("a.dmp"), Interrupted())
+        assert [p.name for p in tmp_path.iterdir()] == ["a.dmp"]
+
+    def test_read_closes_file(self, tmp_path):
+        storage = filesystem.DiskStorage({"path": tmp_path})
+        storage.create(Path("a.dmp"), b"MDMP")
+        file = storage.read(Path("a.dmp"))
+        assert isinstance(file, io.BytesIO)  # Loaded, so no file is left open
+        assert file.read() == b"MDMP"
+        assert storage.read(Path("missing.dmp")) is None
+        with storage.open(Path("a.dmp")) as file:
+            assert file.read() == b"MDMP"
+        assert storage.open(Path("missing.dmp")) is None
+
+
 class TestS3(StorageData):
     def setup_class(self):
         super().setup_class(self)
@@ -117,6 +172,35 @@ class TestS3(StorageData):
         pytest.raises(FileNotFoundError, Storage.retrieve, self.file_s3.path)
 
 
+class TestS3Multipart:
+    def setup_class(self):
+        self.bucket_name = "crashserver"
+        self.client = init_s3generic_client(self.bucket_name)
+        self.store = S3CompatibleStorage(
+            "S3Generic",
+            {
+                "aws_access_key_id": "cs-access-key",
+                "aws_secret_access_key": "cs-secret-key",
+                "endpoint_url": "http://minio:9000",
+                "bucket_name": self.bucket_name,
+                "multipart_threshold_mb": "5",
+                "multipart_chunksize_mb": "5",
+                "max_concurrency": "4",
+            },
+        )
+        self.store.init_storage()
+
+    def test_multipart_iterable(self):
+        # 12 MiB in 1 MiB chunks is uploaded as three 5 MiB parts
+        chunks = [bytes([i]) * 2**20 for i in range(12)]
+        assert self.store.create_stream(Path("multipart.bin"), iter(chunks))
+
+        stat = self.client.stat_object(self.bucket_name, "multipart.bin")
+        assert stat.size == 12 * 2**20
+        assert stat.etag.endswith("-3")
+        assert self.store.retrieve(Path("multipart.bin")).read() == b"".join(chunks)
+
+
 class TestMultiBackend(StorageData):
     def setup_class(self):
         super().setup_class(self)
@@ -0,0 +1,114 @@
+import fcntl
+from pathlib import Path
+
+from crashserver.server.storage import cache
+from crashserver.server.storage.cache import CachedStorage, StorageCache
+from crashserver.server.storage.modules.filesystem import DiskStorage
+
+
+class CountingStorage(DiskStorage):
+    """Stands in for a remote backend, counting the objects read from it"""
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.reads = 0
+
+    def materialize(self, path: Path, dest: Path) -> bool:
+        self.reads += 1
+        return super().materialize(path, dest)
+
+
+def cached_storage(tmp_path, max_bytes=1024):
+    backend = CountingStorage({"path": tmp_path / "remote"})
+    storage = CachedStorage(backend, StorageCache(tmp_path / "cache", max_bytes))
+    storage.init()
+    return backend, storage
+
+
+def test_read_through(tmp_path):
+    backend, storage = cached_storage(tmp_path)
+    backend.create(Path("symbol/app.sym"), b"MODULE Linux x86_64 ABC1 app\n")
+
+    for _ in range(3):
+        with storage.read(Path("symbol/app.sym")) as file:
+            assert file.read() == b"MODULE Linux x86_64 ABC1 app\n"
+    assert storage.read_range(Path("symbol/app.sym"), 7, 5) == b"Linux"
+    assert storage.materialize(Path("symbol/app.sym"), tmp_path / "dest" / "app.sym")
+    assert (tmp_path / "dest" / "app.sym").read_bytes() == b"MODULE Linux x86_64 ABC1 app\n"
+
+    assert backend.reads == 1
+    assert storage.cache.counters == {"hits": 4, "misses": 1, "evictions": 0, "invalid": 0}
+    assert storage.read(Path("missing.sym")) is None
+
+
+def test_written_objects(tmp_path):
+    backend, storage = cached_storage(tmp_path)
+    storage.create(Path("minidump/a.dmp"), b"MDMP1")
+    assert not any(p.is_file() for p in (tmp_path / "cache").iterdir())  # Only cached once read
+    assert storage.read(Path("minidump/a.dmp")).read() == b"MDMP1"
+    assert backend.reads == 1
+
+    storage.create(Path("minidump/a.dmp"), b"MDMP2")
+    assert storage.read(Path("minidump/a.dmp")).read() == b"MDMP2"
+    assert backend.reads == 2
+
+    storage.delete(Path("minidump/a.dmp"))
+    assert storage.read(Path("minidump/a.dmp")) is None
+
+
+def test_damaged_entry(tmp_path):
+    backend, storage = cached_storage(tmp_path)
+    backend.create(Path("a.dmp"), b"MDMP" * 10)
+    storage.read(Path("a.dmp")).close()
+
+    # Damaged entries are never returned, and are read from the backend again
+    entry = storage.cache.entry_path(storage.cache.key(Path("a.dmp")))
+    entry.unlink()  # The entry is a link to the stand-in backend's file
+    entry.write_bytes(b"MDMP" * 5)
+    assert storage.read(Path("a.dmp")).read() == b"MDMP" * 10
+    assert backend.reads == 2
+    assert storage.cache.counters["invalid"] == 1
+
+
+def test_validated_once_per_host(tmp_path, monkeypatch):
+    backend, storage = cached_storage(tmp_path)
+    backend.create(Path("a.sym"), b"MODULE" * 10)
+    storage.read(Path("a.sym")).close()
+
+    hashed = []
+    file_digest = cache.file_digest
+    monkeypatch.setattr(cache, "file_digest", lambda file: hashed.append(file) or file_digest(file))
+
+    # Each process on the host has its own cache instance over the same directory. Only the first read hashes the entry.
+    for _ in range(3):
+        process = CachedStorage(backend, StorageCache(tmp_path / "cache", 1024))
+        with process.read(Path("a.sym")) as file:
+            assert file.read() == b"MODULE" * 10
+    assert len(hashed) == 1
+
+    # Readers of a checked entry only share the lock, so aren't held up by one another
+    with open(storage.cache.digest_path(storage.cache.key(Path("a.sym")))) as digest:
+        fcntl.flock(digest, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        with storage.open(Path("a.sym")) as file:
+            assert file.read() == b"MODULE" * 10
+
+    # A replaced entry is checked again
+    entry = storage.cache.entry_path(storage.cache.key(Path("a.sym")))
+    entry.unlink()
+    entry.write_bytes(b"MODULE" * 10)
+    assert storage.read(Path("a.sym")).read() == b"MODULE" * 10
+    assert len(hashed) == 2
+    assert backend.reads == 1
+
+
+def test_byte_budget(tmp_path):
+    backend, storage = cached_storage(tmp_path, max_bytes=250)
+    for i in range(4):
+        backend.create(Path(f"{i}.dmp"), bytes([i]) * 100)
+        storage.read(Path(f"{i}.dmp")).close()
+    backend.create(Path("large.dmp"), b"L" * 1000)
+    assert storage.read(Path("large.dmp")).read() == b"L" * 1000  # Larger than the cache, so not cached
+
+    cached = [p for p in (tmp_path / "cache").iterdir() if p.is_file() and not p.name.startswith(".")]
+    assert sum(p.stat().st_size for p in cached) <= 250
+    assert storage.cache.counters["evictions"] == 2
@@ -0,0 +1,48 @@
+import io
+
+import pytest
+
+from crashserver.server.storage import codec
+
+
+def stored(file_contents: bytes) -> bytes:
+    return codec.decode(io.BytesIO(file_contents)).read()
+
+
+def test_compressed_roundtrip():
+    symbol = b"MODULE Linux x86_64 ABC1 app\n" + b"FUNC 1000 10 0 main\n" * 1000
+    encoded = codec.encode(symbol, "zstd")
+    assert encoded.startswith(codec.CODEC_MAGIC) and len(encoded) < len(symbol) / 10
+    assert stored(encoded) == symbol
+
+
+def test_uncompressed_objects_unchanged():
+    assert codec.encode(b"MDMP", "zstd") == b"MDMP"  # Would grow if compressed
+    assert codec.encode(b"MDMP" * 100, "none") == b"MDMP" * 100
+    assert stored(b"MDMP" * 100) == b"MDMP" * 100
+    assert stored(b"") == b""
+
+
+def test_magic_in_raw_object():
+    lookalike = codec.CODEC_MAGIC + bytes([codec.ZSTD]) + b"not compressed"
+    encoded = codec.encode(lookalike, "none")
+    assert encoded != lookalike
+    assert stored(encoded) == lookalike
+
+    with pytest.raises(ValueError):
+        stored(codec.CODEC_MAGIC + bytes([200]))
+
+
+def test_magic_in_raw_stream():
+    lookalike = codec.CODEC_MAGIC + bytes([codec.ZSTD]) + b"not compressed"
+    encoded = codec.encode_stream(io.BytesIO(lookalike), "none").read()
+    assert encoded == codec.encode(lookalike, "none")
+    assert stored(encoded) == lookalike
+
+
+@pytest.mark.parametrize("compression", ["none", "zstd"])
+def test_decode_stream(compression):
+    symbol = b"MODULE Linux x86_64 ABC1 app\n" + b"FUNC 1000 10 0 main\n" * 1000
+    with codec.decode_stream(codec.encode_stream(io.BytesIO(symbol), compression)) as file:
+        assert codec.read_exactly(file, 29) == b"MODULE Linux x86_64 ABC1 app\n"
+        assert file.read() == symbol[29:]
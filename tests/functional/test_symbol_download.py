@@ -0,0 +1,143 @@
+import hashlib
+import subprocess
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from crashserver.server import queue
+from crashserver.server.symbol_supplier import HttpSymbolSupplier, LocalSymCache, SymbolConverter, SymbolServer
+from crashserver.utility import processor
+
+DOWNLOAD_DELAY = 0.5
+AVAILABLE_MODULES = {f"/lib{i}.pdb/BUILD{i}/lib{i}.pdb" for i in range(8)} | {"/breakpad/lib9.pdb/BUILD9/lib9.sym"}
+
+
+class SymbolServerHandler(BaseHTTPRequestHandler):
+    """Stand-in for a symbol server. Each request is slow, and only AVAILABLE_MODULES exist"""
+
+    requests = []
+
+    def do_GET(self):
+        SymbolServerHandler.requests.append(self.path)
+        time.sleep(DOWNLOAD_DELAY)
+        if self.path in AVAILABLE_MODULES:
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"PDB")
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def symbol_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SymbolServerHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    SymbolServerHandler.requests.clear()
+
+    # Skip converting the fake PDBs, and record every symbol stored
+    stored = []
+    monkeypatch.setattr(LocalSymCache, "store_and_convert_symbol", lambda self, content, workspace, converter: stored.append((self.module_id, content)))
+    monkeypatch.setattr(LocalSymCache, "store_symbol", lambda self, content, workspace: stored.append((self.module_id, content)))
+
+    yield f"http://127.0.0.1:{server.server_port}", stored
+    server.shutdown()
+
+
+def make_supplier(tmp_path, url, *servers):
+    servers = servers or [SymbolServer(name=f"test-{url}", url=url, format="pdb", os=["windows"])]
+    converter = SymbolConverter(tmp_path / "converted", 1024, 2)
+    return HttpSymbolSupplier(list(servers), tmp_path / "cache", 60, converter, redis_conn=queue.connection)
+
+
+def crash_with_modules(names):
+    modules = [{"debug_file": f"{name}.pdb", "debug_id": f"BUILD{name[3:]}", "missing_symbols": True} for name in names]
+    return processor.ProcessedCrash.generate({"modules": modules, "threads": [], "main_module": 0, "pid": 0})
+
+
+class TestSymbolServerDownload:
+    def test_downloads_run_concurrently(self, symbol_server, tmp_path):
+        url, stored = symbol_server
+        crash = crash_with_modules([f"lib{i}" for i in range(12)])
+
+        start = time.monotonic()
+        make_supplier(tmp_path, url).download_symbols("test", crash.modules_no_symbols, "windows", tmp_path)
+        elapsed = time.monotonic() - start
+
+        assert len(stored) == 8
+        assert all(content == b"PDB" for _, content in stored)
+        assert elapsed < DOWNLOAD_DELAY * 4  # Sequential downloads would take 12x the delay
+
+    def test_servers_tried_in_order(self, symbol_server, tmp_path):
+        url, stored = symbol_server
+        supplier = make_supplier(
+            tmp_path,
+            url,
+            SymbolServer(name=f"pdb-{url}", url=url, format="pdb", os=["windows"]),
+            SymbolServer(name=f"breakpad-{url}", url=f"{url}/breakpad"),
+        )
+
+        assert supplier.download_symbol("lib9.pdb", "BUILD9", "windows", tmp_path) == (True, False)
+        assert SymbolServerHandler.requests == ["/lib9.pdb/BUILD9/lib9.pdb", "/breakpad/lib9.pdb/BUILD9/lib9.sym"]
+        assert stored == [("lib9.pdb", b"PDB")]
+
+    def test_servers_filtered_by_os(self, symbol_server, tmp_path):
+        url, stored = symbol_server
+        assert make_supplier(tmp_path, url).download_symbol("lib0.pdb", "BUILD0", "linux", tmp_path) == (False, False)
+        assert SymbolServerHandler.requests == []
+
+    def test_unreachable_server(self, symbol_server, tmp_path):
+        assert make_supplier(tmp_path, "http://127.0.0.1:9").download_symbol("lib0.pdb", "BUILD0", "windows", tmp_path) == (False, False)
+
+    def test_known_misses_skipped(self, symbol_server, tmp_path):
+        url, stored = symbol_server
+        supplier = make_supplier(tmp_path, url)
+        miss_cache = next(iter(supplier.miss_caches.values()))
+        avoided = miss_cache.stats().get("avoided", 0)
+
+        assert supplier.download_symbol("missing.pdb", "BUILD", "windows", tmp_path) == (False, False)
+        assert supplier.download_symbol("missing.pdb", "BUILD", "windows", tmp_path) == (False, False)
+
+        assert SymbolServerHandler.requests == ["/missing.pdb/BUILD/missing.pdb"]
+        assert miss_cache.stats()["avoided"] == avoided + 1
+
+
+class TestSymbolConverter:
+    def test_pdb_converted_once(self, monkeypatch, tmp_path):
+        converted = []
+
+        def run_dump_syms(pdb_location, sym_location):
+            converted.append(pdb_location.name)
+            sym_location.write_bytes(b"MODULE windows x86_64 BUILD lib.pdb")
+
+        monkeypatch.setattr(SymbolConverter, "run_dump_syms", staticmethod(run_dump_syms))
+        converter = SymbolConverter(tmp_path / "converted", 1024, 2)
+        first, second = LocalSymCache(tmp_path / "cache", "lib.pdb", "BUILD1"), LocalSymCache(tmp_path / "cache", "copy.pdb", "BUILD1")
+
+        assert converter.convert(b"PDB", "lib.pdb", first.sym_path, tmp_path) is False
+        assert converter.convert(b"PDB", "copy.pdb", second.sym_path, tmp_path) is True
+
+        assert converted == ["lib.pdb"]
+        assert first.sym_path.read_bytes() == second.sym_path.read_bytes() == b"MODULE windows x86_64 BUILD lib.pdb"
+
+    @pytest.mark.parametrize("output, returncode", [(b"", 0), (b"MODULE windows x86_64 BUI", -9)])
+    def test_failed_conversion_not_cached(self, monkeypatch, tmp_path, output, returncode):
+        def run_dump_syms(pdb_location, sym_location):
+            sym_location.write_bytes(output)
+            if returncode:
+                raise subprocess.CalledProcessError(returncode, "dump_syms")
+
+        monkeypatch.setattr(SymbolConverter, "run_dump_syms", staticmethod(run_dump_syms))
+        converter = SymbolConverter(tmp_path / "converted", 1024, 2)
+        cached = LocalSymCache(tmp_path / "cache", "lib.pdb", "BUILD1")
+
+        with pytest.raises(RuntimeError):
+            converter.convert(b"PDB", "lib.pdb", cached.sym_path, tmp_path)
+        assert not cached.does_sym_exist()
+        assert not converter.cache.entry_path(hashlib.blake2s(b"PDB").hexdigest()).exists()
+        assert not [path for path in (tmp_path / "downloads").rglob("*") if path.is_file()]
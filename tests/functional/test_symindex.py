@@ -0,0 +1,96 @@
+import io
+
+from crashserver.utility import symindex
+from crashserver.utility.symbolizer import Symbolizer
+
+SYMBOL = b"""MODULE windows x86_64 ABC1 app.pdb
+INFO CODE_ID 5F0D app.exe
+FILE 0 c:\\src\\main.cpp
+FILE 7 c:\\src\\util.cpp
+FUNC 2000 30 0 util::helper(int)
+2000 10 5 7
+2010 10 6 7
+FUNC m 1000 100 0 main
+1000 8 10 0
+1010 f0 12 0
+PUBLIC 3000 0 exported_function
+PUBLIC 500 0 __scrt_startup
+STACK CFI INIT 1000 100 .cfa: $rsp 8 +
+"""
+
+
+def build_path(tmp_path):
+    path = tmp_path / "app.symidx"
+    with open(path, "wb") as out:
+        size = symindex.build_index(io.BytesIO(SYMBOL), out)
+    assert size == path.stat().st_size
+    return path
+
+
+def build(tmp_path):
+    return symindex.SymbolIndex(build_path(tmp_path))
+
+
+def test_lookup(tmp_path):
+    with build(tmp_path) as index:
+        found = index.lookup(0x1014)
+        assert (found.function, found.function_offset, found.file, found.line) == ("main", 0x14, "c:\\src\\main.cpp", 12)
+        found = index.lookup(0x2004)
+        assert (found.function, found.file, found.line) == ("util::helper(int)", "c:\\src\\util.cpp", 5)
+
+        # Within a function, but not covered by any line record
+        assert index.lookup(0x2025).line is None
+
+
+def test_lookup_public(tmp_path):
+    with build(tmp_path) as index:
+        assert index.lookup(0x3010).function == "exported_function"
+        assert index.lookup(0x3010).function_offset == 0x10
+        assert index.lookup(0x600).function == "__scrt_startup"
+
+        # A function lies between the closest public symbol and the address
+        assert index.lookup(0x2040) is None
+        assert index.lookup(0x100) is None
+
+
+def test_lookup_inline(tmp_path):
+    # dump_syms writes INLINE records within a FUNC block, ahead of its line records
+    symbol = b"""MODULE Linux x86_64 ABC1 app
+FILE 0 /src/main.cpp
+INLINE_ORIGIN 0 inlined_helper()
+FUNC 1000 20 0 main
+INLINE 0 12 0 0 1008 8
+1000 8 10 0
+1008 8 3 0
+1010 10 14 0
+"""
+    path = tmp_path / "inline.symidx"
+    with open(path, "wb") as out:
+        symindex.build_index(io.BytesIO(symbol), out)
+    with symindex.SymbolIndex(path) as index:
+        found = index.lookup(0x1009)
+        assert (found.function, found.file, found.line) == ("main", "/src/main.cpp", 3)
+        assert index.lookup(0x1014).line == 14
+
+
+def test_symbolizer(tmp_path):
+    stacktrace = {
+        "crashing_thread": {"frames": [{"frame": 0, "module": "app.exe", "module_offset": "0x1014"}]},
+        "modules": [
+            {"debug_file": "app.pdb", "debug_id": "ABC1", "filename": "app.exe", "missing_symbols": True},
+            {"debug_file": "ntdll.pdb", "debug_id": "DEF2", "filename": "ntdll.dll", "missing_symbols": True},
+        ],
+        "threads": [
+            {"frames": [{"frame": 0, "module": "app.exe", "module_offset": "0x1014"}, {"frame": 1, "module": "app.exe", "module_offset": "0x2004"}]},
+            {"frames": [{"frame": 0, "module": "ntdll.dll", "module_offset": "0x1014"}, {"frame": 1, "module": "app.exe", "module_offset": "0x9000"}]},
+        ],
+    }
+    with Symbolizer({("app.pdb", "ABC1"): build_path(tmp_path)}) as symbolizer:
+        assert symbolizer.symbolize(stacktrace) == 4
+
+    assert stacktrace["threads"][0]["frames"][0] == {"frame": 0, "module": "app.exe", "module_offset": "0x1014", "function": "main", "function_offset": "0x14", "file": "c:\\src\\main.cpp", "line": 12}
+    assert stacktrace["threads"][0]["frames"][1]["function"] == "util::helper(int)"
+    assert stacktrace["crashing_thread"]["frames"][0]["function"] == "main"
+    assert "function" not in stacktrace["threads"][1]["frames"][0]
+    assert stacktrace["threads"][1]["frames"][1]["function"] == "exported_function"
+    assert [module.get("missing_symbols", False) for module in stacktrace["modules"]] == [False, True]
@@ -0,0 +1,39 @@
+import hashlib
+import io
+
+import pytest
+
+from crashserver.server.storage import codec
+from crashserver.utility.symstream import SymbolStream
+
+SYMBOL = b"MODULE windows x86_64 ABC1 app.pdb\r\nFILE 0 c:\\src\\main.cpp\r\n" + b"FUNC 1000 10 0 main\r\n" * 10000
+
+
+def test_module_line_and_hash():
+    # Anything before the MODULE line is not part of the symbol
+    symbol_file = SymbolStream(io.BytesIO(b"\xef\xbb\xbf" + SYMBOL), chunk_size=16)
+    assert (symbol_file.symbol_data.module_id, symbol_file.symbol_data.build_id, symbol_file.symbol_data.os) == ("app.pdb", "ABC1", "windows")
+
+    stored = io.BytesIO()
+    while chunk := symbol_file.read(1000):
+        stored.write(chunk)
+    assert stored.getvalue() == SYMBOL
+    assert (symbol_file.size, symbol_file.hexdigest()) == (len(SYMBOL), hashlib.blake2s(SYMBOL).hexdigest())
+
+    # Read again from the start, as when the primary storage backend fails
+    symbol_file.seek(0)
+    assert symbol_file.read() == SYMBOL
+    assert symbol_file.hexdigest() == hashlib.blake2s(SYMBOL).hexdigest()
+
+
+def test_no_module_line():
+    with pytest.raises(ValueError):
+        SymbolStream(io.BytesIO(b"FUNC 1000 10 0 main\n" * 100))
+
+
+@pytest.mark.parametrize("compression", ["none", "zstd"])
+def test_encode_stream(compression):
+    encoded = codec.encode_stream(SymbolStream(io.BytesIO(SYMBOL)), compression)
+    stored = b"".join(iter(lambda: encoded.read(4096), b""))
+    assert codec.decode(io.BytesIO(stored)).read() == SYMBOL
+    assert stored.startswith(codec.CODEC_MAGIC) == (compression == "zstd")